@@ -1,9 +1,38 @@
-from app.agent.base import BaseAgent
-from app.agent.browser import BrowserAgent
-from app.agent.mcp import MCPAgent
-from app.agent.react import ReActAgent
-from app.agent.swe import SWEAgent
-from app.agent.toolcall import ToolCallAgent
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
+
+if TYPE_CHECKING:
+    from app.agent.base import BaseAgent
+    from app.agent.browser import BrowserAgent
+    from app.agent.mcp import MCPAgent
+    from app.agent.react import ReActAgent
+    from app.agent.swe import SWEAgent
+    from app.agent.toolcall import ToolCallAgent
+
+
+# Resolved on first lookup so importing one agent doesn't import them all
+_AGENTS: Dict[str, str] = {
+    "BaseAgent": "app.agent.base",
+    "BrowserAgent": "app.agent.browser",
+    "MCPAgent": "app.agent.mcp",
+    "ReActAgent": "app.agent.react",
+    "SWEAgent": "app.agent.swe",
+    "ToolCallAgent": "app.agent.toolcall",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = _AGENTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    agent_class = getattr(importlib.import_module(module), name)
+    globals()[name] = agent_class
+    return agent_class
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_AGENTS))
 
 
 __all__ = [
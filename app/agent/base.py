@@ -4,10 +4,33 @@ from typing import List, Optional
 
 from pydantic import BaseModel, Field, model_validator
 
+from app.checkpoint import RunJournal
+from app.compaction import MemoryCompactor
 from app.llm import LLM
 from app.logger import logger
 from app.sandbox.client import SANDBOX_CLIENT
 from app.schema import ROLE_TYPE, AgentState, Memory, Message
+from app.tracing import tracer
+
+
+_sandbox_users = 0  # Agent runs in progress, which may share SANDBOX_CLIENT
+
+
+@asynccontextmanager
+async def _sandbox_lease():
+    """Hold the shared sandbox for one agent run.
+
+    Parallel flow steps run several agents at once, so only the last run to
+    end cleans up the sandbox.
+    """
+    global _sandbox_users
+    _sandbox_users += 1
+    try:
+        yield
+    finally:
+        _sandbox_users -= 1
+        if _sandbox_users == 0:
+            await SANDBOX_CLIENT.cleanup()
 
 
 class BaseAgent(BaseModel, ABC):
@@ -32,6 +55,9 @@ class BaseAgent(BaseModel, ABC):
     # Dependencies
     llm: LLM = Field(default_factory=LLM, description="Language model instance")
     memory: Memory = Field(default_factory=Memory, description="Agent's memory store")
+    compactor: Optional[MemoryCompactor] = Field(
+        None, description="Keeps the history sent to the LLM under a token budget"
+    )
     state: AgentState = Field(
         default=AgentState.IDLE, description="Current agent state"
     )
@@ -41,6 +67,15 @@ class BaseAgent(BaseModel, ABC):
     current_step: int = Field(default=0, description="Current step in execution")
 
     duplicate_threshold: int = 2
+    _spawned: int = 0  # Agents spawned from this one, to key their journal records
+
+    journal: Optional[RunJournal] = Field(
+        None, description="Append-only journal each step is checkpointed to"
+    )
+    journal_key: Optional[str] = Field(
+        None,
+        description="Stable id of this agent's records in the journal; defaults to its name",
+    )
 
     class Config:
         arbitrary_types_allowed = True
@@ -53,6 +88,8 @@ class BaseAgent(BaseModel, ABC):
             self.llm = LLM(config_name=self.name.lower())
         if not isinstance(self.memory, Memory):
             self.memory = Memory()
+        if self.compactor is None:
+            self.compactor = MemoryCompactor.from_config(self.llm)
         return self
 
     @asynccontextmanager
@@ -130,29 +167,64 @@ class BaseAgent(BaseModel, ABC):
 
         if request:
             self.update_memory("user", request)
+            self.checkpoint()
 
         results: List[str] = []
-        async with self.state_context(AgentState.RUNNING):
+        async with _sandbox_lease(), self.state_context(AgentState.RUNNING):
             while (
                 self.current_step < self.max_steps and self.state != AgentState.FINISHED
             ):
                 self.current_step += 1
                 logger.info(f"Executing step {self.current_step}/{self.max_steps}")
-                step_result = await self.step()
+                with tracer.span(
+                    "agent.step",
+                    category="agent",
+                    agent=self.name,
+                    step=self.current_step,
+                ):
+                    step_result = await self.step()
 
                 # Check for stuck state
                 if self.is_stuck():
                     self.handle_stuck_state()
 
+                self.checkpoint()
+
                 results.append(f"Step {self.current_step}: {step_result}")
 
             if self.current_step >= self.max_steps:
                 self.current_step = 0
                 self.state = AgentState.IDLE
                 results.append(f"Terminated: Reached max steps ({self.max_steps})")
-        await SANDBOX_CLIENT.cleanup()
         return "\n".join(results) if results else "No steps executed"
 
+    async def spawn(self) -> "BaseAgent":
+        """Create an agent of the same type with this agent's LLM and fresh state.
+
+        PlanningFlow runs independent steps concurrently on spawned agents.
+        Subclasses holding connections override this to share them.
+        """
+        return type(self)(**self._spawn_fields())
+
+    def _spawn_fields(self) -> dict:
+        """Fields a spawned agent inherits: the LLM, step budget and journal."""
+        fields = {"llm": self.llm, "max_steps": self.max_steps}
+        if self.journal is not None:
+            # Keyed under the parent so its records don't collide with the parent's
+            self._spawned += 1
+            fields["journal"] = self.journal
+            fields["journal_key"] = f"{self.journal.agent_key(self)}/{self._spawned}"
+        return fields
+
+    def checkpoint(self) -> None:
+        """Append this agent's progress to the run journal, if one is attached."""
+        if self.journal is None:
+            return
+        try:
+            self.journal.record_agent(self)
+        except Exception as e:
+            logger.warning(f"Failed to checkpoint {self.name}: {e}")
+
     @abstractmethod
     async def step(self) -> str:
         """Execute a single step in the agent's workflow.
@@ -168,22 +240,8 @@ class BaseAgent(BaseModel, ABC):
         logger.warning(f"Agent detected stuck state. Added prompt: {stuck_prompt}")
 
     def is_stuck(self) -> bool:
-        """Check if the agent is stuck in a loop by detecting duplicate content"""
-        if len(self.memory.messages) < 2:
-            return False
-
-        last_message = self.memory.messages[-1]
-        if not last_message.content:
-            return False
-
-        # Count identical content occurrences
-        duplicate_count = sum(
-            1
-            for msg in reversed(self.memory.messages[:-1])
-            if msg.role == "assistant" and msg.content == last_message.content
-        )
-
-        return duplicate_count >= self.duplicate_threshold
+        """Check if the latest assistant message repeats earlier text or tool calls"""
+        return self.memory.loop_detector.is_stuck(self.duplicate_threshold)
 
     @property
     def messages(self) -> List[Message]:
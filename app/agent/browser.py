@@ -1,3 +1,4 @@
+import asyncio
 import json
 from typing import TYPE_CHECKING, Optional
 
@@ -8,7 +9,7 @@ from app.logger import logger
 from app.prompt.browser import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import Message, ToolChoice
 from app.tool import BrowserUseTool, Terminate, ToolCollection
-from app.tool.sandbox.sb_browser_tool import SandboxBrowserTool
+from app.tool.read_output import ReadOutput
 
 
 # Avoid circular import if BrowserAgent needs BrowserContextHelper
@@ -16,16 +17,25 @@ if TYPE_CHECKING:
     from app.agent.base import BaseAgent  # Or wherever memory is defined
 
 
+def tool_name(tool_class: type) -> str:
+    """Return a tool class's default name without instantiating it."""
+    return tool_class.model_fields["name"].default
+
+
 class BrowserContextHelper:
     def __init__(self, agent: "BaseAgent"):
         self.agent = agent
         self._current_base64_image: Optional[str] = None
+        self._capture: Optional[asyncio.Task] = None
 
     async def get_browser_state(self) -> Optional[dict]:
-        browser_tool = self.agent.available_tools.get_tool(BrowserUseTool().name)
+        browser_tool = self.agent.available_tools.get_tool(tool_name(BrowserUseTool))
         if not browser_tool:
+            # Imported here: it pulls in the Daytona SDK, which is slow to import
+            from app.tool.sandbox.sb_browser_tool import SandboxBrowserTool
+
             browser_tool = self.agent.available_tools.get_tool(
-                SandboxBrowserTool().name
+                tool_name(SandboxBrowserTool)
             )
         if not browser_tool or not hasattr(browser_tool, "get_current_state"):
             logger.warning("BrowserUseTool not found or doesn't have get_current_state")
@@ -44,9 +54,27 @@ class BrowserContextHelper:
             logger.debug(f"Failed to get browser state: {str(e)}")
             return None
 
+    def capture_state(self) -> None:
+        """Start capturing the browser state in the background.
+
+        Called right after a browser action; the next format_next_step_prompt
+        uses this snapshot instead of taking the screenshot itself.
+        """
+        self.cancel_capture()
+        self._capture = asyncio.create_task(self.get_browser_state())
+
+    def cancel_capture(self) -> None:
+        if self._capture is not None and not self._capture.done():
+            self._capture.cancel()
+        self._capture = None
+
     async def format_next_step_prompt(self) -> str:
         """Gets browser state and formats the browser prompt."""
-        browser_state = await self.get_browser_state()
+        if self._capture is not None:
+            capture, self._capture = self._capture, None
+            browser_state = await capture
+        else:
+            browser_state = await self.get_browser_state()
         url_info, tabs_info, content_above_info, content_below_info = "", "", "", ""
         results_info = ""  # Or get from agent if needed elsewhere
 
@@ -79,7 +107,8 @@ class BrowserContextHelper:
         )
 
     async def cleanup_browser(self):
-        browser_tool = self.agent.available_tools.get_tool(BrowserUseTool().name)
+        self.cancel_capture()
+        browser_tool = self.agent.available_tools.get_tool(tool_name(BrowserUseTool))
         if browser_tool and hasattr(browser_tool, "cleanup"):
             await browser_tool.cleanup()
 
@@ -103,7 +132,9 @@ class BrowserAgent(ToolCallAgent):
 
     # Configure the available tools
     available_tools: ToolCollection = Field(
-        default_factory=lambda: ToolCollection(BrowserUseTool(), Terminate())
+        default_factory=lambda: ToolCollection(
+            BrowserUseTool(), ReadOutput(), Terminate()
+        )
     )
 
     # Use Auto for tool choice to allow both tool usage and free-form responses
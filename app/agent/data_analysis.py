@@ -7,6 +7,7 @@ from app.tool import Terminate, ToolCollection
 from app.tool.chart_visualization.chart_prepare import VisualizationPrepare
 from app.tool.chart_visualization.data_visualization import DataVisualization
 from app.tool.chart_visualization.python_execute import NormalPythonExecute
+from app.tool.read_output import ReadOutput
 
 
 class DataAnalysis(ToolCallAgent):
@@ -32,6 +33,7 @@ class DataAnalysis(ToolCallAgent):
             NormalPythonExecute(),
             VisualizationPrepare(),
             DataVisualization(),
+            ReadOutput(),
             Terminate(),
         )
     )
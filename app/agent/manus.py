@@ -1,21 +1,24 @@
-from typing import Dict, List, Optional
+import asyncio
+from typing import Dict, Optional
 
 from pydantic import Field, model_validator
 
-from app.agent.browser import BrowserContextHelper
+from app.agent.browser import BrowserContextHelper, tool_name
+from app.agent.mcp import MCPServersMixin
 from app.agent.toolcall import ToolCallAgent
 from app.config import config
-from app.logger import logger
 from app.prompt.manus import NEXT_STEP_PROMPT, SYSTEM_PROMPT
+from app.schema import ToolCall
 from app.tool import Terminate, ToolCollection
 from app.tool.ask_human import AskHuman
 from app.tool.browser_use_tool import BrowserUseTool
-from app.tool.mcp import MCPClients, MCPClientTool
+from app.tool.mcp import MCPClients
 from app.tool.python_execute import PythonExecute
+from app.tool.read_output import ReadOutput
 from app.tool.str_replace_editor import StrReplaceEditor
 
 
-class Manus(ToolCallAgent):
+class Manus(MCPServersMixin, ToolCallAgent):
     """A versatile general-purpose agent with support for both local and MCP tools."""
 
     name: str = "Manus"
@@ -29,6 +32,8 @@ class Manus(ToolCallAgent):
 
     # MCP clients for remote tool access
     mcp_clients: MCPClients = Field(default_factory=MCPClients)
+    # False when mcp_clients is shared (see SessionRunner) and must stay connected
+    owns_mcp_clients: bool = True
 
     # Add general-purpose tools to the tool collection
     available_tools: ToolCollection = Field(
@@ -37,6 +42,7 @@ class Manus(ToolCallAgent):
             BrowserUseTool(),
             StrReplaceEditor(),
             AskHuman(),
+            ReadOutput(),
             Terminate(),
         )
     )
@@ -49,6 +55,8 @@ class Manus(ToolCallAgent):
         default_factory=dict
     )  # server_id -> url/command
     _initialized: bool = False
+    # Whether this agent holds mcp_clients open (see MCPClients.hold)
+    _holds_mcp_clients: bool = False
 
     @model_validator(mode="after")
     def initialize_helper(self) -> "Manus":
@@ -60,99 +68,96 @@ class Manus(ToolCallAgent):
     async def create(cls, **kwargs) -> "Manus":
         """Factory method to create and properly initialize a Manus instance."""
         instance = cls(**kwargs)
-        await instance.initialize_mcp_servers()
+        if instance.owns_mcp_clients:
+            await asyncio.gather(
+                instance.llm.preconnect(), instance.initialize_mcp_servers()
+            )
+        else:
+            # Already connected by the owner; only expose the tools
+            instance._add_shared_mcp_tools()
         instance._initialized = True
         return instance
 
-    async def initialize_mcp_servers(self) -> None:
-        """Initialize connections to configured MCP servers."""
-        for server_id, server_config in config.mcp_config.servers.items():
-            try:
-                if server_config.type == "sse":
-                    if server_config.url:
-                        await self.connect_mcp_server(server_config.url, server_id)
-                        logger.info(
-                            f"Connected to MCP server {server_id} at {server_config.url}"
-                        )
-                elif server_config.type == "stdio":
-                    if server_config.command:
-                        await self.connect_mcp_server(
-                            server_config.command,
-                            server_id,
-                            use_stdio=True,
-                            stdio_args=server_config.args,
-                        )
-                        logger.info(
-                            f"Connected to MCP server {server_id} using command {server_config.command}"
-                        )
-            except Exception as e:
-                logger.error(f"Failed to connect to MCP server {server_id}: {e}")
-
-    async def connect_mcp_server(
-        self,
-        server_url: str,
-        server_id: str = "",
-        use_stdio: bool = False,
-        stdio_args: List[str] = None,
-    ) -> None:
-        """Connect to an MCP server and add its tools."""
-        if use_stdio:
-            await self.mcp_clients.connect_stdio(
-                server_url, stdio_args or [], server_id
-            )
-            self.connected_servers[server_id or server_url] = server_url
-        else:
-            await self.mcp_clients.connect_sse(server_url, server_id)
-            self.connected_servers[server_id or server_url] = server_url
-
-        # Update available tools with only the new tools from this server
-        new_tools = [
-            tool for tool in self.mcp_clients.tools if tool.server_id == server_id
-        ]
-        self.available_tools.add_tools(*new_tools)
-
-    async def disconnect_mcp_server(self, server_id: str = "") -> None:
-        """Disconnect from an MCP server and remove its tools."""
-        await self.mcp_clients.disconnect(server_id)
-        if server_id:
-            self.connected_servers.pop(server_id, None)
+    async def _reinitialize(self) -> None:
+        """Set up the MCP tools again after cleanup(), e.g. for another flow step."""
+        if self.owns_mcp_clients:
+            await self.initialize_mcp_servers()
         else:
-            self.connected_servers.clear()
+            self._add_shared_mcp_tools()
+        self._initialized = True
 
-        # Rebuild available tools without the disconnected server's tools
-        base_tools = [
-            tool
-            for tool in self.available_tools.tools
-            if not isinstance(tool, MCPClientTool)
-        ]
-        self.available_tools = ToolCollection(*base_tools)
+    def _add_shared_mcp_tools(self) -> None:
         self.available_tools.add_tools(*self.mcp_clients.tools)
+        self.connected_servers = {
+            server_id: server_id for server_id in self.mcp_clients.sessions
+        }
+
+    async def initialize_mcp_servers(self) -> None:
+        """Connect to the configured MCP servers, holding them until cleanup()."""
+        if not self._holds_mcp_clients:
+            self.mcp_clients.hold()
+            self._holds_mcp_clients = True
+        await super().initialize_mcp_servers()
 
     async def cleanup(self):
         """Clean up Manus agent resources."""
         if self.browser_context_helper:
             await self.browser_context_helper.cleanup_browser()
-        # Disconnect from all MCP servers only if we were initialized
+        # Release the MCP servers only if we were initialized; the connections
+        # close with the last agent holding them, so spawned copies keep theirs
         if self._initialized:
-            await self.disconnect_mcp_server()
+            if self._holds_mcp_clients:
+                self._holds_mcp_clients = False
+                await self.mcp_clients.release()
+            self.connected_servers.clear()
+            self._remove_mcp_tools()
             self._initialized = False
 
+    async def spawn(self) -> "Manus":
+        """Create a Manus that shares this agent's MCP connections but has its own browser."""
+        if not self._initialized:
+            await self._reinitialize()
+        spawned = await type(self).create(
+            **self._spawn_fields(),
+            mcp_clients=self.mcp_clients,
+            owns_mcp_clients=False,
+        )
+        if self._holds_mcp_clients:
+            # Keep the servers connected until the copy is cleaned up too
+            self.mcp_clients.hold()
+            spawned._holds_mcp_clients = True
+        return spawned
+
+    async def execute_tool(self, command: ToolCall) -> str:
+        """Execute a tool call; after a browser action, start capturing its state."""
+        is_browser_action = (
+            command.function.name == tool_name(BrowserUseTool)
+            and self.browser_context_helper is not None
+        )
+        if is_browser_action:
+            # A capture from an earlier action would hold the browser lock and be stale
+            self.browser_context_helper.cancel_capture()
+        result = await super().execute_tool(command)
+        if is_browser_action:
+            self.browser_context_helper.capture_state()
+        return result
+
     async def think(self) -> bool:
         """Process current state and decide next actions with appropriate context."""
         if not self._initialized:
-            await self.initialize_mcp_servers()
-            self._initialized = True
+            await self._reinitialize()
 
         original_prompt = self.next_step_prompt
-        recent_messages = self.memory.messages[-3:] if self.memory.messages else []
+        recent_messages = self.memory.get_recent_messages(3)
         browser_in_use = any(
-            tc.function.name == BrowserUseTool().name
+            tc.function.name == tool_name(BrowserUseTool)
             for msg in recent_messages
             if msg.tool_calls
             for tc in msg.tool_calls
         )
 
         if browser_in_use:
+            # Usually already captured in the background after the last browser action
             self.next_step_prompt = (
                 await self.browser_context_helper.format_next_step_prompt()
             )
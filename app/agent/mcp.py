@@ -1,13 +1,95 @@
+import asyncio
 from typing import Any, Dict, List, Optional, Tuple
 
 from pydantic import Field
 
 from app.agent.toolcall import ToolCallAgent
+from app.config import MCPServerConfig, config
 from app.logger import logger
 from app.prompt.mcp import MULTIMEDIA_RESPONSE_PROMPT, NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import AgentState, Message
+from app.tool import ToolCollection
 from app.tool.base import ToolResult
-from app.tool.mcp import MCPClients
+from app.tool.mcp import MCPClients, MCPClientTool
+
+
+class MCPServersMixin:
+    """Configured MCP servers for agents that mix MCP tools with their own.
+
+    Expects the agent to define mcp_clients, available_tools and
+    connected_servers (server_id -> url/command).
+    """
+
+    async def initialize_mcp_servers(self) -> None:
+        """Connect to all configured MCP servers concurrently.
+
+        Each server is bounded by its connect timeout and its tools become
+        available as soon as it is up; a slow or failing server only loses
+        its own tools.
+        """
+        await asyncio.gather(
+            *(
+                self._initialize_mcp_server(server_id, server_config)
+                for server_id, server_config in config.mcp_config.servers.items()
+            )
+        )
+
+    async def _initialize_mcp_server(
+        self, server_id: str, server_config: MCPServerConfig
+    ) -> None:
+        if not await self.mcp_clients.connect_configured(server_id, server_config):
+            return
+        self.connected_servers[server_id] = server_config.url or server_config.command
+        self.available_tools.add_tools(
+            *(tool for tool in self.mcp_clients.tools if tool.server_id == server_id)
+        )
+        logger.info(
+            f"Connected to MCP server {server_id} at {self.connected_servers[server_id]}"
+        )
+
+    async def connect_mcp_server(
+        self,
+        server_url: str,
+        server_id: str = "",
+        use_stdio: bool = False,
+        stdio_args: List[str] = None,
+    ) -> None:
+        """Connect to an MCP server and add its tools."""
+        if use_stdio:
+            await self.mcp_clients.connect_stdio(
+                server_url, stdio_args or [], server_id
+            )
+            self.connected_servers[server_id or server_url] = server_url
+        else:
+            await self.mcp_clients.connect_sse(server_url, server_id)
+            self.connected_servers[server_id or server_url] = server_url
+
+        # Update available tools with only the new tools from this server
+        new_tools = [
+            tool for tool in self.mcp_clients.tools if tool.server_id == server_id
+        ]
+        self.available_tools.add_tools(*new_tools)
+
+    async def disconnect_mcp_server(self, server_id: str = "") -> None:
+        """Disconnect from an MCP server and remove its tools."""
+        await self.mcp_clients.disconnect(server_id)
+        if server_id:
+            self.connected_servers.pop(server_id, None)
+        else:
+            self.connected_servers.clear()
+
+        # Rebuild available tools without the disconnected server's tools
+        self._remove_mcp_tools()
+        self.available_tools.add_tools(*self.mcp_clients.tools)
+
+    def _remove_mcp_tools(self) -> None:
+        self.available_tools = ToolCollection(
+            *(
+                tool
+                for tool in self.available_tools.tools
+                if not isinstance(tool, MCPClientTool)
+            )
+        )
 
 
 class MCPAgent(ToolCallAgent):
@@ -1,8 +1,9 @@
-from typing import Dict, List, Optional
+from typing import Dict, Optional
 
 from pydantic import Field, model_validator
 
-from app.agent.browser import BrowserContextHelper
+from app.agent.browser import BrowserContextHelper, tool_name
+from app.agent.mcp import MCPServersMixin
 from app.agent.toolcall import ToolCallAgent
 from app.config import config
 from app.daytona.sandbox import create_sandbox, delete_sandbox
@@ -11,14 +12,15 @@ from app.logger import logger
 from app.prompt.manus import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.tool import Terminate, ToolCollection
 from app.tool.ask_human import AskHuman
-from app.tool.mcp import MCPClients, MCPClientTool
+from app.tool.mcp import MCPClients
+from app.tool.read_output import ReadOutput
 from app.tool.sandbox.sb_browser_tool import SandboxBrowserTool
 from app.tool.sandbox.sb_files_tool import SandboxFilesTool
 from app.tool.sandbox.sb_shell_tool import SandboxShellTool
 from app.tool.sandbox.sb_vision_tool import SandboxVisionTool
 
 
-class SandboxManus(ToolCallAgent):
+class SandboxManus(MCPServersMixin, ToolCallAgent):
     """A versatile general-purpose agent with support for both local and MCP tools."""
 
     name: str = "SandboxManus"
@@ -40,6 +42,7 @@ class SandboxManus(ToolCallAgent):
             # BrowserUseTool(),
             # StrReplaceEditor(),
             AskHuman(),
+            ReadOutput(),
             Terminate(),
         )
     )
@@ -110,70 +113,6 @@ class SandboxManus(ToolCallAgent):
             logger.error(f"Error initializing sandbox tools: {e}")
             raise
 
-    async def initialize_mcp_servers(self) -> None:
-        """Initialize connections to configured MCP servers."""
-        for server_id, server_config in config.mcp_config.servers.items():
-            try:
-                if server_config.type == "sse":
-                    if server_config.url:
-                        await self.connect_mcp_server(server_config.url, server_id)
-                        logger.info(
-                            f"Connected to MCP server {server_id} at {server_config.url}"
-                        )
-                elif server_config.type == "stdio":
-                    if server_config.command:
-                        await self.connect_mcp_server(
-                            server_config.command,
-                            server_id,
-                            use_stdio=True,
-                            stdio_args=server_config.args,
-                        )
-                        logger.info(
-                            f"Connected to MCP server {server_id} using command {server_config.command}"
-                        )
-            except Exception as e:
-                logger.error(f"Failed to connect to MCP server {server_id}: {e}")
-
-    async def connect_mcp_server(
-        self,
-        server_url: str,
-        server_id: str = "",
-        use_stdio: bool = False,
-        stdio_args: List[str] = None,
-    ) -> None:
-        """Connect to an MCP server and add its tools."""
-        if use_stdio:
-            await self.mcp_clients.connect_stdio(
-                server_url, stdio_args or [], server_id
-            )
-            self.connected_servers[server_id or server_url] = server_url
-        else:
-            await self.mcp_clients.connect_sse(server_url, server_id)
-            self.connected_servers[server_id or server_url] = server_url
-
-        # Update available tools with only the new tools from this server
-        new_tools = [
-            tool for tool in self.mcp_clients.tools if tool.server_id == server_id
-        ]
-        self.available_tools.add_tools(*new_tools)
-
-    async def disconnect_mcp_server(self, server_id: str = "") -> None:
-        """Disconnect from an MCP server and remove its tools."""
-        await self.mcp_clients.disconnect(server_id)
-        if server_id:
-            self.connected_servers.pop(server_id, None)
-        else:
-            self.connected_servers.clear()
-
-        # Rebuild available tools without the disconnected server's tools
-        base_tools = [
-            tool
-            for tool in self.available_tools.tools
-            if not isinstance(tool, MCPClientTool)
-        ]
-        self.available_tools = ToolCollection(*base_tools)
-        self.available_tools.add_tools(*self.mcp_clients.tools)
-
     async def delete_sandbox(self, sandbox_id: str) -> None:
         """Delete a sandbox by ID."""
         try:
@@ -202,9 +141,9 @@ class SandboxManus(ToolCallAgent):
             self._initialized = True
 
         original_prompt = self.next_step_prompt
-        recent_messages = self.memory.messages[-3:] if self.memory.messages else []
+        recent_messages = self.memory.get_recent_messages(3)
         browser_in_use = any(
-            tc.function.name == SandboxBrowserTool().name
+            tc.function.name == tool_name(SandboxBrowserTool)
             for msg in recent_messages
             if msg.tool_calls
             for tc in msg.tool_calls
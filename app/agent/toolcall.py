@@ -1,18 +1,27 @@
 import asyncio
 import json
-from typing import Any, List, Optional, Union
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from pydantic import Field
 
 from app.agent.react import ReActAgent
 from app.exceptions import TokenLimitExceeded
 from app.logger import logger
+from app.output_store import observation_limit, output_store
 from app.prompt.toolcall import NEXT_STEP_PROMPT, SYSTEM_PROMPT
 from app.schema import TOOL_CHOICE_TYPE, AgentState, Message, ToolCall, ToolChoice
 from app.tool import CreateChatCompletion, Terminate, ToolCollection
 
 
 TOOL_CALL_REQUIRED = "Tool calls required but none provided"
+# Characters of a tool result shown in the log
+LOG_PREVIEW_CHARS = 1000
+
+# base64 image produced by the tool call running in the current task
+_tool_base64_image: ContextVar[Optional[str]] = ContextVar(
+    "tool_base64_image", default=None
+)
 
 
 class ToolCallAgent(ReActAgent):
@@ -36,24 +45,50 @@ class ToolCallAgent(ReActAgent):
     max_steps: int = 30
     max_observe: Optional[Union[int, bool]] = None
 
+    # Cap on concurrency-safe tool calls of one step running at the same time
+    max_parallel_tools: int = 4
+
+    # Stream the completion and start each tool as soon as its arguments are complete
+    stream_tool_calls: bool = False
+    _dispatched_tools: Dict[str, asyncio.Task] = {}
+    # False once a streamed call of the current response was not concurrency-safe
+    _early_dispatch_open: bool = True
+
     async def think(self) -> bool:
         """Process current state and decide next actions using tools"""
+        self._cancel_dispatched_tools()
+        self._early_dispatch_open = True
         if self.next_step_prompt:
             user_msg = Message.user_message(self.next_step_prompt)
-            self.messages += [user_msg]
+            self.memory.add_message(user_msg)
 
         try:
-            # Get response with tool options
-            response = await self.llm.ask_tool(
-                messages=self.messages,
-                system_msgs=(
-                    [Message.system_message(self.system_prompt)]
-                    if self.system_prompt
-                    else None
-                ),
+            system_msgs = (
+                [Message.system_message(self.system_prompt)]
+                if self.system_prompt
+                else None
+            )
+            tools_tokens = self.available_tools.count_tokens(self.llm.count_tokens)
+            messages = self.messages
+            if self.compactor:
+                reserved = tools_tokens + sum(
+                    self.compactor.count_tokens(msg) for msg in system_msgs or []
+                )
+                messages = await self.compactor.compact(messages, reserved)
+            request = dict(
+                messages=messages,
+                system_msgs=system_msgs,
                 tools=self.available_tools.to_params(),
                 tool_choice=self.tool_choices,
+                tools_tokens=tools_tokens,
             )
+            # Get response with tool options
+            if self.stream_tool_calls and self.tool_choices != ToolChoice.NONE:
+                response = await self.llm.ask_tool_stream(
+                    on_tool_call=self._dispatch_tool_call, **request
+                )
+            else:
+                response = await self.llm.ask_tool(**request)
         except ValueError:
             raise
         except Exception as e:
@@ -137,18 +172,25 @@ class ToolCallAgent(ReActAgent):
             # Return last message content if no tool calls
             return self.messages[-1].content or "No content or commands to execute"
 
-        results = []
-        for command in self.tool_calls:
-            # Reset base64_image for each tool call
-            self._current_base64_image = None
-
-            result = await self.execute_tool(command)
+        outcomes = await self._run_tool_calls(self.tool_calls)
 
-            if self.max_observe:
-                result = result[: self.max_observe]
+        results = []
+        for command, (result, self._current_base64_image) in zip(
+            self.tool_calls, outcomes
+        ):
+            if self.max_observe and not output_store.is_folded(result):
+                # Keep head and tail in memory; the full output goes to the store
+                result = await output_store.afold(
+                    result, int(self.max_observe), name=command.function.name
+                )
 
+            preview = (
+                result
+                if len(result) <= LOG_PREVIEW_CHARS
+                else f"{result[:LOG_PREVIEW_CHARS]}... [{len(result)} characters]"
+            )
             logger.info(
-                f"🎯 Tool '{command.function.name}' completed its mission! Result: {result}"
+                f"🎯 Tool '{command.function.name}' completed its mission! Result: {preview}"
             )
 
             # Add tool response to memory
@@ -163,6 +205,53 @@ class ToolCallAgent(ReActAgent):
 
         return "\n\n".join(results)
 
+    async def _run_tool_calls(
+        self, commands: List[ToolCall]
+    ) -> List[Tuple[str, Optional[str]]]:
+        """Run a step's tool calls, returning (observation, image) in call order.
+
+        Consecutive concurrency-safe calls run together (at most
+        max_parallel_tools at a time); any other call waits for them and
+        runs alone, so side effects keep the order the model asked for.
+        """
+        outcomes: List[Optional[Tuple[str, Optional[str]]]] = [None] * len(commands)
+        semaphore = asyncio.Semaphore(max(1, self.max_parallel_tools))
+        batch: List[int] = []
+
+        async def run(index: int) -> None:
+            # Reuse the result of a tool call started while the response streamed
+            task = self._dispatched_tools.pop(commands[index].id, None)
+            if task is not None:
+                outcomes[index] = await task
+                return
+            async with semaphore:
+                outcomes[index] = await self._run_tool(commands[index])
+
+        async def flush() -> None:
+            if len(batch) > 1:
+                logger.info(f"⚡ Running {len(batch)} tool calls concurrently")
+            await asyncio.gather(*(run(index) for index in batch))
+            batch.clear()
+
+        for index, command in enumerate(commands):
+            if self._is_concurrency_safe(command):
+                batch.append(index)
+            else:
+                await flush()
+                await run(index)
+        await flush()
+        return outcomes
+
+    def _is_concurrency_safe(self, command: ToolCall) -> bool:
+        tool = self.available_tools.get_tool(command.function.name)
+        if tool is None:
+            return False
+        try:
+            args = json.loads(command.function.arguments or "{}")
+        except json.JSONDecodeError:
+            return False
+        return isinstance(args, dict) and tool.is_concurrency_safe(**args)
+
     async def execute_tool(self, command: ToolCall) -> str:
         """Execute a single tool call with robust error handling"""
         if not command or not command.function or not command.function.name:
@@ -187,6 +276,7 @@ class ToolCallAgent(ReActAgent):
             if hasattr(result, "base64_image") and result.base64_image:
                 # Store the base64_image for later use in tool_message
                 self._current_base64_image = result.base64_image
+                _tool_base64_image.set(result.base64_image)
 
             # Format result for display (standard case)
             observation = (
@@ -207,6 +297,46 @@ class ToolCallAgent(ReActAgent):
             logger.exception(error_msg)
             return f"Error: {error_msg}"
 
+    async def _run_tool(self, command: ToolCall) -> Tuple[str, Optional[str]]:
+        """Execute a tool call and return its observation and base64 image.
+
+        The image is tracked per task, so concurrently running calls don't mix them up.
+        """
+        self._current_base64_image = None
+        _tool_base64_image.set(None)
+        # Streaming tools fold their output to this limit as they produce it
+        token = observation_limit.set(
+            int(self.max_observe) if self.max_observe else None
+        )
+        try:
+            result = await self.execute_tool(command)
+        finally:
+            observation_limit.reset(token)
+        return result, _tool_base64_image.get()
+
+    def _dispatch_tool_call(self, command: ToolCall) -> None:
+        """Start executing a streamed tool call in the background.
+
+        Only concurrency-safe calls preceded solely by safe calls of the same
+        response start early; from the first unsafe call on, act() runs the
+        rest in order.
+        """
+        if command.id in self._dispatched_tools or not self._early_dispatch_open:
+            return
+        if not self._is_concurrency_safe(command):
+            self._early_dispatch_open = False
+            return
+        logger.info(f"⚡ Dispatching tool '{command.function.name}' early")
+        self._dispatched_tools[command.id] = asyncio.create_task(
+            self._run_tool(command)
+        )
+
+    def _cancel_dispatched_tools(self) -> None:
+        """Cancel early-dispatched tool calls that act() never collected."""
+        for task in self._dispatched_tools.values():
+            task.cancel()
+        self._dispatched_tools.clear()
+
     async def _handle_special_tool(self, name: str, result: Any, **kwargs):
         """Handle special tool execution and state changes"""
         if not self._is_special_tool(name):
@@ -228,6 +358,7 @@ class ToolCallAgent(ReActAgent):
 
     async def cleanup(self):
         """Clean up resources used by the agent's tools."""
+        self._cancel_dispatched_tools()
         logger.info(f"🧹 Cleaning up resources for agent '{self.name}'...")
         for tool_name, tool_instance in self.available_tools.tool_map.items():
             if hasattr(tool_instance, "cleanup") and asyncio.iscoroutinefunction(
@@ -1,16 +1,18 @@
+import asyncio
+import base64
+import functools
 import json
 import sys
+import threading
 import time
 import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Literal, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional
 
 import boto3
-
-
-# Global variables to track the current tool use ID across function calls
-# Tmp solution
-CURRENT_TOOLUSE_ID = None
+from botocore.config import Config as BotocoreConfig
 
 
 # Class to handle OpenAI-style response formatting
@@ -36,29 +38,181 @@ class OpenAIResponse:
 
 # Main client class for interacting with Amazon Bedrock
 class BedrockClient:
-    def __init__(self):
+    DEFAULT_MAX_WORKERS = 16
+
+    def __init__(self, max_workers: Optional[int] = None):
         # Initialize Bedrock client, you need to configure AWS env first
+        max_workers = max_workers or self.DEFAULT_MAX_WORKERS
         try:
-            self.client = boto3.client("bedrock-runtime")
-            self.chat = Chat(self.client)
+            # boto3 clients are thread-safe; size the connection pool to the workers
+            self.client = boto3.client(
+                "bedrock-runtime",
+                config=BotocoreConfig(max_pool_connections=max_workers),
+            )
         except Exception as e:
             print(f"Error initializing Bedrock client: {e}")
             sys.exit(1)
+        # Blocking boto3 calls run here so they never stall the event loop
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="bedrock"
+        )
+        self.chat = Chat(self.client, self.executor)
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False)
 
 
 # Chat interface class
 class Chat:
-    def __init__(self, client):
-        self.completions = ChatCompletions(client)
+    def __init__(self, client, executor: ThreadPoolExecutor):
+        self.completions = ChatCompletions(client, executor)
+
+
+class BedrockStream:
+    """Async iterator of OpenAI-style chunks over a Bedrock converse_stream.
+
+    The blocking event stream is consumed in a worker thread and handed to
+    the event loop through a queue.
+    """
+
+    _DONE = object()
+
+    def __init__(self, event_stream, executor: ThreadPoolExecutor):
+        self._event_stream = event_stream
+        self._executor = executor
+        self._queue: Optional[asyncio.Queue] = None
+        self._closed = threading.Event()
+        self._id = f"chatcmpl-{uuid.uuid4()}"
+        self._created = int(time.time())
+        self._tool_index: Dict[int, int] = {}  # content block index -> tool index
+
+    def _pump(self, loop: asyncio.AbstractEventLoop) -> None:
+        try:
+            for event in self._event_stream:
+                if self._closed.is_set():
+                    break
+                loop.call_soon_threadsafe(self._queue.put_nowait, event)
+        except Exception as e:
+            loop.call_soon_threadsafe(self._queue.put_nowait, e)
+        finally:
+            loop.call_soon_threadsafe(self._queue.put_nowait, self._DONE)
+
+    def _chunk(
+        self,
+        content: Optional[str] = None,
+        tool_calls: Optional[List[dict]] = None,
+        finish_reason: Optional[str] = None,
+        usage: Optional[dict] = None,
+    ) -> OpenAIResponse:
+        return OpenAIResponse(
+            {
+                "id": self._id,
+                "created": self._created,
+                "object": "chat.completion.chunk",
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {
+                            "role": "assistant",
+                            "content": content,
+                            "tool_calls": tool_calls,
+                        },
+                        "finish_reason": finish_reason,
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    def _convert_event(self, event: dict) -> Optional[OpenAIResponse]:
+        if "contentBlockStart" in event:
+            block = event["contentBlockStart"]
+            tool_use = block.get("start", {}).get("toolUse")
+            if tool_use:
+                index = len(self._tool_index)
+                self._tool_index[block.get("contentBlockIndex", index)] = index
+                return self._chunk(
+                    tool_calls=[
+                        {
+                            "index": index,
+                            "id": tool_use["toolUseId"],
+                            "type": "function",
+                            "function": {"name": tool_use["name"], "arguments": ""},
+                        }
+                    ]
+                )
+        elif "contentBlockDelta" in event:
+            block = event["contentBlockDelta"]
+            delta = block.get("delta", {})
+            if delta.get("text"):
+                return self._chunk(content=delta["text"])
+            if "toolUse" in delta:
+                index = self._tool_index.get(block.get("contentBlockIndex"), 0)
+                return self._chunk(
+                    tool_calls=[
+                        {
+                            "index": index,
+                            "id": None,
+                            "type": "function",
+                            "function": {
+                                "name": None,
+                                "arguments": delta["toolUse"].get("input", ""),
+                            },
+                        }
+                    ]
+                )
+        elif "messageStop" in event:
+            return self._chunk(finish_reason=event["messageStop"].get("stopReason"))
+        elif "metadata" in event:
+            usage = event["metadata"].get("usage", {})
+            return self._chunk(
+                usage={
+                    "completion_tokens": usage.get("outputTokens", 0),
+                    "prompt_tokens": usage.get("inputTokens", 0),
+                    "total_tokens": usage.get("totalTokens", 0),
+                }
+            )
+        return None
+
+    def __aiter__(self) -> AsyncIterator[OpenAIResponse]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[OpenAIResponse]:
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        loop.run_in_executor(self._executor, self._pump, loop)
+        try:
+            while True:
+                event = await self._queue.get()
+                if event is self._DONE:
+                    return
+                if isinstance(event, Exception):
+                    raise event
+                chunk = self._convert_event(event)
+                if chunk is not None:
+                    yield chunk
+        finally:
+            # Stop the worker if the consumer gives up early
+            self._closed.set()
 
 
 # Core class handling chat completions functionality
 class ChatCompletions:
-    def __init__(self, client):
+    MAX_CACHED_TOOLSETS = 32
+
+    def __init__(self, client, executor: ThreadPoolExecutor):
         self.client = client
+        self.executor = executor
+        self._tools_cache: OrderedDict[str, List[dict]] = OrderedDict()
 
     def _convert_openai_tools_to_bedrock_format(self, tools):
         # Convert OpenAI function calling format to Bedrock tool format
+        key = json.dumps(tools, sort_keys=True)
+        cached = self._tools_cache.get(key)
+        if cached is not None:
+            self._tools_cache.move_to_end(key)
+            return cached
+
         bedrock_tools = []
         for tool in tools:
             if tool.get("type") == "function":
@@ -81,52 +235,95 @@ class ChatCompletions:
                     }
                 }
                 bedrock_tools.append(bedrock_tool)
+
+        self._tools_cache[key] = bedrock_tools
+        if len(self._tools_cache) > self.MAX_CACHED_TOOLSETS:
+            self._tools_cache.popitem(last=False)
         return bedrock_tools
 
+    @staticmethod
+    def _convert_content(content) -> List[dict]:
+        # Convert OpenAI text or multi-part content to Bedrock content blocks
+        if content is None:
+            return []
+        if isinstance(content, str):
+            return [{"text": content}] if content else []
+        blocks = []
+        for item in content:
+            if isinstance(item, str):
+                blocks.append({"text": item})
+            elif item.get("type") == "text" and item.get("text"):
+                blocks.append({"text": item["text"]})
+            elif item.get("type") == "image_url":
+                url = item["image_url"]["url"]
+                header, _, data = url.partition(",")
+                image_format = header.split("/")[-1].split(";")[0] or "jpeg"
+                blocks.append(
+                    {
+                        "image": {
+                            "format": image_format,
+                            "source": {"bytes": base64.b64decode(data)},
+                        }
+                    }
+                )
+        return blocks
+
     def _convert_openai_messages_to_bedrock_format(self, messages):
-        # Convert OpenAI message format to Bedrock message format
+        # Convert OpenAI message format to Bedrock message format.
+        # Tool-use ids are taken from each message, so concurrent requests
+        # never share state.
         bedrock_messages = []
         system_prompt = []
+        last_tool_use_id = None
         for message in messages:
             if message.get("role") == "system":
                 system_prompt = [{"text": message.get("content")}]
             elif message.get("role") == "user":
                 bedrock_message = {
                     "role": message.get("role", "user"),
-                    "content": [{"text": message.get("content")}],
+                    "content": self._convert_content(message.get("content"))
+                    or [{"text": "."}],
                 }
                 bedrock_messages.append(bedrock_message)
             elif message.get("role") == "assistant":
                 bedrock_message = {
                     "role": "assistant",
-                    "content": [{"text": message.get("content")}],
+                    "content": self._convert_content(message.get("content")),
                 }
-                openai_tool_calls = message.get("tool_calls", [])
-                if openai_tool_calls:
-                    bedrock_tool_use = {
-                        "toolUseId": openai_tool_calls[0]["id"],
-                        "name": openai_tool_calls[0]["function"]["name"],
-                        "input": json.loads(
-                            openai_tool_calls[0]["function"]["arguments"]
-                        ),
-                    }
-                    bedrock_message["content"].append({"toolUse": bedrock_tool_use})
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = openai_tool_calls[0]["id"]
-                bedrock_messages.append(bedrock_message)
-            elif message.get("role") == "tool":
-                bedrock_message = {
-                    "role": "user",
-                    "content": [
+                for tool_call in message.get("tool_calls") or []:
+                    bedrock_message["content"].append(
                         {
-                            "toolResult": {
-                                "toolUseId": CURRENT_TOOLUSE_ID,
-                                "content": [{"text": message.get("content")}],
+                            "toolUse": {
+                                "toolUseId": tool_call["id"],
+                                "name": tool_call["function"]["name"],
+                                "input": json.loads(
+                                    tool_call["function"]["arguments"] or "{}"
+                                ),
                             }
                         }
-                    ],
-                }
+                    )
+                    last_tool_use_id = tool_call["id"]
+                if not bedrock_message["content"]:
+                    bedrock_message["content"] = [{"text": "."}]
                 bedrock_messages.append(bedrock_message)
+            elif message.get("role") == "tool":
+                tool_result = {
+                    "toolResult": {
+                        "toolUseId": message.get("tool_call_id") or last_tool_use_id,
+                        "content": self._convert_content(message.get("content"))
+                        or [{"text": "."}],
+                    }
+                }
+                previous = bedrock_messages[-1] if bedrock_messages else None
+                if (
+                    previous
+                    and previous["role"] == "user"
+                    and all("toolResult" in block for block in previous["content"])
+                ):
+                    # Results of parallel tool calls go in a single user turn
+                    previous["content"].append(tool_result)
+                else:
+                    bedrock_messages.append({"role": "user", "content": [tool_result]})
             else:
                 raise ValueError(f"Invalid role: {message.get('role')}")
         return system_prompt, bedrock_messages
@@ -146,10 +343,8 @@ class ChatCompletions:
             for content_item in bedrock_response["output"]["message"]["content"]:
                 if content_item.get("toolUse"):
                     bedrock_tool_use = content_item["toolUse"]
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
                     openai_tool_call = {
-                        "id": CURRENT_TOOLUSE_ID,
+                        "id": bedrock_tool_use["toolUseId"],
                         "type": "function",
                         "function": {
                             "name": bedrock_tool_use["name"],
@@ -192,6 +387,40 @@ class ChatCompletions:
         }
         return OpenAIResponse(openai_format)
 
+    def _build_request(
+        self,
+        model: str,
+        messages: List[Dict[str, Any]],
+        max_tokens: int,
+        temperature: float,
+        tools: Optional[List[dict]],
+        tool_choice: str,
+    ) -> Dict[str, Any]:
+        (
+            system_prompt,
+            bedrock_messages,
+        ) = self._convert_openai_messages_to_bedrock_format(messages)
+        request = {
+            "modelId": model,
+            "system": system_prompt,
+            "messages": bedrock_messages,
+            "inferenceConfig": {"temperature": temperature, "maxTokens": max_tokens},
+        }
+        if tools:
+            request["toolConfig"] = {
+                "tools": tools,
+                "toolChoice": {"any": {}}
+                if tool_choice == "required"
+                else {"auto": {}},
+            }
+        return request
+
+    async def _run(self, func, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, **kwargs)
+        )
+
     async def _invoke_bedrock(
         self,
         model: str,
@@ -203,19 +432,11 @@ class ChatCompletions:
         **kwargs,
     ) -> OpenAIResponse:
         # Non-streaming invocation of Bedrock model
-        (
-            system_prompt,
-            bedrock_messages,
-        ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
+        request = self._build_request(
+            model, messages, max_tokens, temperature, tools, tool_choice
         )
-        openai_response = self._convert_bedrock_response_to_openai_format(response)
-        return openai_response
+        response = await self._run(self.client.converse, **request)
+        return self._convert_bedrock_response_to_openai_format(response)
 
     async def _invoke_bedrock_stream(
         self,
@@ -226,94 +447,32 @@ class ChatCompletions:
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
-    ) -> OpenAIResponse:
-        # Streaming invocation of Bedrock model
-        (
-            system_prompt,
-            bedrock_messages,
-        ) = self._convert_openai_messages_to_bedrock_format(messages)
-        response = self.client.converse_stream(
-            modelId=model,
-            system=system_prompt,
-            messages=bedrock_messages,
-            inferenceConfig={"temperature": temperature, "maxTokens": max_tokens},
-            toolConfig={"tools": tools} if tools else None,
-        )
-
-        # Initialize response structure
-        bedrock_response = {
-            "output": {"message": {"role": "", "content": []}},
-            "stopReason": "",
-            "usage": {},
-            "metrics": {},
-        }
-        bedrock_response_text = ""
-        bedrock_response_tool_input = ""
-
-        # Process streaming response
-        stream = response.get("stream")
-        if stream:
-            for event in stream:
-                if event.get("messageStart", {}).get("role"):
-                    bedrock_response["output"]["message"]["role"] = event[
-                        "messageStart"
-                    ]["role"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("text"):
-                    bedrock_response_text += event["contentBlockDelta"]["delta"]["text"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["text"], end="", flush=True
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 0:
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"text": bedrock_response_text}
-                    )
-                if event.get("contentBlockStart", {}).get("start", {}).get("toolUse"):
-                    bedrock_tool_use = event["contentBlockStart"]["start"]["toolUse"]
-                    tool_use = {
-                        "toolUseId": bedrock_tool_use["toolUseId"],
-                        "name": bedrock_tool_use["name"],
-                    }
-                    bedrock_response["output"]["message"]["content"].append(
-                        {"toolUse": tool_use}
-                    )
-                    global CURRENT_TOOLUSE_ID
-                    CURRENT_TOOLUSE_ID = bedrock_tool_use["toolUseId"]
-                if event.get("contentBlockDelta", {}).get("delta", {}).get("toolUse"):
-                    bedrock_response_tool_input += event["contentBlockDelta"]["delta"][
-                        "toolUse"
-                    ]["input"]
-                    print(
-                        event["contentBlockDelta"]["delta"]["toolUse"]["input"],
-                        end="",
-                        flush=True,
-                    )
-                if event.get("contentBlockStop", {}).get("contentBlockIndex") == 1:
-                    bedrock_response["output"]["message"]["content"][1]["toolUse"][
-                        "input"
-                    ] = json.loads(bedrock_response_tool_input)
-        print()
-        openai_response = self._convert_bedrock_response_to_openai_format(
-            bedrock_response
+    ) -> BedrockStream:
+        # Streaming invocation of Bedrock model, yielding OpenAI-style chunks
+        request = self._build_request(
+            model, messages, max_tokens, temperature, tools, tool_choice
         )
-        return openai_response
+        response = await self._run(self.client.converse_stream, **request)
+        return BedrockStream(response.get("stream") or [], self.executor)
 
-    def create(
+    async def create(
         self,
         model: str,
         messages: List[Dict[str, str]],
-        max_tokens: int,
-        temperature: float,
+        max_tokens: Optional[int] = None,
+        temperature: float = 1.0,
         stream: Optional[bool] = True,
         tools: Optional[List[dict]] = None,
         tool_choice: Literal["none", "auto", "required"] = "auto",
         **kwargs,
-    ) -> OpenAIResponse:
+    ) -> OpenAIResponse | BedrockStream:
         # Main entry point for chat completion
+        max_tokens = max_tokens or kwargs.get("max_completion_tokens") or 4096
         bedrock_tools = []
         if tools is not None:
             bedrock_tools = self._convert_openai_tools_to_bedrock_format(tools)
         if stream:
-            return self._invoke_bedrock_stream(
+            return await self._invoke_bedrock_stream(
                 model,
                 messages,
                 max_tokens,
@@ -323,7 +482,7 @@ class ChatCompletions:
                 **kwargs,
             )
         else:
-            return self._invoke_bedrock(
+            return await self._invoke_bedrock(
                 model,
                 messages,
                 max_tokens,
@@ -0,0 +1,222 @@
+"""Append-only run journal for checkpointing and resuming agent runs.
+
+Each run writes one JSONL file. After every agent step a record with the
+messages added since the previous record and the step counter is
+appended; flows additionally append plan snapshots. Images referenced by
+messages are written once each, since the image store only lives in
+memory. Resuming replays the
+file (a torn last line from a crash is ignored) and restores memories,
+step counters and plans, so a run continues where it stopped instead of
+re-paying every LLM and tool call.
+"""
+
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+from app.config import PROJECT_ROOT
+from app.image_store import image_store
+from app.logger import logger
+from app.schema import Message
+
+
+if TYPE_CHECKING:
+    from app.agent.base import BaseAgent
+    from app.flow.planning import PlanningFlow
+
+
+DEFAULT_RUNS_DIR = PROJECT_ROOT / "cache" / "runs"
+
+
+class AgentCheckpoint(BaseModel):
+    """Restorable state of one agent"""
+
+    messages: List[dict] = Field(default_factory=list)
+    current_step: int = 0
+
+
+class RunState(BaseModel):
+    """State rebuilt from a run journal"""
+
+    run_id: str
+    kind: str = "agent"
+    request: Optional[str] = None
+    finished: bool = False
+    agents: Dict[str, AgentCheckpoint] = Field(default_factory=dict)
+    plans: Dict[str, Any] = Field(default_factory=dict)
+    active_plan_id: Optional[str] = None
+    current_step_index: Optional[int] = None
+    step_summaries: Dict[int, str] = Field(default_factory=dict)
+    images: Dict[str, str] = Field(default_factory=dict)
+
+
+class RunJournal:
+    """Writer and reader for one run's JSONL journal."""
+
+    def __init__(self, run_id: str, directory: Optional[Path] = None):
+        self.run_id = run_id
+        self.path = Path(directory or DEFAULT_RUNS_DIR) / f"{run_id}.jsonl"
+        # Memory.total_added already written per agent key
+        self._written: Dict[str, int] = {}
+        self._written_images: set = set()
+
+    @classmethod
+    def create(
+        cls, kind: str, request: Optional[str], directory: Optional[Path] = None
+    ) -> "RunJournal":
+        """Start a new journal for a run."""
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        journal = cls(run_id, directory)
+        journal.path.parent.mkdir(parents=True, exist_ok=True)
+        journal.append({"type": "start", "kind": kind, "request": request})
+        logger.info(
+            f"Checkpointing run to {journal.path} (resume with --resume {run_id})"
+        )
+        return journal
+
+    @classmethod
+    def open(cls, run_id: str, directory: Optional[Path] = None) -> "RunJournal":
+        """Open an existing journal to resume it.
+
+        Raises:
+            FileNotFoundError: If there is no journal for run_id
+        """
+        journal = cls(run_id, directory)
+        if not journal.path.exists():
+            raise FileNotFoundError(f"No journal found for run {run_id}")
+        return journal
+
+    def append(self, record: Dict[str, Any]) -> None:
+        record = {"time": time.time(), **record}
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    @staticmethod
+    def agent_key(agent: "BaseAgent") -> str:
+        """Return the id an agent's records are stored under."""
+        return agent.journal_key or agent.name
+
+    def record_images(self, messages: List[Message]) -> None:
+        """Append the images of these messages not yet in the journal."""
+        for message in messages:
+            if not message.image_id or message.image_id in self._written_images:
+                continue
+            data = message.base64_image
+            if data is None:
+                logger.warning(f"Image {message.image_id[:12]} is no longer stored")
+                continue
+            self.append({"type": "image", "image_id": message.image_id, "data": data})
+            self._written_images.add(message.image_id)
+
+    def record_agent(self, agent: "BaseAgent") -> None:
+        """Append the agent's new messages and step counter."""
+        key = self.agent_key(agent)
+        memory = agent.memory
+        written = self._written.get(key, 0)
+        new = min(memory.total_added - written, len(memory.messages))
+        messages = memory.get_recent_messages(new) if new > 0 else []
+        self._written[key] = memory.total_added
+        self.record_images(messages)
+        self.append(
+            {
+                "type": "agent",
+                "agent": key,
+                "current_step": agent.current_step,
+                "messages": [message.model_dump() for message in messages],
+            }
+        )
+
+    def record_plan(self, flow: "PlanningFlow") -> None:
+        """Append a snapshot of the flow's active plan and position."""
+        # Only the active plan: a shared plan store may hold other flows' plans
+        plan = flow.planning_tool.store.get(flow.active_plan_id)
+        self.append(
+            {
+                "type": "plan",
+                "plans": {flow.active_plan_id: plan} if plan is not None else {},
+                "active_plan_id": flow.active_plan_id,
+                "current_step_index": flow.current_step_index,
+                "step_summaries": flow.step_summaries,
+            }
+        )
+
+    def finish(self, status: str = "completed") -> None:
+        self.append({"type": "end", "status": status})
+
+    def load(self) -> RunState:
+        """Rebuild the run state by replaying the journal."""
+        state = RunState(run_id=self.run_id)
+        with self.path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping torn record in {self.path}")
+                    continue
+                kind = record.get("type")
+                if kind == "start":
+                    state.kind = record.get("kind", "agent")
+                    state.request = record.get("request")
+                elif kind == "image":
+                    state.images[record["image_id"]] = record["data"]
+                elif kind == "agent":
+                    checkpoint = state.agents.setdefault(
+                        record["agent"], AgentCheckpoint()
+                    )
+                    checkpoint.messages.extend(record.get("messages", []))
+                    checkpoint.current_step = record.get("current_step", 0)
+                elif kind == "plan":
+                    state.plans = record.get("plans", {})
+                    state.active_plan_id = record.get("active_plan_id")
+                    state.current_step_index = record.get("current_step_index")
+                    # JSON object keys are strings; step indices are ints
+                    state.step_summaries = {
+                        int(index): summary
+                        for index, summary in record.get("step_summaries", {}).items()
+                    }
+                elif kind == "end":
+                    state.finished = True
+                elif kind == "resume":
+                    state.finished = False
+        return state
+
+    def restore_agent(self, agent: "BaseAgent", state: RunState) -> bool:
+        """Restore an agent's memory and step counter. Returns False if absent."""
+        agent.journal = self
+        key = self.agent_key(agent)
+        checkpoint = state.agents.get(key)
+        if checkpoint is None:
+            return False
+        for message in checkpoint.messages:
+            image_id = message.get("image_id")
+            if image_id in state.images:
+                image_store.put(state.images[image_id])
+                self._written_images.add(image_id)
+        agent.memory.clear()
+        agent.memory.add_messages(
+            [Message(**message) for message in checkpoint.messages]
+        )
+        agent.current_step = checkpoint.current_step
+        self._written[key] = agent.memory.total_added
+        return True
+
+    def restore_flow(self, flow: "PlanningFlow", state: RunState) -> None:
+        """Restore a planning flow's plans and its agents."""
+        for plan in state.plans.values():
+            flow.planning_tool.store.put(plan)
+        if state.active_plan_id:
+            flow.active_plan_id = state.active_plan_id
+        flow.current_step_index = state.current_step_index
+        flow.step_summaries.update(state.step_summaries)
+        flow.journal = self
+        for key, agent in flow.agents.items():
+            agent.journal_key = agent.journal_key or key
+            self.restore_agent(agent, state)
+
+    def resumed(self) -> None:
+        self.append({"type": "resume"})
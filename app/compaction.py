@@ -0,0 +1,219 @@
+"""Token-budget compaction of agent memory.
+
+The compactor builds a bounded view of the conversation for each request
+without modifying the underlying Memory. Old tool observations are shrunk
+first (truncated, or summarized by the LLM with the summaries cached); if
+that is not enough the oldest messages are dropped. An assistant message
+with tool_calls and its tool results are always kept or dropped together.
+"""
+
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import List, Optional
+
+from app.config import MemorySettings, config
+from app.llm import LLM, RequestPriority, request_priority
+from app.logger import logger
+from app.schema import Message, Role
+
+
+SUMMARY_PROMPT = (
+    "Summarize the following tool output in a few sentences. Keep facts, "
+    "numbers, file paths, URLs and errors that later steps may need.\n\n"
+    "Tool: {name}\n\nOutput:\n{content}"
+)
+
+
+def group_messages(messages: List[Message]) -> List[List[Message]]:
+    """Split messages into groups that must be kept or dropped together.
+
+    An assistant message with tool_calls forms one group with the tool
+    results that follow it; every other message is its own group.
+    """
+    groups: List[List[Message]] = []
+    for message in messages:
+        if message.role == Role.TOOL and groups and groups[-1][0].tool_calls:
+            groups[-1].append(message)
+        else:
+            groups.append([message])
+    return groups
+
+
+class MemoryCompactor:
+    """Keeps the message history sent to the LLM under a token budget."""
+
+    MAX_SUMMARIES = 1024
+
+    def __init__(
+        self,
+        llm: LLM,
+        token_budget: int,
+        keep_recent: int = 6,
+        observation_limit: int = 2000,
+        summarize: bool = False,
+    ):
+        self.llm = llm
+        self.token_budget = token_budget
+        self.keep_recent = keep_recent
+        self.observation_limit = observation_limit
+        self.summarize = summarize
+        self._summaries: OrderedDict[str, str] = OrderedDict()
+
+    @classmethod
+    def from_config(
+        cls, llm: LLM, settings: Optional[MemorySettings] = None
+    ) -> Optional["MemoryCompactor"]:
+        """Create a compactor from the [memory] settings, or None if disabled."""
+        settings = settings or config.memory
+        if settings is None or not settings.token_budget:
+            return None
+        return cls(
+            llm,
+            token_budget=settings.token_budget,
+            keep_recent=settings.keep_recent,
+            observation_limit=settings.observation_limit,
+            summarize=settings.summarize,
+        )
+
+    def count_tokens(self, message: Message) -> int:
+        """Estimate the tokens a message adds to a request."""
+        tokens = self.llm.count_message_tokens([message.to_dict()])
+        if message.image_id:
+            tokens += self.llm.token_counter.count_image({})
+        return tokens
+
+    def _truncate(self, content: str) -> str:
+        half = self.observation_limit // 2
+        elided = len(content) - 2 * half
+        return (
+            f"{content[:half]}\n... [{elided} characters elided] ...\n"
+            f"{content[-half:]}"
+        )
+
+    async def _summarize(self, message: Message) -> str:
+        key = hashlib.sha256(message.content.encode("utf-8")).hexdigest()
+        summary = self._summaries.get(key)
+        if summary is not None:
+            self._summaries.move_to_end(key)
+            return summary
+        try:
+            with request_priority(RequestPriority.BACKGROUND):
+                summary = await self.llm.ask(
+                    [
+                        Message.user_message(
+                            SUMMARY_PROMPT.format(
+                                name=message.name, content=message.content
+                            )
+                        )
+                    ],
+                    stream=False,
+                )
+        except Exception as e:
+            logger.warning(f"Failed to summarize tool output, truncating: {e}")
+            return self._truncate(message.content)
+        summary = f"[Summary of earlier output] {summary}"
+        self._summaries[key] = summary
+        if len(self._summaries) > self.MAX_SUMMARIES:
+            self._summaries.popitem(last=False)
+        return summary
+
+    async def _shrink(self, message: Message) -> Message:
+        """Return a smaller copy of an old tool observation."""
+        content = message.content or ""
+        if len(content) > self.observation_limit:
+            content = (
+                await self._summarize(message)
+                if self.summarize
+                else self._truncate(content)
+            )
+        return message.model_copy(update={"content": content, "image_id": None})
+
+    def _is_shrinkable(self, message: Message) -> bool:
+        return message.role == Role.TOOL and (
+            message.image_id is not None
+            or len(message.content or "") > self.observation_limit
+        )
+
+    async def compact(
+        self, messages: List[Message], reserved_tokens: int = 0
+    ) -> List[Message]:
+        """Return a view of messages that fits the budget.
+
+        Args:
+            messages: Conversation history, oldest first
+            reserved_tokens: Tokens already used by the system prompt and tools
+
+        Returns:
+            The original list if it fits, otherwise a compacted copy
+        """
+        budget = self.token_budget - reserved_tokens
+        if sum(self.count_tokens(message) for message in messages) <= budget:
+            return messages
+
+        groups = group_messages(messages)
+        # The system prompt, the original request and the recent steps are kept
+        protected = {
+            i for i, group in enumerate(groups) if group[0].role == Role.SYSTEM
+        }
+        first_user = next(
+            (i for i, group in enumerate(groups) if group[0].role == Role.USER), None
+        )
+        if first_user is not None:
+            protected.add(first_user)
+        protected.update(range(max(0, len(groups) - self.keep_recent), len(groups)))
+        old = [i for i in range(len(groups)) if i not in protected]
+
+        # Phase 1: shrink old observations
+        targets = [
+            (i, j)
+            for i in old
+            for j, message in enumerate(groups[i])
+            if self._is_shrinkable(message)
+        ]
+        if targets:
+            shrunk = await asyncio.gather(
+                *(self._shrink(groups[i][j]) for i, j in targets)
+            )
+            for (i, j), message in zip(targets, shrunk):
+                groups[i][j] = message
+
+        group_tokens = [
+            sum(self.count_tokens(message) for message in group) for group in groups
+        ]
+        total = sum(group_tokens)
+
+        # Phase 2: drop the oldest unprotected groups
+        dropped = set()
+        for i in old:
+            if total <= budget:
+                break
+            dropped.add(i)
+            total -= group_tokens[i]
+
+        compacted: List[Message] = []
+        notice_added = False
+        dropped_messages = sum(len(groups[i]) for i in dropped)
+        for i, group in enumerate(groups):
+            if i in dropped:
+                if not notice_added:
+                    compacted.append(
+                        Message.user_message(
+                            f"[{dropped_messages} earlier messages were removed "
+                            "to fit the context budget]"
+                        )
+                    )
+                    notice_added = True
+                continue
+            compacted.extend(group)
+
+        if total > budget:
+            logger.warning(
+                f"Compacted history still uses ~{total} tokens (budget {budget})"
+            )
+        else:
+            logger.debug(
+                f"Compacted history to ~{total} tokens: {len(targets)} observations "
+                f"shrunk, {dropped_messages} messages dropped"
+            )
+        return compacted
@@ -28,6 +28,120 @@ class LLMSettings(BaseModel):
     temperature: float = Field(1.0, description="Sampling temperature")
     api_type: str = Field(..., description="Azure, Openai, or Ollama")
     api_version: str = Field(..., description="Azure Openai version if AzureOpenai")
+    http2: bool = Field(True, description="Use HTTP/2 when the h2 package is available")
+    max_connections: int = Field(
+        100, description="Maximum concurrent connections to the API endpoint"
+    )
+    max_keepalive_connections: int = Field(
+        20, description="Maximum idle keep-alive connections kept in the pool"
+    )
+    keepalive_expiry: float = Field(
+        30.0, description="Seconds an idle keep-alive connection is kept open"
+    )
+    max_concurrent_requests: Optional[int] = Field(
+        None,
+        description="Requests in flight per endpoint; extra requests queue by priority (None for unlimited)",
+    )
+    rpm: Optional[int] = Field(
+        None, description="Client-side requests per minute limit (None for unlimited)"
+    )
+    tpm: Optional[int] = Field(
+        None, description="Client-side tokens per minute limit (None for unlimited)"
+    )
+    fallbacks: List[str] = Field(
+        default_factory=list,
+        description="Other [llm.*] sections serving the same model; requests go to the fastest healthy endpoint",
+    )
+    hedge_requests: bool = Field(
+        False,
+        description="Duplicate slow requests on the next endpoint once they exceed the observed p95 latency",
+    )
+
+
+class LLMCacheSettings(BaseModel):
+    """Configuration for the LLM response cache"""
+
+    mode: str = Field(
+        "off",
+        description="Cache mode: off, on (read/write), record (always call and overwrite) or replay (fail on miss)",
+    )
+    path: Optional[str] = Field(
+        None,
+        description="SQLite cache file (defaults to <root>/cache/llm_cache.sqlite)",
+    )
+    memory_entries: int = Field(256, description="Entries kept in the in-memory LRU")
+    max_disk_bytes: int = Field(
+        512 * 1024 * 1024,
+        description="Size above which the disk tier evicts LRU entries",
+    )
+
+
+class MemorySettings(BaseModel):
+    """Configuration for agent memory compaction"""
+
+    token_budget: Optional[int] = Field(
+        None,
+        description="Token budget for the prompt history; older context is compacted above it (None disables compaction)",
+    )
+    keep_recent: int = Field(
+        6, description="Most recent message groups that are never compacted"
+    )
+    observation_limit: int = Field(
+        2000, description="Characters kept from an old tool observation"
+    )
+    summarize: bool = Field(
+        False,
+        description="Summarize old tool observations with the LLM instead of truncating them",
+    )
+    max_images: Optional[int] = Field(
+        3,
+        description="Most recent images sent with each request; older ones stay in memory only (None for all)",
+    )
+    image_max_size: Optional[int] = Field(
+        1024,
+        description="Longest side in pixels images are downscaled to before sending (None to send originals)",
+    )
+
+
+class TracingSettings(BaseModel):
+    """Configuration for run tracing"""
+
+    enabled: bool = Field(
+        False, description="Record spans for steps, LLM and tool calls"
+    )
+    output_dir: Optional[str] = Field(
+        None,
+        description="Directory for trace files, relative to the project root (defaults to <root>/logs/traces)",
+    )
+    formats: List[str] = Field(
+        ["chrome"],
+        description="Export formats: chrome (chrome://tracing / Perfetto JSON) and/or otel (OTLP JSON lines)",
+    )
+
+
+class SessionSettings(BaseModel):
+    """Configuration for the multi-session runner"""
+
+    max_sessions: int = Field(8, description="Sessions running concurrently")
+    max_pending: int = Field(
+        32, description="Sessions waiting for a slot; further sessions are rejected"
+    )
+    session_timeout: Optional[float] = Field(
+        None, description="Seconds a session may run before it is cancelled"
+    )
+
+
+class PlanningSettings(BaseModel):
+    """Configuration for PlanningTool plan storage"""
+
+    store: str = Field(
+        "memory",
+        description="Plan store: memory (per planning tool) or sqlite (persistent, shared between processes)",
+    )
+    path: Optional[str] = Field(
+        None,
+        description="SQLite plan store file (defaults to <root>/cache/plans.sqlite)",
+    )
 
 
 class ProxySettings(BaseModel):
@@ -64,6 +178,14 @@ class RunflowSettings(BaseModel):
     use_data_analysis_agent: bool = Field(
         default=False, description="Enable data analysis agent in run flow"
     )
+    max_parallel_steps: int = Field(
+        3,
+        description="Maximum plan steps run concurrently once their dependencies are completed",
+    )
+    step_memory: str = Field(
+        "shared",
+        description="shared: executors keep their memory across plan steps; scoped: each step starts from an empty memory with summaries of earlier step results",
+    )
 
 
 class BrowserSettings(BaseModel):
@@ -133,6 +255,13 @@ class MCPServerConfig(BaseModel):
     args: List[str] = Field(
         default_factory=list, description="Arguments for stdio command"
     )
+    connect_timeout: Optional[float] = Field(
+        None,
+        description="Connect timeout in seconds (defaults to [mcp] connect_timeout)",
+    )
+    lazy: Optional[bool] = Field(
+        None, description="Connect on first tool call (defaults to [mcp] lazy)"
+    )
 
 
 class MCPSettings(BaseModel):
@@ -144,6 +273,13 @@ class MCPSettings(BaseModel):
     servers: Dict[str, MCPServerConfig] = Field(
         default_factory=dict, description="MCP server configurations"
     )
+    connect_timeout: float = Field(
+        30.0, description="Seconds to wait for each MCP server to connect"
+    )
+    lazy: bool = Field(
+        False,
+        description="Register cached tool schemas and connect a server only when one of its tools is first called",
+    )
 
     @classmethod
     def load_server_config(cls) -> Dict[str, MCPServerConfig]:
@@ -165,6 +301,8 @@ class MCPSettings(BaseModel):
                         url=server_config.get("url"),
                         command=server_config.get("command"),
                         args=server_config.get("args", []),
+                        connect_timeout=server_config.get("connect_timeout"),
+                        lazy=server_config.get("lazy"),
                     )
                 return servers
         except Exception as e:
@@ -173,6 +311,21 @@ class MCPSettings(BaseModel):
 
 class AppConfig(BaseModel):
     llm: Dict[str, LLMSettings]
+    llm_cache: Optional[LLMCacheSettings] = Field(
+        None, description="LLM response cache configuration"
+    )
+    memory: Optional[MemorySettings] = Field(
+        None, description="Memory compaction configuration"
+    )
+    tracing: Optional[TracingSettings] = Field(
+        None, description="Tracing configuration"
+    )
+    sessions: Optional[SessionSettings] = Field(
+        None, description="Session runner configuration"
+    )
+    planning: Optional[PlanningSettings] = Field(
+        None, description="Plan storage configuration"
+    )
     sandbox: Optional[SandboxSettings] = Field(
         None, description="Sandbox configuration"
     )
@@ -246,6 +399,15 @@ class Config:
             "temperature": base_llm.get("temperature", 1.0),
             "api_type": base_llm.get("api_type", ""),
             "api_version": base_llm.get("api_version", ""),
+            "http2": base_llm.get("http2", True),
+            "max_connections": base_llm.get("max_connections", 100),
+            "max_keepalive_connections": base_llm.get("max_keepalive_connections", 20),
+            "keepalive_expiry": base_llm.get("keepalive_expiry", 30.0),
+            "max_concurrent_requests": base_llm.get("max_concurrent_requests"),
+            "rpm": base_llm.get("rpm"),
+            "tpm": base_llm.get("tpm"),
+            "fallbacks": base_llm.get("fallbacks", []),
+            "hedge_requests": base_llm.get("hedge_requests", False),
         }
 
         # handle browser config.
@@ -305,6 +467,21 @@ class Config:
         else:
             mcp_settings = MCPSettings(servers=MCPSettings.load_server_config())
 
+        llm_cache_config = raw_config.get("llm_cache", {})
+        llm_cache_settings = LLMCacheSettings(**llm_cache_config)
+
+        memory_config = raw_config.get("memory", {})
+        memory_settings = MemorySettings(**memory_config)
+
+        tracing_config = raw_config.get("tracing", {})
+        tracing_settings = TracingSettings(**tracing_config)
+
+        session_config = raw_config.get("sessions", {})
+        session_settings = SessionSettings(**session_config)
+
+        planning_config = raw_config.get("planning", {})
+        planning_settings = PlanningSettings(**planning_config)
+
         run_flow_config = raw_config.get("runflow")
         if run_flow_config:
             run_flow_settings = RunflowSettings(**run_flow_config)
@@ -318,6 +495,11 @@ class Config:
                     for name, override_config in llm_overrides.items()
                 },
             },
+            "llm_cache": llm_cache_settings,
+            "memory": memory_settings,
+            "tracing": tracing_settings,
+            "sessions": session_settings,
+            "planning": planning_settings,
             "sandbox": sandbox_settings,
             "browser_config": browser_settings,
             "search_config": search_settings,
@@ -332,6 +514,26 @@ class Config:
     def llm(self) -> Dict[str, LLMSettings]:
         return self._config.llm
 
+    @property
+    def llm_cache(self) -> LLMCacheSettings:
+        return self._config.llm_cache
+
+    @property
+    def memory(self) -> MemorySettings:
+        return self._config.memory
+
+    @property
+    def tracing(self) -> TracingSettings:
+        return self._config.tracing
+
+    @property
+    def sessions(self) -> SessionSettings:
+        return self._config.sessions
+
+    @property
+    def planning(self) -> PlanningSettings:
+        return self._config.planning
+
     @property
     def sandbox(self) -> SandboxSettings:
         return self._config.sandbox
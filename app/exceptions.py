@@ -11,3 +11,11 @@ class OpenManusError(Exception):
 
 class TokenLimitExceeded(OpenManusError):
     """Exception raised when the token limit is exceeded"""
+
+
+class LLMCacheMiss(OpenManusError):
+    """Exception raised when the LLM cache is in replay mode and has no entry"""
+
+
+class SessionRejected(OpenManusError):
+    """Exception raised when a session runner is at capacity"""
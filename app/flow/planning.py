@@ -1,16 +1,28 @@
+import asyncio
+import itertools
 import json
+import re
 import time
+import uuid
 from enum import Enum
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from pydantic import Field
 
 from app.agent.base import BaseAgent
+from app.checkpoint import RunJournal
+from app.config import config
+from app.exceptions import ToolError
 from app.flow.base import BaseFlow
-from app.llm import LLM
+from app.llm import LLM, RequestPriority, request_priority
 from app.logger import logger
-from app.schema import AgentState, Message, ToolChoice
+from app.schema import AgentState, Message, Role, ToolChoice
 from app.tool import PlanningTool
+from app.tracing import tracer
+
+
+# Longest summary kept of one step's result
+STEP_SUMMARY_CHARS = 500
 
 
 class PlanStepStatus(str, Enum):
@@ -48,8 +60,35 @@ class PlanningFlow(BaseFlow):
     llm: LLM = Field(default_factory=lambda: LLM())
     planning_tool: PlanningTool = Field(default_factory=PlanningTool)
     executor_keys: List[str] = Field(default_factory=list)
-    active_plan_id: str = Field(default_factory=lambda: f"plan_{int(time.time())}")
+    # Unique across processes, which may share a persistent plan store
+    active_plan_id: str = Field(
+        default_factory=lambda: f"plan_{int(time.time())}_{uuid.uuid4().hex[:8]}"
+    )
     current_step_index: Optional[int] = None
+    max_parallel_steps: int = Field(
+        default_factory=lambda: config.run_flow_config.max_parallel_steps,
+        description="Maximum plan steps run concurrently",
+    )
+    journal: Optional[RunJournal] = Field(
+        None, description="Append-only journal plan state is checkpointed to"
+    )
+    plan_delta_prompts: bool = Field(
+        True,
+        description="After an executor's first step, send only the plan changes since its last step",
+    )
+    step_memory: str = Field(
+        default_factory=lambda: config.run_flow_config.step_memory,
+        description="shared: executors keep their memory across steps; scoped: each step starts from an empty memory",
+    )
+    step_summaries: Dict[int, str] = Field(
+        default_factory=dict,
+        description="Short result of each completed step, given to later scoped steps",
+    )
+    step_summary_budget: int = Field(
+        2000, description="Characters of earlier step summaries in a scoped step prompt"
+    )
+    # Plan state each executor last saw, by id(executor)
+    _plan_snapshots: Dict[int, dict] = {}
 
     def __init__(
         self, agents: Union[BaseAgent, List[BaseAgent], Dict[str, BaseAgent]], **data
@@ -97,41 +136,118 @@ class PlanningFlow(BaseFlow):
             if not self.primary_agent:
                 raise ValueError("No primary agent available")
 
+            if self.journal:
+                for key, agent in self.agents.items():
+                    agent.journal = agent.journal or self.journal
+                    agent.journal_key = agent.journal_key or key
+
             # Create initial plan if input provided
             if input_text:
                 await self._create_initial_plan(input_text)
 
                 # Verify plan was created successfully
-                if self.active_plan_id not in self.planning_tool.plans:
+                if await self.planning_tool.get_plan(self.active_plan_id) is None:
                     logger.error(
                         f"Plan creation failed. Plan ID {self.active_plan_id} not found in planning tool."
                     )
                     return f"Failed to create plan for: {input_text}"
+                self._checkpoint()
 
-            result = ""
-            while True:
-                # Get current step to execute
-                self.current_step_index, step_info = await self._get_current_step_info()
+            step_results = await self._execute_steps()
+            result = "".join(
+                step_results[index] + "\n" for index in sorted(step_results)
+            )
+            return result + await self._finalize_plan()
+        except Exception as e:
+            logger.error(f"Error in PlanningFlow: {str(e)}")
+            return f"Execution failed: {str(e)}"
+
+    async def _execute_steps(self) -> Dict[int, str]:
+        """Run plan steps as their dependencies complete, up to max_parallel_steps at once.
 
-                # Exit if no more steps or plan completed
-                if self.current_step_index is None:
-                    result += await self._finalize_plan()
-                    break
+        Each running step has its own executor: the flow's agent for the step
+        type when it is free, otherwise one spawned for that step.
 
-                # Execute current step with appropriate agent
-                step_type = step_info.get("type") if step_info else None
-                executor = self.get_executor(step_type)
-                step_result = await self._execute_step(executor, step_info)
-                result += step_result + "\n"
+        Returns:
+            Step results by step index
+        """
+        running: Dict[asyncio.Task, Tuple[int, BaseAgent, bool]] = {}
+        results: Dict[int, str] = {}
+        finished = False
+        try:
+            while True:
+                if not finished:
+                    for index, step_info in await self._get_ready_steps():
+                        if len(running) >= max(1, self.max_parallel_steps):
+                            break
+                        if any(index == item[0] for item in running.values()):
+                            continue
+                        executor, spawned = await self._acquire_executor(
+                            step_info.get("type"),
+                            busy=[item[1] for item in running.values()],
+                        )
+                        await self._mark_step(index, PlanStepStatus.IN_PROGRESS.value)
+                        task = asyncio.create_task(
+                            self._execute_step(executor, step_info, index)
+                        )
+                        running[task] = (index, executor, spawned)
+                    self.current_step_index = min(
+                        (item[0] for item in running.values()), default=None
+                    )
+                    self._checkpoint()
 
-                # Check if agent wants to terminate
-                if hasattr(executor, "state") and executor.state == AgentState.FINISHED:
-                    break
+                if not running:
+                    return results
 
-            return result
+                done, _ = await asyncio.wait(
+                    running, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    index, executor, spawned = running.pop(task)
+                    results[index] = task.result()
+                    # Check if agent wants to terminate; running steps still finish
+                    if executor.state == AgentState.FINISHED:
+                        finished = True
+                    if spawned:
+                        self._release_spawned(executor)
+                        if hasattr(executor, "cleanup"):
+                            await executor.cleanup()
+                self.current_step_index = min(
+                    (item[0] for item in running.values()), default=None
+                )
+                self._checkpoint()
+        finally:
+            for task in running:
+                task.cancel()
+            # Let cancelled steps unwind before their executors are cleaned up
+            await asyncio.gather(*running, return_exceptions=True)
+            for _, executor, spawned in running.values():
+                if spawned:
+                    self._release_spawned(executor)
+                    if hasattr(executor, "cleanup"):
+                        await executor.cleanup()
+
+    def _release_spawned(self, executor: BaseAgent) -> None:
+        # Its id may be reused by a later agent that has not seen the plan
+        self._plan_snapshots.pop(id(executor), None)
+
+    async def _acquire_executor(
+        self, step_type: Optional[str], busy: List[BaseAgent]
+    ) -> Tuple[BaseAgent, bool]:
+        """Return an executor for a step and whether it was spawned for it."""
+        executor = self.get_executor(step_type)
+        if all(executor is not other for other in busy):
+            return executor, False
+        return await executor.spawn(), True
+
+    def _checkpoint(self) -> None:
+        """Append the plan state to the run journal, if one is attached."""
+        if self.journal is None:
+            return
+        try:
+            self.journal.record_plan(self)
         except Exception as e:
-            logger.error(f"Error in PlanningFlow: {str(e)}")
-            return f"Execution failed: {str(e)}"
+            logger.warning(f"Failed to checkpoint plan state: {e}")
 
     async def _create_initial_plan(self, request: str) -> None:
         """Create an initial plan based on the request using the flow's LLM and PlanningTool."""
@@ -140,7 +256,9 @@ class PlanningFlow(BaseFlow):
         system_message_content = (
             "You are a planning assistant. Create a concise, actionable plan with clear steps. "
             "Focus on key milestones rather than detailed sub-steps. "
-            "Optimize for clarity and efficiency."
+            "Optimize for clarity and efficiency. "
+            "When some steps do not depend on each other, set step_dependencies "
+            "so they can be worked on in parallel."
         )
         agents_description = []
         for key in self.executor_keys:
@@ -168,12 +286,13 @@ class PlanningFlow(BaseFlow):
         )
 
         # Call LLM with PlanningTool
-        response = await self.llm.ask_tool(
-            messages=[user_message],
-            system_msgs=[system_message],
-            tools=[self.planning_tool.to_param()],
-            tool_choice=ToolChoice.AUTO,
-        )
+        with request_priority(RequestPriority.PLANNING):
+            response = await self.llm.ask_tool(
+                messages=[user_message],
+                system_msgs=[system_message],
+                tools=[self.planning_tool.to_param()],
+                tool_choice=ToolChoice.AUTO,
+            )
 
         # Process tool calls if present
         if response.tool_calls:
@@ -210,129 +329,210 @@ class PlanningFlow(BaseFlow):
             }
         )
 
-    async def _get_current_step_info(self) -> tuple[Optional[int], Optional[dict]]:
+    async def _get_ready_steps(self) -> List[Tuple[int, dict]]:
         """
-        Parse the current plan to identify the first non-completed step's index and info.
-        Returns (None, None) if no active step is found.
+        Return the index and info of every open step whose dependencies are completed.
+        Returns an empty list if the plan is missing or has no ready step.
         """
-        if (
-            not self.active_plan_id
-            or self.active_plan_id not in self.planning_tool.plans
-        ):
-            logger.error(f"Plan with ID {self.active_plan_id} not found")
-            return None, None
-
         try:
-            # Direct access to plan data from planning tool storage
-            plan_data = self.planning_tool.plans[self.active_plan_id]
-            steps = plan_data.get("steps", [])
-            step_statuses = plan_data.get("step_statuses", [])
-
-            # Find first non-completed step
-            for i, step in enumerate(steps):
-                if i >= len(step_statuses):
-                    status = PlanStepStatus.NOT_STARTED.value
-                else:
-                    status = step_statuses[i]
-
-                if status in PlanStepStatus.get_active_statuses():
-                    # Extract step type/category if available
-                    step_info = {"text": step}
-
-                    # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
-                    import re
-
-                    type_match = re.search(r"\[([A-Z_]+)\]", step)
-                    if type_match:
-                        step_info["type"] = type_match.group(1).lower()
-
-                    # Mark current step as in_progress
-                    try:
-                        await self.planning_tool.execute(
-                            command="mark_step",
-                            plan_id=self.active_plan_id,
-                            step_index=i,
-                            step_status=PlanStepStatus.IN_PROGRESS.value,
-                        )
-                    except Exception as e:
-                        logger.warning(f"Error marking step as in_progress: {e}")
-                        # Update step status directly if needed
-                        if i < len(step_statuses):
-                            step_statuses[i] = PlanStepStatus.IN_PROGRESS.value
-                        else:
-                            while len(step_statuses) < i:
-                                step_statuses.append(PlanStepStatus.NOT_STARTED.value)
-                            step_statuses.append(PlanStepStatus.IN_PROGRESS.value)
-
-                        plan_data["step_statuses"] = step_statuses
-
-                    return i, step_info
-
-            return None, None  # No active step found
-
-        except Exception as e:
-            logger.warning(f"Error finding current step index: {e}")
-            return None, None
+            ready = await self.planning_tool.store.run(
+                self.planning_tool.ready_steps, self.active_plan_id
+            )
+        except ToolError as e:
+            logger.error(str(e))
+            return []
+
+        plan = await self.planning_tool.get_plan(self.active_plan_id)
+        if plan is None:
+            return []
+        steps = plan["steps"]
+        ready_steps = []
+        for i in ready:
+            step_info = {"text": steps[i]}
+            # Try to extract step type from the text (e.g., [SEARCH] or [CODE])
+            type_match = re.search(r"\[([A-Z_]+)\]", steps[i])
+            if type_match:
+                step_info["type"] = type_match.group(1).lower()
+            ready_steps.append((i, step_info))
+        return ready_steps
+
+    async def _execute_step(
+        self, executor: BaseAgent, step_info: dict, step_index: int
+    ) -> str:
+        """Execute one step with the specified agent using agent.run()."""
+        scoped = self.step_memory == "scoped"
+        if scoped:
+            # Earlier steps reach this one only through their summaries
+            executor.memory.clear()
+            self._plan_snapshots.pop(id(executor), None)
 
-    async def _execute_step(self, executor: BaseAgent, step_info: dict) -> str:
-        """Execute the current step with the specified agent using agent.run()."""
         # Prepare context for the agent with current plan status
-        plan_status = await self._get_plan_text()
-        step_text = step_info.get("text", f"Step {self.current_step_index}")
+        plan_context = await self._get_plan_context(executor)
+        if scoped:
+            plan = await self.planning_tool.get_plan(self.active_plan_id)
+            plan_context += self._format_step_summaries(plan, step_index)
+        step_text = step_info.get("text", f"Step {step_index}")
 
         # Create a prompt for the agent to execute the current step
         step_prompt = f"""
-        CURRENT PLAN STATUS:
-        {plan_status}
+        {plan_context}
 
         YOUR CURRENT TASK:
-        You are now working on step {self.current_step_index}: "{step_text}"
+        You are now working on step {step_index}: "{step_text}"
 
         Please only execute this current step using the appropriate tools. When you're done, provide a summary of what you accomplished.
         """
 
         # Use agent.run() to execute the step
         try:
-            step_result = await executor.run(step_prompt)
+            with tracer.span("flow.step", category="flow", step=step_index):
+                with request_priority(RequestPriority.BATCH):
+                    step_result = await executor.run(step_prompt)
 
             # Mark the step as completed after successful execution
-            await self._mark_step_completed()
+            self.step_summaries[step_index] = self._summarize_step(
+                executor, step_result
+            )
+            await self._mark_step(step_index, PlanStepStatus.COMPLETED.value)
 
             return step_result
         except Exception as e:
-            logger.error(f"Error executing step {self.current_step_index}: {e}")
-            return f"Error executing step {self.current_step_index}: {str(e)}"
-
-    async def _mark_step_completed(self) -> None:
-        """Mark the current step as completed."""
-        if self.current_step_index is None:
-            return
+            logger.error(f"Error executing step {step_index}: {e}")
+            # Blocked keeps the steps that depend on it from running
+            await self._mark_step(
+                step_index, PlanStepStatus.BLOCKED.value, f"Error: {e}"
+            )
+            return f"Error executing step {step_index}: {str(e)}"
 
+    async def _mark_step(self, step_index: int, status: str, notes: str = "") -> None:
+        """Set a step's status. The update does not yield to the event loop, so
+        steps finishing concurrently cannot interleave their plan updates."""
         try:
-            # Mark the step as completed
             await self.planning_tool.execute(
                 command="mark_step",
                 plan_id=self.active_plan_id,
-                step_index=self.current_step_index,
-                step_status=PlanStepStatus.COMPLETED.value,
+                step_index=step_index,
+                step_status=status,
+                step_notes=notes,
             )
             logger.info(
-                f"Marked step {self.current_step_index} as completed in plan {self.active_plan_id}"
+                f"Marked step {step_index} as {status} in plan {self.active_plan_id}"
             )
-        except Exception as e:
+        except ToolError as e:
             logger.warning(f"Failed to update plan status: {e}")
-            # Update step status directly in planning tool storage
-            if self.active_plan_id in self.planning_tool.plans:
-                plan_data = self.planning_tool.plans[self.active_plan_id]
-                step_statuses = plan_data.get("step_statuses", [])
 
-                # Ensure the step_statuses list is long enough
-                while len(step_statuses) <= self.current_step_index:
-                    step_statuses.append(PlanStepStatus.NOT_STARTED.value)
+    async def _get_plan_context(self, executor: BaseAgent) -> str:
+        """Return the plan status for a step prompt.
+
+        An executor gets the full plan the first time; afterwards, with
+        plan_delta_prompts, only the steps that changed since its previous
+        step, as long as the prompt with the full plan is still in its memory.
+        """
+        plan = await self.planning_tool.get_plan(self.active_plan_id)
+        if plan is None:
+            return f"CURRENT PLAN STATUS:\n{await self._get_plan_text()}"
+
+        previous = self._plan_snapshots.get(id(executor))
+        delta = (
+            self.plan_delta_prompts
+            and previous is not None
+            and previous["steps"] == plan["steps"]
+            and self._full_plan_in_memory(executor, previous["full_plan_at"])
+        )
+        self._plan_snapshots[id(executor)] = {
+            "steps": plan["steps"],
+            "step_statuses": plan["step_statuses"],
+            "step_notes": plan["step_notes"],
+            # Memory position of the step prompt carrying the full plan
+            "full_plan_at": (
+                previous["full_plan_at"] if delta else executor.memory.total_added
+            ),
+        }
+        if delta:
+            return f"PLAN CHANGES SINCE YOUR LAST STEP:\n{self._format_plan_delta(previous, plan)}"
+        return f"CURRENT PLAN STATUS:\n{self.planning_tool.render_plan(plan)}"
+
+    @staticmethod
+    def _full_plan_in_memory(executor: BaseAgent, full_plan_at: int) -> bool:
+        """Whether the prompt added at position full_plan_at is still sent to the LLM.
+
+        It may have been trimmed from memory, and a compactor only guarantees
+        to keep the first user message.
+        """
+        memory = executor.memory
+        age = memory.total_added - full_plan_at
+        if not 0 < age <= len(memory.messages):
+            return False
+        if executor.compactor is None:
+            return True
+        index = len(memory.messages) - age
+        return not any(
+            message.role == Role.USER
+            for message in itertools.islice(memory.messages, index)
+        )
 
-                # Update the status
-                step_statuses[self.current_step_index] = PlanStepStatus.COMPLETED.value
-                plan_data["step_statuses"] = step_statuses
+    @staticmethod
+    def _format_plan_delta(previous: dict, plan: dict) -> str:
+        """List the steps whose status or notes changed between two plan states."""
+        statuses = plan["step_statuses"]
+        completed = statuses.count(PlanStepStatus.COMPLETED.value)
+        delta = f"Progress: {completed}/{len(statuses)} steps completed\n"
+
+        status_marks = PlanStepStatus.get_status_marks()
+        changes = ""
+        for i, (step, status, notes) in enumerate(
+            zip(plan["steps"], statuses, plan["step_notes"])
+        ):
+            old_status = previous["step_statuses"][i]
+            notes_changed = notes and notes != previous["step_notes"][i]
+            if status == old_status and not notes_changed:
+                continue
+            mark = status_marks.get(
+                status, status_marks[PlanStepStatus.NOT_STARTED.value]
+            )
+            changes += f"{i}. {mark} {step}"
+            changes += f" (was {old_status})\n" if status != old_status else "\n"
+            if notes_changed:
+                changes += f"   Notes: {notes}\n"
+        return delta + (changes or "No steps changed.\n")
+
+    @staticmethod
+    def _summarize_step(executor: BaseAgent, step_result: str) -> str:
+        """Return a short result for a step: the executor's final answer, if any."""
+        summary = step_result
+        for message in reversed(executor.memory.messages):
+            if message.role == Role.ASSISTANT and message.content:
+                summary = message.content
+                break
+        summary = " ".join(summary.split())
+        if len(summary) > STEP_SUMMARY_CHARS:
+            summary = summary[: STEP_SUMMARY_CHARS - 3] + "..."
+        return summary
+
+    def _format_step_summaries(self, plan: Optional[dict], step_index: int) -> str:
+        """Summaries of earlier steps within step_summary_budget, for a scoped step.
+
+        The step's own dependencies come first, then the most recent steps.
+        """
+        dependencies = (
+            PlanningTool.dependencies(plan)[step_index]
+            if plan is not None and step_index < len(plan["steps"])
+            else []
+        )
+        others = sorted(
+            (i for i in self.step_summaries if i not in dependencies), reverse=True
+        )
+        chosen, used = [], 0
+        for i in [*dependencies, *others]:
+            summary = self.step_summaries.get(i)
+            if summary is None or used + len(summary) > self.step_summary_budget:
+                continue
+            chosen.append(i)
+            used += len(summary)
+        if not chosen:
+            return ""
+        lines = "".join(f"Step {i}: {self.step_summaries[i]}\n" for i in sorted(chosen))
+        return f"\nRESULTS OF EARLIER STEPS:\n{lines}"
 
     async def _get_plan_text(self) -> str:
         """Get the current plan as formatted text."""
@@ -343,15 +543,16 @@ class PlanningFlow(BaseFlow):
             return result.output if hasattr(result, "output") else str(result)
         except Exception as e:
             logger.error(f"Error getting plan: {e}")
-            return self._generate_plan_text_from_storage()
+            return await self._generate_plan_text_from_storage()
 
-    def _generate_plan_text_from_storage(self) -> str:
+    async def _generate_plan_text_from_storage(self) -> str:
         """Generate plan text directly from storage if the planning tool fails."""
         try:
-            if self.active_plan_id not in self.planning_tool.plans:
+            # One lookup, off the event loop for blocking stores
+            plan_data = await self.planning_tool.get_plan(self.active_plan_id)
+            if plan_data is None:
                 return f"Error: Plan with ID {self.active_plan_id} not found"
 
-            plan_data = self.planning_tool.plans[self.active_plan_id]
             title = plan_data.get("title", "Untitled Plan")
             steps = plan_data.get("steps", [])
             step_statuses = plan_data.get("step_statuses", [])
@@ -417,9 +618,10 @@ class PlanningFlow(BaseFlow):
                 f"The plan has been completed. Here is the final plan status:\n\n{plan_text}\n\nPlease provide a summary of what was accomplished and any final thoughts."
             )
 
-            response = await self.llm.ask(
-                messages=[user_message], system_msgs=[system_message]
-            )
+            with request_priority(RequestPriority.BACKGROUND):
+                response = await self.llm.ask(
+                    messages=[user_message], system_msgs=[system_message]
+                )
 
             return f"Plan completed:\n\n{response}"
         except Exception as e:
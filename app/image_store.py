@@ -0,0 +1,192 @@
+"""Content-addressed store for images referenced from agent memory.
+
+Screenshots are stored once per content hash and messages keep only the id,
+so repeated or long-lived screenshots cost no extra memory. Downscaled
+renditions are cached per (id, size) for request building. Images evicted
+from memory are spilled to disk, as messages may still reference them; the
+store deletes the files it spilled when it is cleared or closed (the shared
+store at exit).
+"""
+
+import atexit
+import base64
+import binascii
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple, Union
+
+from PIL import Image
+
+from app.config import PROJECT_ROOT
+from app.logger import logger
+
+
+class ImageStore:
+    """LRU-bounded mapping of sha256 id -> raw image bytes, spilling to disk.
+
+    Payloads that are not valid base64 are kept as the original string and
+    passed through unchanged.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 256 * 1024 * 1024,
+        max_renditions: int = 64,
+        spill_dir: Optional[Path] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.max_renditions = max_renditions
+        self.spill_dir = Path(spill_dir or PROJECT_ROOT / "cache" / "images")
+        self._images: OrderedDict[str, Union[bytes, str]] = OrderedDict()
+        self._renditions: OrderedDict[Tuple[str, int], str] = OrderedDict()
+        self._bytes = 0
+        self._spilled: Set[Path] = set()  # Files written by this store
+        self._lock = threading.Lock()
+
+    def put(self, base64_image: str) -> str:
+        """Store a base64 encoded image and return its id."""
+        try:
+            data: Union[bytes, str] = base64.b64decode(base64_image, validate=True)
+            image_id = hashlib.sha256(data).hexdigest()
+        except (binascii.Error, ValueError):
+            data = base64_image
+            image_id = hashlib.sha256(base64_image.encode("utf-8")).hexdigest()
+        evicted: List[Tuple[str, Union[bytes, str]]] = []
+        with self._lock:
+            if image_id in self._images:
+                self._images.move_to_end(image_id)
+                return image_id
+            self._images[image_id] = data
+            # Back in memory; a later eviction spills it again
+            unspilled = self._spilled & {
+                self._spill_path(image_id, raw) for raw in (False, True)
+            }
+            self._spilled -= unspilled
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                evicted_id, evicted_data = self._images.popitem(last=False)
+                self._bytes -= len(evicted_data)
+                evicted.append((evicted_id, evicted_data))
+        self._delete(unspilled)
+        for evicted_id, evicted_data in evicted:
+            self._spill(evicted_id, evicted_data)
+        return image_id
+
+    def _spill_path(self, image_id: str, raw: bool) -> Path:
+        return self.spill_dir / f"{image_id}{'.txt' if raw else '.bin'}"
+
+    def _spill(self, image_id: str, data: Union[bytes, str]) -> None:
+        """Write an evicted image to disk; messages may still reference it."""
+        raw = isinstance(data, str)
+        path = self._spill_path(image_id, raw)
+        try:
+            if not path.exists():
+                self.spill_dir.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(data.encode("utf-8") if raw else data)
+                tmp.replace(path)
+                with self._lock:
+                    self._spilled.add(path)
+            logger.debug(f"Spilled image {image_id[:12]} to {path}")
+        except OSError as e:
+            logger.warning(f"Could not spill image {image_id[:12]}, dropping it: {e}")
+
+    def _get(self, image_id: str) -> Optional[Union[bytes, str]]:
+        with self._lock:
+            data = self._images.get(image_id)
+            if data is not None:
+                self._images.move_to_end(image_id)
+                return data
+        for raw in (False, True):
+            path = self._spill_path(image_id, raw)
+            try:
+                data = path.read_bytes()
+            except OSError:
+                continue
+            return data.decode("utf-8") if raw else data
+        return None
+
+    def get_bytes(self, image_id: str) -> Optional[bytes]:
+        """Return the decoded image, or None if it is unknown or not valid base64."""
+        data = self._get(image_id)
+        return data if isinstance(data, bytes) else None
+
+    def get_base64(
+        self, image_id: str, max_size: Optional[int] = None
+    ) -> Optional[str]:
+        """Return the image as base64, downscaled so neither side exceeds max_size.
+
+        Returns None for an unknown id (or an evicted image that could not be spilled).
+        """
+        key = (image_id, max_size or 0)
+        with self._lock:
+            cached = self._renditions.get(key)
+            if cached is not None:
+                self._renditions.move_to_end(key)
+                return cached
+
+        data = self._get(image_id)
+        if data is None:
+            return None
+        if isinstance(data, str):
+            return data
+        if max_size:
+            data = self._downscale(data, max_size)
+        encoded = base64.b64encode(data).decode("ascii")
+
+        with self._lock:
+            self._renditions[key] = encoded
+            while len(self._renditions) > self.max_renditions:
+                self._renditions.popitem(last=False)
+        return encoded
+
+    @staticmethod
+    def _downscale(data: bytes, max_size: int) -> bytes:
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if max(image.size) <= max_size:
+                    return data
+                image.thumbnail((max_size, max_size))
+                if image.mode not in ("RGB", "L"):
+                    image = image.convert("RGB")
+                output = io.BytesIO()
+                image.save(output, format="JPEG", quality=85)
+                return output.getvalue()
+        except Exception as e:
+            logger.debug(f"Could not downscale image, sending original: {e}")
+            return data
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "images": len(self._images),
+                "bytes": self._bytes,
+                "renditions": len(self._renditions),
+            }
+
+    @staticmethod
+    def _delete(paths: Set[Path]) -> None:
+        for path in paths:
+            try:
+                path.unlink(missing_ok=True)
+            except OSError as e:
+                logger.debug(f"Could not delete spilled image {path}: {e}")
+
+    def clear(self) -> None:
+        """Drop all images, including the ones this store spilled to disk."""
+        with self._lock:
+            self._images.clear()
+            self._renditions.clear()
+            self._bytes = 0
+            spilled, self._spilled = self._spilled, set()
+        self._delete(spilled)
+
+    def close(self) -> None:
+        self.clear()
+
+
+image_store = ImageStore()
+atexit.register(image_store.close)
@@ -1,16 +1,39 @@
+import asyncio
+import functools
+import heapq
+import importlib.util
+import inspect
+import itertools
+import json
 import math
-from typing import Dict, List, Optional, Union
-
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import httpx
 import tiktoken
 from openai import (
+    APIConnectionError,
     APIError,
+    APITimeoutError,
     AsyncAzureOpenAI,
     AsyncOpenAI,
     AuthenticationError,
+    InternalServerError,
     OpenAIError,
     RateLimitError,
 )
-from openai.types.chat import ChatCompletion, ChatCompletionMessage
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionMessage,
+    ChatCompletionMessageToolCall,
+)
 from tenacity import (
     retry,
     retry_if_exception_type,
@@ -21,6 +44,8 @@ from tenacity import (
 from app.bedrock import BedrockClient
 from app.config import LLMSettings, config
 from app.exceptions import TokenLimitExceeded
+from app.image_store import image_store
+from app.llm_cache import cached_completion, get_response_cache
 from app.logger import logger  # Assuming a logger is set up in your app
 from app.schema import (
     ROLE_VALUES,
@@ -29,6 +54,7 @@ from app.schema import (
     Message,
     ToolChoice,
 )
+from app.tracing import tracer
 
 
 REASONING_MODELS = ["o1", "o3-mini"]
@@ -54,12 +80,41 @@ class TokenCounter:
     HIGH_DETAIL_TARGET_SHORT_SIDE = 768
     TILE_SIZE = 512
 
+    # Memo constants
+    MAX_CACHE_ENTRIES = 4096
+    LARGE_TEXT_THRESHOLD = 8192  # chars; longer strings are encoded off the loop
+
     def __init__(self, tokenizer):
         self.tokenizer = tokenizer
+        # LRU memo of text -> token count. Message contents are shared between
+        # Memory and the formatted request, so str hashes are computed once and
+        # repeated lookups across steps are O(1).
+        self._text_cache: OrderedDict[str, int] = OrderedDict()
+
+    def _cache_get(self, text: str) -> Optional[int]:
+        count = self._text_cache.get(text)
+        if count is not None:
+            self._text_cache.move_to_end(text)
+        return count
+
+    def _cache_put(self, text: str, count: int) -> None:
+        self._text_cache[text] = count
+        if len(self._text_cache) > self.MAX_CACHE_ENTRIES:
+            self._text_cache.popitem(last=False)
 
     def count_text(self, text: str) -> int:
-        """Calculate tokens for a text string"""
-        return 0 if not text else len(self.tokenizer.encode(text))
+        """Calculate tokens for a text string, using the memo when possible"""
+        if not text:
+            return 0
+        count = self._cache_get(text)
+        if count is None:
+            count = len(self.tokenizer.encode(text))
+            self._cache_put(text, count)
+        return count
+
+    def clear_cache(self) -> None:
+        """Drop all memoized token counts"""
+        self._text_cache.clear()
 
     def count_image(self, image_item: dict) -> int:
         """
@@ -170,6 +225,663 @@ class TokenCounter:
 
         return total_tokens
 
+    @staticmethod
+    def _iter_message_texts(messages: List[dict]):
+        """Yield every text fragment that count_message_tokens would encode"""
+        for message in messages:
+            content = message.get("content")
+            if isinstance(content, str):
+                yield content
+            elif isinstance(content, list):
+                for item in content:
+                    if isinstance(item, str):
+                        yield item
+                    elif isinstance(item, dict) and "text" in item:
+                        yield item["text"]
+            for tool_call in message.get("tool_calls") or []:
+                function = tool_call.get("function", {})
+                yield function.get("arguments", "")
+
+    async def count_message_tokens_async(self, messages: List[dict]) -> int:
+        """Calculate message tokens without blocking the event loop.
+
+        Only text not seen before is encoded; large uncached strings are encoded
+        in a worker thread before the (now fully memoized) synchronous count.
+        """
+        pending = {
+            text
+            for text in self._iter_message_texts(messages)
+            if isinstance(text, str)
+            and len(text) >= self.LARGE_TEXT_THRESHOLD
+            and text not in self._text_cache
+        }
+        if pending:
+            texts = list(pending)
+            counts = await asyncio.gather(
+                *(
+                    asyncio.to_thread(lambda t=text: len(self.tokenizer.encode(t)))
+                    for text in texts
+                )
+            )
+            for text, count in zip(texts, counts):
+                self._cache_put(text, count)
+
+        return self.count_message_tokens(messages)
+
+
+class LLMClientRegistry:
+    """Process-wide registry of API clients keyed by (endpoint, event loop).
+
+    An httpx connection pool is bound to the event loop it was first used on, so
+    one client is kept per running loop and shared by every LLM instance that
+    talks to the same endpoint on that loop.
+    """
+
+    _clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    _no_loop_clients: Dict[Tuple, Any] = {}
+
+    @staticmethod
+    def endpoint_key(llm_config: LLMSettings) -> Tuple:
+        return (
+            llm_config.api_type,
+            llm_config.base_url,
+            llm_config.api_key,
+            llm_config.api_version,
+        )
+
+    @classmethod
+    def _loop_clients(cls) -> Dict[Tuple, Any]:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return cls._no_loop_clients
+        if loop not in cls._clients:
+            cls._clients[loop] = {}
+        return cls._clients[loop]
+
+    @staticmethod
+    def _create_http_client(llm_config: LLMSettings) -> httpx.AsyncClient:
+        http2 = llm_config.http2 and importlib.util.find_spec("h2") is not None
+        if llm_config.http2 and not http2:
+            logger.debug("h2 is not installed, falling back to HTTP/1.1")
+        return httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=llm_config.max_connections,
+                max_keepalive_connections=llm_config.max_keepalive_connections,
+                keepalive_expiry=llm_config.keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(600.0, connect=10.0),
+        )
+
+    @classmethod
+    def get(cls, llm_config: LLMSettings) -> Any:
+        """Return the client for this endpoint on the current event loop."""
+        clients = cls._loop_clients()
+        key = cls.endpoint_key(llm_config)
+        if key not in clients:
+            if llm_config.api_type == "aws":
+                clients[key] = BedrockClient(
+                    max_workers=llm_config.max_concurrent_requests
+                )
+            elif llm_config.api_type == "azure":
+                clients[key] = AsyncAzureOpenAI(
+                    base_url=llm_config.base_url,
+                    api_key=llm_config.api_key,
+                    api_version=llm_config.api_version,
+                    http_client=cls._create_http_client(llm_config),
+                )
+            else:
+                clients[key] = AsyncOpenAI(
+                    api_key=llm_config.api_key,
+                    base_url=llm_config.base_url,
+                    http_client=cls._create_http_client(llm_config),
+                )
+        return clients[key]
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close every client bound to the current event loop.
+
+        Call this before closing a short-lived event loop.
+        """
+        clients = cls._loop_clients()
+        for client in list(clients.values()):
+            if hasattr(client, "close") and asyncio.iscoroutinefunction(client.close):
+                try:
+                    await client.close()
+                except Exception as e:
+                    logger.debug(f"Error closing LLM client: {e}")
+        clients.clear()
+
+
+class RateLimiter:
+    """Client-side token bucket for requests-per-minute and tokens-per-minute quotas.
+
+    One limiter is shared by every LLM instance targeting the same endpoint and
+    model, so concurrent agents and flows queue in FIFO order instead of all
+    hitting the provider and backing off. Requests reserve their estimated
+    input tokens plus max_tokens; unused tokens are refunded once the real
+    usage is known.
+    """
+
+    _limiters: Dict[Tuple, "RateLimiter"] = {}
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm or 0)
+        self._tokens = float(tpm or 0)
+        self._updated = time.monotonic()
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_config(cls, llm_config: LLMSettings) -> Optional["RateLimiter"]:
+        """Return the shared limiter for this endpoint/model, or None if unlimited."""
+        if not llm_config.rpm and not llm_config.tpm:
+            return None
+        key = LLMClientRegistry.endpoint_key(llm_config) + (llm_config.model,)
+        if key not in cls._limiters:
+            cls._limiters[key] = cls(rpm=llm_config.rpm, tpm=llm_config.tpm)
+        return cls._limiters[key]
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def _try_consume(self, tokens: int) -> float:
+        """Consume budget for one request, or return seconds until it fits."""
+        self._refill()
+        delay = 0.0
+        if self.rpm and self._requests < 1:
+            delay = max(delay, (1 - self._requests) * 60 / self.rpm)
+        if self.tpm and self._tokens < tokens:
+            delay = max(delay, (tokens - self._tokens) * 60 / self.tpm)
+        if delay > 0:
+            return delay
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        return 0.0
+
+    @staticmethod
+    def _wake(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait in FIFO order until the request fits the quota.
+
+        Args:
+            tokens: Tokens to reserve (estimated input tokens plus max_tokens)
+
+        Returns:
+            Seconds spent waiting
+        """
+        if self.tpm:
+            tokens = min(tokens, self.tpm)  # Never wait for more than a full bucket
+        start = time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters.append(waiter)
+            if self._waiters[0] is waiter:
+                waiter.set_result(None)
+        try:
+            await waiter
+            while True:
+                with self._lock:
+                    delay = self._try_consume(tokens)
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            with self._lock:
+                was_head = bool(self._waiters) and self._waiters[0] is waiter
+                self._waiters.remove(waiter)
+                if was_head and self._waiters:
+                    head = self._waiters[0]
+                    head.get_loop().call_soon_threadsafe(self._wake, head)
+        return time.monotonic() - start
+
+    def reconcile(self, reserved: int, used: int) -> None:
+        """Refund tokens reserved for a request but not actually used."""
+        if self.tpm and used < reserved:
+            with self._lock:
+                self._tokens = min(self.tpm, self._tokens + reserved - used)
+
+    def on_rate_limited(self) -> None:
+        """Drain the buckets after a provider 429 so queued requests back off."""
+        with self._lock:
+            self._refill()
+            self._requests = min(self._requests, 0.0)
+            self._tokens = min(self._tokens, 0.0)
+
+
+class RequestPriority(IntEnum):
+    """Priority classes for LLM requests; lower values are served first"""
+
+    INTERACTIVE = 0  # Web/user-facing sessions
+    PLANNING = 1  # Planner calls that gate other work
+    NORMAL = 2
+    BATCH = 3  # Batch flow steps
+    BACKGROUND = 4  # Summaries and other deferrable calls
+
+
+_request_priority: ContextVar[RequestPriority] = ContextVar(
+    "llm_request_priority", default=RequestPriority.NORMAL
+)
+
+
+@contextmanager
+def request_priority(priority: RequestPriority):
+    """Run LLM requests made in this context (and tasks spawned from it) at `priority`."""
+    token = _request_priority.set(priority)
+    try:
+        yield
+    finally:
+        _request_priority.reset(token)
+
+
+class RequestDispatcher:
+    """Bounded-concurrency priority queue in front of one LLM endpoint.
+
+    Shared by every LLM instance (agents, flows, tools) targeting the same
+    endpoint, so many sessions can be multiplexed without head-of-line
+    blocking: when all slots are busy, waiting requests are admitted by
+    priority class, then in arrival order. Queue time is recorded per class.
+    """
+
+    _dispatchers: Dict[Tuple, "RequestDispatcher"] = {}
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+        # Waiters a released slot was handed to, until they resume or cancel
+        self._handed: set = set()
+        self._metrics: Dict[RequestPriority, Dict[str, float]] = {
+            priority: {"requests": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for priority in RequestPriority
+        }
+
+    @classmethod
+    def for_config(cls, llm_config: LLMSettings) -> "RequestDispatcher":
+        """Return the shared dispatcher for this endpoint"""
+        key = LLMClientRegistry.endpoint_key(llm_config)
+        if key not in cls._dispatchers:
+            cls._dispatchers[key] = cls(llm_config.max_concurrent_requests)
+        return cls._dispatchers[key]
+
+    @staticmethod
+    def _grant(waiter: asyncio.Future) -> None:
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def _release(self) -> None:
+        """Hand the slot to the best waiting request, or free it."""
+        with self._lock:
+            while self._queue:
+                _, _, waiter = heapq.heappop(self._queue)
+                if not waiter.done():
+                    # The slot is transferred, so _active is unchanged
+                    self._handed.add(waiter)
+                    waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+                    return
+            self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: Optional[RequestPriority] = None):
+        """Hold one concurrency slot for the duration of a request.
+
+        Yields:
+            float: Seconds the request spent queued
+        """
+        priority = _request_priority.get() if priority is None else priority
+        enqueued = time.monotonic()
+        waiter = None
+        with self._lock:
+            if self.max_concurrency is None or (
+                self._active < self.max_concurrency and not self._queue
+            ):
+                self._active += 1
+            else:
+                waiter = asyncio.get_running_loop().create_future()
+                heapq.heappush(self._queue, (priority, next(self._counter), waiter))
+
+        if waiter is not None:
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._lock:
+                    handed = waiter in self._handed
+                    self._handed.discard(waiter)
+                    waiter.cancel()
+                # The slot may have been handed over before the grant ran
+                if handed:
+                    self._release()
+                raise
+            with self._lock:
+                self._handed.discard(waiter)
+
+        wait = time.monotonic() - enqueued
+        self._record(priority, wait)
+        try:
+            yield wait
+        finally:
+            if self.max_concurrency is None:
+                with self._lock:
+                    self._active -= 1
+            else:
+                self._release()
+
+    def _record(self, priority: RequestPriority, wait: float) -> None:
+        metrics = self._metrics[RequestPriority(priority)]
+        metrics["requests"] += 1
+        metrics["total_wait"] += wait
+        metrics["max_wait"] = max(metrics["max_wait"], wait)
+        if wait > 1:
+            logger.debug(
+                f"LLM request ({RequestPriority(priority).name}) queued for {wait:.2f}s"
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, active requests and per-priority queue-time metrics."""
+        with self._lock:
+            queued = sum(1 for _, _, waiter in self._queue if not waiter.done())
+            active = self._active
+        return {
+            "active": active,
+            "queued": queued,
+            "max_concurrency": self.max_concurrency,
+            "priorities": {
+                priority.name: {
+                    "requests": int(metrics["requests"]),
+                    "avg_wait": (
+                        metrics["total_wait"] / metrics["requests"]
+                        if metrics["requests"]
+                        else 0.0
+                    ),
+                    "max_wait": metrics["max_wait"],
+                }
+                for priority, metrics in self._metrics.items()
+            },
+        }
+
+
+def dispatched(func):
+    """Run an LLM request method inside a dispatcher slot.
+
+    Applied below @retry so that backoff sleeps don't hold a slot.
+    """
+
+    @functools.wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        async with self.dispatcher.slot() as wait:
+            with tracer.span(
+                f"llm.{func.__name__}",
+                category="llm",
+                model=self.model,
+                queue_ms=round(wait * 1000, 1),
+            ):
+                return await func(self, *args, **kwargs)
+
+    return wrapper
+
+
+class EndpointStats:
+    """Rolling latency and error statistics for one endpoint of a pool."""
+
+    ALPHA = 0.2
+    SAMPLES = 50
+
+    def __init__(self, name: str, llm_config: LLMSettings):
+        self.name = name
+        self.llm_config = llm_config
+        self.latency: Optional[float] = None  # EWMA of successful request latency
+        self.error_rate = 0.0  # EWMA of the failure indicator
+        self.failures = 0  # Consecutive failures
+        self.cooldown_until = 0.0
+        self.samples: deque = deque(maxlen=self.SAMPLES)
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def score(self) -> float:
+        """Expected cost of a request; unmeasured endpoints are tried first."""
+        if self.latency is None:
+            return 0.0
+        return self.latency * (1 + 4 * self.error_rate)
+
+    def p95(self) -> Optional[float]:
+        if len(self.samples) < 5:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, math.ceil(0.95 * len(ordered)) - 1)]
+
+    def record_success(self, latency: float) -> None:
+        self.samples.append(latency)
+        self.latency = (
+            latency
+            if self.latency is None
+            else self.ALPHA * latency + (1 - self.ALPHA) * self.latency
+        )
+        self.error_rate *= 1 - self.ALPHA
+        self.failures = 0
+        self.cooldown_until = 0.0
+
+    def record_cancelled(self, elapsed: float) -> None:
+        """Account for a request abandoned after `elapsed` seconds, e.g. a hedge loser.
+
+        It took at least that long, so only a slower-than-expected wait is
+        recorded; the failure streak and error rate are left alone.
+        """
+        if self.latency is not None and elapsed <= self.latency:
+            return
+        self.samples.append(elapsed)
+        self.latency = (
+            elapsed
+            if self.latency is None
+            else self.ALPHA * elapsed + (1 - self.ALPHA) * self.latency
+        )
+
+    def record_failure(self) -> None:
+        self.error_rate = self.ALPHA + (1 - self.ALPHA) * self.error_rate
+        self.failures += 1
+        if self.failures >= EndpointRouter.FAILURE_THRESHOLD:
+            backoff = min(EndpointRouter.MAX_COOLDOWN, 2**self.failures)
+            self.cooldown_until = time.monotonic() + backoff
+            logger.warning(
+                f"LLM endpoint '{self.name}' marked unhealthy for {backoff:.0f}s "
+                f"after {self.failures} consecutive failures"
+            )
+
+
+class EndpointRouter:
+    """Routes completions across several endpoints serving the same model.
+
+    Endpoints come from the ``fallbacks`` list of an [llm.*] section. Each
+    request goes to the healthy endpoint with the lowest latency-weighted
+    error score; connection, timeout, rate-limit and 5xx errors fail over to
+    the next one. With ``hedge_requests`` enabled, a non-streaming request
+    still pending after the primary's p95 latency is duplicated on the next
+    endpoint and the first response wins.
+    """
+
+    FAILURE_THRESHOLD = 3
+    MAX_COOLDOWN = 60.0
+    EXPLORE_PROBABILITY = 0.05  # Occasionally probe the runner-up to refresh its stats
+    FAILOVER_ERRORS = (
+        APIConnectionError,
+        APITimeoutError,
+        InternalServerError,
+        RateLimitError,
+    )
+
+    _routers: Dict[Tuple, "EndpointRouter"] = {}
+
+    def __init__(self, endpoints: List[Tuple[str, LLMSettings]], hedge: bool = False):
+        self.endpoints = [EndpointStats(name, cfg) for name, cfg in endpoints]
+        self.hedge = hedge
+
+    @classmethod
+    def for_config(
+        cls, name: str, llm_config: LLMSettings, llm_configs: Dict[str, LLMSettings]
+    ) -> Optional["EndpointRouter"]:
+        """Return the shared router for this config's pool, or None without fallbacks."""
+        endpoints = [(name, llm_config)]
+        seen = {LLMClientRegistry.endpoint_key(llm_config)}
+        for fallback in llm_config.fallbacks:
+            fallback_config = llm_configs.get(fallback)
+            if fallback_config is None:
+                logger.warning(f"Unknown LLM fallback endpoint '{fallback}' ignored")
+                continue
+            if fallback_config.model != llm_config.model:
+                # Sections inherit fallbacks from [llm], so skip other models
+                continue
+            key = LLMClientRegistry.endpoint_key(fallback_config)
+            if key not in seen:
+                seen.add(key)
+                endpoints.append((fallback, fallback_config))
+        if len(endpoints) < 2:
+            return None
+
+        pool_key = tuple(
+            LLMClientRegistry.endpoint_key(cfg) + (cfg.model,) for _, cfg in endpoints
+        )
+        if pool_key not in cls._routers:
+            cls._routers[pool_key] = cls(endpoints, hedge=llm_config.hedge_requests)
+        return cls._routers[pool_key]
+
+    def ranked(self) -> List[EndpointStats]:
+        """Healthy endpoints by score, then unhealthy ones as a last resort."""
+        healthy = [e for e in self.endpoints if e.healthy]
+        unhealthy = [e for e in self.endpoints if not e.healthy]
+        healthy.sort(key=lambda e: e.score())
+        unhealthy.sort(key=lambda e: e.cooldown_until)
+        if len(healthy) > 1 and random.random() < self.EXPLORE_PROBABILITY:
+            healthy[0], healthy[1] = healthy[1], healthy[0]
+        return healthy + unhealthy
+
+    async def _call(
+        self, endpoint: EndpointStats, params: Dict[str, Any], tokens: int = 0
+    ) -> Any:
+        if endpoint is self.endpoints[0]:
+            # The caller already holds this endpoint's rate limit and slot
+            return await self._send(endpoint, params)
+
+        # Fallbacks have their own quota and dispatcher shared with their own callers
+        limiter = RateLimiter.for_config(endpoint.llm_config)
+        reserved = (
+            tokens or params.get("max_tokens") or params.get("max_completion_tokens", 0)
+        )
+        if limiter:
+            await limiter.acquire(reserved)
+        async with RequestDispatcher.for_config(endpoint.llm_config).slot():
+            response = await self._send(endpoint, params)
+        usage = getattr(response, "usage", None)
+        if limiter and usage is not None:
+            limiter.reconcile(reserved, usage.prompt_tokens + usage.completion_tokens)
+        return response
+
+    async def _send(self, endpoint: EndpointStats, params: Dict[str, Any]) -> Any:
+        client = LLMClientRegistry.get(endpoint.llm_config)
+        started = time.monotonic()
+        try:
+            response = await client.chat.completions.create(**params)
+        except asyncio.CancelledError:
+            endpoint.record_cancelled(time.monotonic() - started)
+            raise
+        except Exception:
+            endpoint.record_failure()
+            raise
+        endpoint.record_success(time.monotonic() - started)
+        return response
+
+    async def _hedged(
+        self,
+        primary: EndpointStats,
+        backup: EndpointStats,
+        params: Dict[str, Any],
+        tokens: int = 0,
+    ) -> Any:
+        first = asyncio.create_task(self._call(primary, params, tokens))
+        deadline = primary.p95()
+        if deadline is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=deadline)
+        if done:
+            return first.result()
+
+        logger.debug(
+            f"LLM request to '{primary.name}' exceeded p95 ({deadline:.2f}s), "
+            f"hedging on '{backup.name}'"
+        )
+        pending = {first, asyncio.create_task(self._call(backup, params, tokens))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                # Let the losers record how long they ran before being cancelled
+                await asyncio.wait(pending)
+
+    async def create(self, params: Dict[str, Any], tokens: int = 0) -> Any:
+        """Send a chat completion, failing over across the pool.
+
+        Args:
+            params: Chat completion parameters
+            tokens: Tokens to reserve on a fallback endpoint's rate limiter
+        """
+        candidates = self.ranked()
+        last_error: Optional[Exception] = None
+        for i, endpoint in enumerate(candidates):
+            try:
+                if self.hedge and not params.get("stream") and i + 1 < len(candidates):
+                    return await self._hedged(
+                        endpoint, candidates[i + 1], params, tokens
+                    )
+                return await self._call(endpoint, params, tokens)
+            except self.FAILOVER_ERRORS as e:
+                last_error = e
+                if i + 1 < len(candidates):
+                    logger.warning(
+                        f"LLM endpoint '{endpoint.name}' failed ({type(e).__name__}), "
+                        f"failing over to '{candidates[i + 1].name}'"
+                    )
+        raise last_error
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Return per-endpoint latency, error rate and health."""
+        return {
+            e.name: {
+                "latency": e.latency,
+                "p95": e.p95(),
+                "error_rate": e.error_rate,
+                "healthy": e.healthy,
+            }
+            for e in self.endpoints
+        }
+
 
 class LLM:
     _instances: Dict[str, "LLM"] = {}
@@ -186,9 +898,10 @@ class LLM:
     def __init__(
         self, config_name: str = "default", llm_config: Optional[LLMSettings] = None
     ):
-        if not hasattr(self, "client"):  # Only initialize if not already initialized
-            llm_config = llm_config or config.llm
-            llm_config = llm_config.get(config_name, llm_config["default"])
+        if not hasattr(self, "model"):  # Only initialize if not already initialized
+            llm_configs = llm_config or config.llm
+            llm_config = llm_configs.get(config_name, llm_configs["default"])
+            self.llm_config = llm_config
             self.model = llm_config.model
             self.max_tokens = llm_config.max_tokens
             self.temperature = llm_config.temperature
@@ -213,31 +926,70 @@ class LLM:
                 # If the model is not in tiktoken's presets, use cl100k_base as default
                 self.tokenizer = tiktoken.get_encoding("cl100k_base")
 
-            if self.api_type == "azure":
-                self.client = AsyncAzureOpenAI(
-                    base_url=self.base_url,
-                    api_key=self.api_key,
-                    api_version=self.api_version,
-                )
-            elif self.api_type == "aws":
-                self.client = BedrockClient()
-            else:
-                self.client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url)
-
             self.token_counter = TokenCounter(self.tokenizer)
 
+            # Optional record/replay response cache shared by all instances
+            self.response_cache = get_response_cache()
+
+            # Optional RPM/TPM limiter shared by all instances of this endpoint
+            self.rate_limiter = RateLimiter.for_config(llm_config)
+
+            # Priority queue multiplexing all callers of this endpoint
+            self.dispatcher = RequestDispatcher.for_config(llm_config)
+
+            # Latency-aware failover across the configured fallback endpoints
+            self.router = EndpointRouter.for_config(
+                config_name, llm_config, llm_configs
+            )
+
+    @property
+    def client(self) -> Any:
+        """API client for the running event loop, shared across LLM instances"""
+        return LLMClientRegistry.get(self.llm_config)
+
+    async def preconnect(self) -> None:
+        """Open a pooled connection to the endpoint ahead of the first request.
+
+        Moves DNS and TLS setup off the critical path of the first agent step.
+        Failures are ignored; the real request will surface them.
+        """
+        client = self.client
+        http_client = getattr(client, "_client", None)
+        if not isinstance(http_client, httpx.AsyncClient):
+            return
+        try:
+            await http_client.head(str(client.base_url), timeout=5.0)
+        except Exception as e:
+            logger.debug(f"Pre-connect to {client.base_url} failed: {e}")
+
+    async def _create_completion(self, reserved_tokens: int = 0, **params) -> Any:
+        """Send a chat completion, routed across fallback endpoints if configured"""
+        with tracer.span(
+            "llm.request", category="llm", stream=bool(params.get("stream"))
+        ):
+            if self.router is None:
+                return await self.client.chat.completions.create(**params)
+            return await self.router.create(params, reserved_tokens)
+
     def count_tokens(self, text: str) -> int:
         """Calculate the number of tokens in a text"""
-        if not text:
-            return 0
-        return len(self.tokenizer.encode(text))
+        return self.token_counter.count_text(text)
 
     def count_message_tokens(self, messages: List[dict]) -> int:
         return self.token_counter.count_message_tokens(messages)
 
+    async def count_message_tokens_async(self, messages: List[dict]) -> int:
+        with tracer.span("llm.count_tokens", category="llm") as span:
+            tokens = await self.token_counter.count_message_tokens_async(messages)
+            span.set(messages=len(messages), tokens=tokens)
+            return tokens
+
     def update_token_count(self, input_tokens: int, completion_tokens: int = 0) -> None:
         """Update token counts"""
         # Only track tokens if max_input_tokens is set
+        tracer.current().set(
+            input_tokens=input_tokens, completion_tokens=completion_tokens
+        )
         self.total_input_tokens += input_tokens
         self.total_completion_tokens += completion_tokens
         logger.info(
@@ -246,6 +998,38 @@ class LLM:
             f"Total={input_tokens + completion_tokens}, Cumulative Total={self.total_input_tokens + self.total_completion_tokens}"
         )
 
+    async def acquire_rate_limit(self, input_tokens: int) -> int:
+        """Wait for RPM/TPM budget before sending a request.
+
+        Returns:
+            int: Number of tokens reserved, to be reconciled with the real usage
+        """
+        if not self.rate_limiter:
+            return 0
+        reserved = input_tokens + self.max_tokens
+        waited = await self.rate_limiter.acquire(reserved)
+        if waited > 1:
+            logger.info(f"Rate limiter delayed request by {waited:.1f}s")
+        return reserved
+
+    def reconcile_rate_limit(
+        self, reserved: int, usage: Any = None, estimated_tokens: Optional[int] = None
+    ) -> None:
+        """Refund reserved tokens the request did not use.
+
+        Uses the provider's usage when it is known, otherwise estimated_tokens
+        (counted input plus generated tokens, e.g. for streams or failed requests).
+        """
+        if not self.rate_limiter or not reserved:
+            return
+        if usage is not None:
+            used = usage.prompt_tokens + usage.completion_tokens
+        elif estimated_tokens is not None:
+            used = estimated_tokens
+        else:
+            return
+        self.rate_limiter.reconcile(reserved, used)
+
     def check_token_limit(self, input_tokens: int) -> bool:
         """Check if token limits are exceeded"""
         if self.max_input_tokens is not None:
@@ -265,7 +1049,10 @@ class LLM:
 
     @staticmethod
     def format_messages(
-        messages: List[Union[dict, Message]], supports_images: bool = False
+        messages: List[Union[dict, Message]],
+        supports_images: bool = False,
+        max_images: Optional[int] = None,
+        image_max_size: Optional[int] = None,
     ) -> List[dict]:
         """
         Format messages for LLM by converting them to OpenAI message format.
@@ -273,6 +1060,8 @@ class LLM:
         Args:
             messages: List of messages that can be either dict or Message objects
             supports_images: Flag indicating if the target model supports image inputs
+            max_images: Only the most recent images are sent (defaults to [memory] max_images)
+            image_max_size: Longest side images are downscaled to (defaults to [memory] image_max_size)
 
         Returns:
             List[dict]: List of formatted messages in OpenAI format
@@ -289,20 +1078,54 @@ class LLM:
             ... ]
             >>> formatted = LLM.format_messages(msgs)
         """
-        formatted_messages = []
+        if config.memory is not None:
+            if max_images is None:
+                max_images = config.memory.max_images
+            if image_max_size is None:
+                image_max_size = config.memory.image_max_size
+
+        # Convert Message objects to dictionaries
+        messages = [
+            message.to_dict() if isinstance(message, Message) else message
+            for message in messages
+        ]
+
+        # Only the most recent images are materialized into the request
+        image_indices = [
+            i
+            for i, message in enumerate(messages)
+            if isinstance(message, dict)
+            and (message.get("image_id") or message.get("base64_image"))
+        ]
+        if max_images is not None:
+            image_indices = image_indices[-max_images:] if max_images > 0 else []
+        send_images = set(image_indices) if supports_images else set()
 
-        for message in messages:
-            # Convert Message objects to dictionaries
-            if isinstance(message, Message):
-                message = message.to_dict()
+        formatted_messages = []
 
+        for i, message in enumerate(messages):
             if isinstance(message, dict):
                 # If message is a dict, ensure it has required fields
                 if "role" not in message:
                     raise ValueError("Message dict must contain 'role' field")
 
-                # Process base64 images if present and model supports images
-                if supports_images and message.get("base64_image"):
+                image_id = message.get("image_id")
+                base64_image = message.get("base64_image")
+                if image_id is not None or base64_image is not None:
+                    # Copy rather than mutate: Message dicts are cached and shared
+                    message = {
+                        key: value
+                        for key, value in message.items()
+                        if key not in ("image_id", "base64_image")
+                    }
+                image = None
+                if i in send_images:
+                    if base64_image:
+                        image_id = image_store.put(base64_image)
+                    image = image_store.get_base64(image_id, image_max_size)
+
+                # Process images if present and model supports images
+                if image:
                     # Initialize or convert content to appropriate format
                     if not message.get("content"):
                         message["content"] = []
@@ -325,19 +1148,10 @@ class LLM:
                     message["content"].append(
                         {
                             "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{message['base64_image']}"
-                            },
+                            "image_url": {"url": f"data:image/jpeg;base64,{image}"},
                         }
                     )
 
-                    # Remove the base64_image field
-                    del message["base64_image"]
-                # If model doesn't support images but message has base64_image, handle gracefully
-                elif not supports_images and message.get("base64_image"):
-                    # Just remove the base64_image field and keep the text content
-                    del message["base64_image"]
-
                 if "content" in message or "tool_calls" in message:
                     formatted_messages.append(message)
                 # else: do not include the message
@@ -351,6 +1165,7 @@ class LLM:
 
         return formatted_messages
 
+    @cached_completion("text")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -358,6 +1173,7 @@ class LLM:
             (OpenAIError, Exception, ValueError)
         ),  # Don't retry TokenLimitExceeded
     )
+    @dispatched
     async def ask(
         self,
         messages: List[Union[dict, Message]],
@@ -383,6 +1199,9 @@ class LLM:
             OpenAIError: If API call fails after retries
             Exception: For unexpected errors
         """
+        input_tokens = reserved_tokens = 0
+        usage = None
+        completion_text = ""
         try:
             # Check if the model supports images
             supports_images = self.model in MULTIMODAL_MODELS
@@ -395,7 +1214,7 @@ class LLM:
                 messages = self.format_messages(messages, supports_images)
 
             # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
+            input_tokens = await self.count_message_tokens_async(messages)
 
             # Check if token limits are exceeded
             if not self.check_token_limit(input_tokens):
@@ -403,6 +1222,8 @@ class LLM:
                 # Raise a special exception that won't be retried
                 raise TokenLimitExceeded(error_message)
 
+            reserved_tokens = await self.acquire_rate_limit(input_tokens)
+
             params = {
                 "model": self.model,
                 "messages": messages,
@@ -418,9 +1239,10 @@ class LLM:
 
             if not stream:
                 # Non-streaming request
-                response = await self.client.chat.completions.create(
-                    **params, stream=False
+                response = await self._create_completion(
+                    reserved_tokens, **params, stream=False
                 )
+                usage = response.usage
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
@@ -435,11 +1257,16 @@ class LLM:
             # Streaming request, For streaming, update estimated token count before making the request
             self.update_token_count(input_tokens)
 
-            response = await self.client.chat.completions.create(**params, stream=True)
+            response = await self._create_completion(
+                reserved_tokens, **params, stream=True
+            )
 
             collected_messages = []
-            completion_text = ""
             async for chunk in response:
+                # Providers that report stream usage send it on the final chunk
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
                 chunk_message = chunk.choices[0].delta.content or ""
                 collected_messages.append(chunk_message)
                 completion_text += chunk_message
@@ -471,13 +1298,23 @@ class LLM:
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
                 logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                if self.rate_limiter:
+                    self.rate_limiter.on_rate_limited()
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
         except Exception:
             logger.exception(f"Unexpected error in ask")
             raise
+        finally:
+            # Also on errors, so a failed or cut-off stream returns its reservation
+            self.reconcile_rate_limit(
+                reserved_tokens,
+                usage,
+                input_tokens + self.count_tokens(completion_text),
+            )
 
+    @cached_completion("text")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -485,6 +1322,7 @@ class LLM:
             (OpenAIError, Exception, ValueError)
         ),  # Don't retry TokenLimitExceeded
     )
+    @dispatched
     async def ask_with_images(
         self,
         messages: List[Union[dict, Message]],
@@ -512,6 +1350,9 @@ class LLM:
             OpenAIError: If API call fails after retries
             Exception: For unexpected errors
         """
+        input_tokens = reserved_tokens = 0
+        usage = None
+        completion_text = ""
         try:
             # For ask_with_images, we always set supports_images to True because
             # this method should only be called with models that support images
@@ -532,12 +1373,13 @@ class LLM:
             # Process the last user message to include images
             last_message = formatted_messages[-1]
 
-            # Convert content to multimodal format if needed
+            # Convert content to multimodal format if needed; copies, since
+            # formatted dicts are cached on the Message and shared between requests
             content = last_message["content"]
             multimodal_content = (
                 [{"type": "text", "text": content}]
                 if isinstance(content, str)
-                else content
+                else list(content)
                 if isinstance(content, list)
                 else []
             )
@@ -556,7 +1398,7 @@ class LLM:
                     raise ValueError(f"Unsupported image format: {image}")
 
             # Update the message with multimodal content
-            last_message["content"] = multimodal_content
+            formatted_messages[-1] = {**last_message, "content": multimodal_content}
 
             # Add system messages if provided
             if system_msgs:
@@ -568,10 +1410,12 @@ class LLM:
                 all_messages = formatted_messages
 
             # Calculate tokens and check limits
-            input_tokens = self.count_message_tokens(all_messages)
+            input_tokens = await self.count_message_tokens_async(all_messages)
             if not self.check_token_limit(input_tokens):
                 raise TokenLimitExceeded(self.get_limit_error_message(input_tokens))
 
+            reserved_tokens = await self.acquire_rate_limit(input_tokens)
+
             # Set up API parameters
             params = {
                 "model": self.model,
@@ -590,7 +1434,8 @@ class LLM:
 
             # Handle non-streaming request
             if not stream:
-                response = await self.client.chat.completions.create(**params)
+                response = await self._create_completion(reserved_tokens, **params)
+                usage = response.usage
 
                 if not response.choices or not response.choices[0].message.content:
                     raise ValueError("Empty or invalid response from LLM")
@@ -600,12 +1445,17 @@ class LLM:
 
             # Handle streaming request
             self.update_token_count(input_tokens)
-            response = await self.client.chat.completions.create(**params)
+            response = await self._create_completion(reserved_tokens, **params)
 
             collected_messages = []
             async for chunk in response:
+                # Providers that report stream usage send it on the final chunk
+                usage = getattr(chunk, "usage", None) or usage
+                if not chunk.choices:
+                    continue
                 chunk_message = chunk.choices[0].delta.content or ""
                 collected_messages.append(chunk_message)
+                completion_text += chunk_message
                 print(chunk_message, end="", flush=True)
 
             print()  # Newline after streaming
@@ -627,13 +1477,99 @@ class LLM:
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
                 logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                if self.rate_limiter:
+                    self.rate_limiter.on_rate_limited()
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
         except Exception as e:
             logger.error(f"Unexpected error in ask_with_images: {e}")
             raise
+        finally:
+            # Also on errors, so a failed or cut-off stream returns its reservation
+            self.reconcile_rate_limit(
+                reserved_tokens,
+                usage,
+                input_tokens + self.count_tokens(completion_text),
+            )
 
+    async def _prepare_tool_request(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        tools_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> Tuple[dict, int, int]:
+        """Validate and format a tool request and wait for rate-limit budget.
+
+        Returns:
+            Tuple of the completion params, the estimated input tokens and the
+            tokens reserved with the rate limiter
+        """
+        # Validate tool_choice
+        if tool_choice not in TOOL_CHOICE_VALUES:
+            raise ValueError(f"Invalid tool_choice: {tool_choice}")
+
+        # Check if the model supports images
+        supports_images = self.model in MULTIMODAL_MODELS
+
+        # Format messages
+        if system_msgs:
+            system_msgs = self.format_messages(system_msgs, supports_images)
+            messages = system_msgs + self.format_messages(messages, supports_images)
+        else:
+            messages = self.format_messages(messages, supports_images)
+
+        # Calculate input token count
+        input_tokens = await self.count_message_tokens_async(messages)
+
+        # If there are tools, calculate token count for their JSON schemas
+        if tools_tokens is None:
+            tools_tokens = (
+                self.count_tokens(json.dumps(tools, ensure_ascii=False)) if tools else 0
+            )
+
+        input_tokens += tools_tokens
+
+        # Check if token limits are exceeded
+        if not self.check_token_limit(input_tokens):
+            error_message = self.get_limit_error_message(input_tokens)
+            # Raise a special exception that won't be retried
+            raise TokenLimitExceeded(error_message)
+
+        reserved_tokens = await self.acquire_rate_limit(input_tokens)
+
+        # Validate tools if provided
+        if tools:
+            for tool in tools:
+                if not isinstance(tool, dict) or "type" not in tool:
+                    raise ValueError("Each tool must be a dict with 'type' field")
+
+        # Set up the completion request
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "tools": tools,
+            "tool_choice": tool_choice,
+            "timeout": timeout,
+            **kwargs,
+        }
+
+        if self.model in REASONING_MODELS:
+            params["max_completion_tokens"] = self.max_tokens
+        else:
+            params["max_tokens"] = self.max_tokens
+            params["temperature"] = (
+                temperature if temperature is not None else self.temperature
+            )
+
+        return params, input_tokens, reserved_tokens
+
+    @cached_completion("message")
     @retry(
         wait=wait_random_exponential(min=1, max=60),
         stop=stop_after_attempt(6),
@@ -641,6 +1577,7 @@ class LLM:
             (OpenAIError, Exception, ValueError)
         ),  # Don't retry TokenLimitExceeded
     )
+    @dispatched
     async def ask_tool(
         self,
         messages: List[Union[dict, Message]],
@@ -649,6 +1586,7 @@ class LLM:
         tools: Optional[List[dict]] = None,
         tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
         temperature: Optional[float] = None,
+        tools_tokens: Optional[int] = None,
         **kwargs,
     ) -> ChatCompletionMessage | None:
         """
@@ -661,6 +1599,7 @@ class LLM:
             tools: List of tools to use
             tool_choice: Tool choice strategy
             temperature: Sampling temperature for the response
+            tools_tokens: Precomputed token cost of `tools` (see ToolCollection.count_tokens)
             **kwargs: Additional completion arguments
 
         Returns:
@@ -673,64 +1612,20 @@ class LLM:
             Exception: For unexpected errors
         """
         try:
-            # Validate tool_choice
-            if tool_choice not in TOOL_CHOICE_VALUES:
-                raise ValueError(f"Invalid tool_choice: {tool_choice}")
-
-            # Check if the model supports images
-            supports_images = self.model in MULTIMODAL_MODELS
-
-            # Format messages
-            if system_msgs:
-                system_msgs = self.format_messages(system_msgs, supports_images)
-                messages = system_msgs + self.format_messages(messages, supports_images)
-            else:
-                messages = self.format_messages(messages, supports_images)
-
-            # Calculate input token count
-            input_tokens = self.count_message_tokens(messages)
-
-            # If there are tools, calculate token count for tool descriptions
-            tools_tokens = 0
-            if tools:
-                for tool in tools:
-                    tools_tokens += self.count_tokens(str(tool))
-
-            input_tokens += tools_tokens
-
-            # Check if token limits are exceeded
-            if not self.check_token_limit(input_tokens):
-                error_message = self.get_limit_error_message(input_tokens)
-                # Raise a special exception that won't be retried
-                raise TokenLimitExceeded(error_message)
-
-            # Validate tools if provided
-            if tools:
-                for tool in tools:
-                    if not isinstance(tool, dict) or "type" not in tool:
-                        raise ValueError("Each tool must be a dict with 'type' field")
-
-            # Set up the completion request
-            params = {
-                "model": self.model,
-                "messages": messages,
-                "tools": tools,
-                "tool_choice": tool_choice,
-                "timeout": timeout,
+            params, _, reserved_tokens = await self._prepare_tool_request(
+                messages,
+                system_msgs=system_msgs,
+                timeout=timeout,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                tools_tokens=tools_tokens,
                 **kwargs,
-            }
-
-            if self.model in REASONING_MODELS:
-                params["max_completion_tokens"] = self.max_tokens
-            else:
-                params["max_tokens"] = self.max_tokens
-                params["temperature"] = (
-                    temperature if temperature is not None else self.temperature
-                )
+            )
 
             params["stream"] = False  # Always use non-streaming for tool requests
-            response: ChatCompletion = await self.client.chat.completions.create(
-                **params
+            response: ChatCompletion = await self._create_completion(
+                reserved_tokens, **params
             )
 
             # Check if response is valid
@@ -743,6 +1638,7 @@ class LLM:
             self.update_token_count(
                 response.usage.prompt_tokens, response.usage.completion_tokens
             )
+            self.reconcile_rate_limit(reserved_tokens, response.usage)
 
             return response.choices[0].message
 
@@ -758,9 +1654,181 @@ class LLM:
                 logger.error("Authentication failed. Check API key.")
             elif isinstance(oe, RateLimitError):
                 logger.error("Rate limit exceeded. Consider increasing retry attempts.")
+                if self.rate_limiter:
+                    self.rate_limiter.on_rate_limited()
             elif isinstance(oe, APIError):
                 logger.error(f"API error: {oe}")
             raise
         except Exception as e:
             logger.error(f"Unexpected error in ask_tool: {e}")
             raise
+
+    @cached_completion("message")
+    async def ask_tool_stream(
+        self,
+        messages: List[Union[dict, Message]],
+        system_msgs: Optional[List[Union[dict, Message]]] = None,
+        timeout: int = 300,
+        tools: Optional[List[dict]] = None,
+        tool_choice: TOOL_CHOICE_TYPE = ToolChoice.AUTO,  # type: ignore
+        temperature: Optional[float] = None,
+        tools_tokens: Optional[int] = None,
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]] = None,
+        **kwargs,
+    ) -> ChatCompletionMessage | None:
+        """
+        Streaming variant of ask_tool that reports each tool call as soon as it is complete.
+
+        Tool call deltas are assembled incrementally; `on_tool_call` is invoked (and
+        awaited if it returns an awaitable) as soon as a call's JSON arguments parse,
+        while the model is still generating later calls and trailing content.
+
+        If the request fails before any tool call was reported, it falls back to
+        ask_tool (with its retries). Failures after a tool call was reported are
+        raised, since retrying could dispatch the same call twice.
+
+        Args:
+            messages: List of conversation messages
+            system_msgs: Optional system messages to prepend
+            timeout: Request timeout in seconds
+            tools: List of tools to use
+            tool_choice: Tool choice strategy
+            temperature: Sampling temperature for the response
+            tools_tokens: Precomputed token cost of `tools` (see ToolCollection.count_tokens)
+            on_tool_call: Callback receiving each completed tool call
+            **kwargs: Additional completion arguments
+
+        Returns:
+            ChatCompletionMessage: The assembled response, identical in shape to ask_tool's
+        """
+        request = dict(
+            system_msgs=system_msgs,
+            timeout=timeout,
+            tools=tools,
+            tool_choice=tool_choice,
+            temperature=temperature,
+            tools_tokens=tools_tokens,
+            **kwargs,
+        )
+        calls: Dict[int, dict] = {}
+        reported: set = set()
+        content_parts: List[str] = []
+        input_tokens = reserved_tokens = 0
+        usage = None
+
+        async def report(index: int) -> None:
+            call = calls[index]
+            reported.add(index)
+            await self._report_tool_call(
+                on_tool_call,
+                ChatCompletionMessageToolCall(
+                    id=call["id"],
+                    type="function",
+                    function={"name": call["name"], "arguments": call["arguments"]},
+                ),
+            )
+
+        try:
+            async with self.dispatcher.slot() as wait:
+                with tracer.span(
+                    "llm.ask_tool_stream",
+                    category="llm",
+                    model=self.model,
+                    queue_ms=round(wait * 1000, 1),
+                ):
+                    (
+                        params,
+                        input_tokens,
+                        reserved_tokens,
+                    ) = await self._prepare_tool_request(messages, **request)
+                    params["stream"] = True
+                    # For streaming, update estimated token count before making the request
+                    self.update_token_count(input_tokens)
+                    response = await self._create_completion(reserved_tokens, **params)
+
+                    async for chunk in response:
+                        usage = getattr(chunk, "usage", None) or usage
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            content_parts.append(delta.content)
+                        for tool_call in delta.tool_calls or []:
+                            # A new index means every earlier call is complete
+                            for index in sorted(calls):
+                                if index < tool_call.index and index not in reported:
+                                    await report(index)
+                            call = calls.setdefault(
+                                tool_call.index, {"id": "", "name": "", "arguments": ""}
+                            )
+                            if tool_call.id:
+                                call["id"] = tool_call.id
+                            if tool_call.function and tool_call.function.name:
+                                call["name"] += tool_call.function.name
+                            if tool_call.function and tool_call.function.arguments:
+                                call["arguments"] += tool_call.function.arguments
+                                if (
+                                    "}" in tool_call.function.arguments
+                                    and tool_call.index not in reported
+                                ):
+                                    try:
+                                        json.loads(call["arguments"])
+                                    except json.JSONDecodeError:
+                                        continue
+                                    await report(tool_call.index)
+
+                    for index in sorted(calls):
+                        if index not in reported:
+                            await report(index)
+
+                    content = "".join(content_parts)
+                    self.total_completion_tokens += self.count_tokens(content) + sum(
+                        self.count_tokens(call["arguments"]) for call in calls.values()
+                    )
+                    return ChatCompletionMessage(
+                        role="assistant",
+                        content=content or None,
+                        tool_calls=[
+                            {
+                                "id": calls[index]["id"],
+                                "type": "function",
+                                "function": {
+                                    "name": calls[index]["name"],
+                                    "arguments": calls[index]["arguments"],
+                                },
+                            }
+                            for index in sorted(calls)
+                        ]
+                        or None,
+                    )
+        except TokenLimitExceeded:
+            raise
+        except Exception as e:
+            if reported:
+                logger.error(f"Streaming tool request failed after dispatch: {e}")
+                raise
+            logger.warning(f"Streaming tool request failed, retrying unstreamed: {e}")
+            message = await self.ask_tool(messages, **request)
+            for tool_call in (message.tool_calls if message else None) or []:
+                await self._report_tool_call(on_tool_call, tool_call)
+            return message
+        finally:
+            # Return the stream's unused reservation, also when it failed midway
+            self.reconcile_rate_limit(
+                reserved_tokens,
+                usage,
+                input_tokens
+                + self.count_tokens("".join(content_parts))
+                + sum(self.count_tokens(call["arguments"]) for call in calls.values()),
+            )
+
+    @staticmethod
+    async def _report_tool_call(
+        on_tool_call: Optional[Callable[[ChatCompletionMessageToolCall], Any]],
+        tool_call: ChatCompletionMessageToolCall,
+    ) -> None:
+        if on_tool_call is None:
+            return
+        result = on_tool_call(tool_call)
+        if inspect.isawaitable(result):
+            await result
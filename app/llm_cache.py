@@ -0,0 +1,311 @@
+"""Two-tier (memory LRU + SQLite) cache for LLM responses.
+
+Responses are keyed on a canonical hash of everything that determines the
+completion (model, messages, tools, tool_choice, temperature, ...). In
+``replay`` mode a miss raises LLMCacheMiss instead of calling the API, so
+benchmark and regression runs can execute fully offline.
+"""
+
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from openai.types.chat import ChatCompletionMessage
+
+from app.config import PROJECT_ROOT, LLMCacheSettings, config
+from app.exceptions import LLMCacheMiss
+from app.logger import logger
+from app.schema import Message
+
+
+CACHE_MODES = ("off", "on", "record", "replay")
+
+
+def _to_jsonable(value: Any) -> Any:
+    """Convert messages/responses to plain JSON-compatible structures."""
+    if isinstance(value, Message):
+        return value.to_dict()
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if hasattr(value, "__dict__"):
+        return vars(value)
+    return str(value)
+
+
+def make_cache_key(**parts: Any) -> str:
+    """Build a stable hash from the request parts."""
+    canonical = json.dumps(
+        parts, sort_keys=True, ensure_ascii=False, default=_to_jsonable
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LRU memory tier in front of a size-bounded SQLite tier.
+
+    Values are stored as JSON strings. Concurrent identical requests are
+    coalesced so only one of them reaches the API.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        mode: str = "on",
+        memory_entries: int = 256,
+        max_disk_bytes: int = 512 * 1024 * 1024,
+    ):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Invalid LLM cache mode: {mode}")
+        self.mode = mode
+        self.path = Path(path)
+        self.memory_entries = memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)"
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT SUM(size) FROM responses").fetchone()
+            self._disk_bytes = row[0] or 0
+        return self._conn
+
+    def _disk_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            conn.commit()
+            return row[0]
+
+    def _disk_put(self, key: str, value: str) -> None:
+        size = len(value.encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            old = conn.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time()),
+            )
+            self._disk_bytes += size - (old[0] if old else 0)
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used rows until the disk tier fits its budget."""
+        while self._disk_bytes > self.max_disk_bytes:
+            rows = conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                return
+            for key, size in rows:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_disk_bytes:
+                    break
+
+    def _memory_put(self, key: str, value: str) -> None:
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a serialized value in memory, then on disk."""
+        value = self._memory.get(key)
+        if value is not None:
+            self._memory.move_to_end(key)
+            return value
+        value = await asyncio.to_thread(self._disk_get, key)
+        if value is not None:
+            self._memory_put(key, value)
+        return value
+
+    async def put(self, key: str, value: str) -> None:
+        """Store a serialized value in both tiers."""
+        self._memory_put(key, value)
+        await asyncio.to_thread(self._disk_put, key, value)
+
+    async def get_or_call(
+        self,
+        key: str,
+        call: Callable[[], Awaitable[Any]],
+        encode: Callable[[Any], Optional[str]],
+        decode: Callable[[Optional[str]], Any],
+    ) -> Any:
+        """Return the cached response for key, calling the API on a miss.
+
+        Raises:
+            LLMCacheMiss: If the cache is in replay mode and has no entry for key
+        """
+        if self.mode != "record":
+            cached = await self.get(key)
+            if cached is not None:
+                self.hits += 1
+                return decode(cached)
+            if self.mode == "replay":
+                raise LLMCacheMiss(f"No cached LLM response for key {key}")
+
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            return decode(await asyncio.shield(inflight))
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await call()
+            value = encode(result)
+            if value is not None:
+                await self.put(key, value)
+            future.set_result(value)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark as retrieved when nobody is waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_caches: Dict[Path, LLMResponseCache] = {}
+
+
+def get_response_cache(
+    settings: Optional[LLMCacheSettings] = None,
+) -> Optional[LLMResponseCache]:
+    """Return the process-wide cache for the configured path, or None if disabled."""
+    settings = settings or config.llm_cache
+    if settings is None or settings.mode == "off":
+        return None
+    path = Path(settings.path) if settings.path else None
+    if path is None:
+        path = PROJECT_ROOT / "cache" / "llm_cache.sqlite"
+    elif not path.is_absolute():
+        path = PROJECT_ROOT / path
+    if path not in _caches:
+        _caches[path] = LLMResponseCache(
+            path,
+            mode=settings.mode,
+            memory_entries=settings.memory_entries,
+            max_disk_bytes=settings.max_disk_bytes,
+        )
+        logger.info(f"LLM response cache enabled ({settings.mode}) at {path}")
+    return _caches[path]
+
+
+def _encode_text(result: Optional[str]) -> Optional[str]:
+    return None if result is None else json.dumps({"content": result})
+
+
+def _decode_text(value: Optional[str]) -> Optional[str]:
+    return None if value is None else json.loads(value)["content"]
+
+
+def _encode_message(result: Any) -> Optional[str]:
+    if result is None:
+        return None
+    return json.dumps(_to_jsonable(result), ensure_ascii=False, default=_to_jsonable)
+
+
+def _decode_message(value: Optional[str]) -> Optional[ChatCompletionMessage]:
+    return None if value is None else ChatCompletionMessage.model_validate_json(value)
+
+
+_CODECS = {
+    "text": (_encode_text, _decode_text),
+    "message": (_encode_message, _decode_message),
+}
+
+# Request arguments that do not influence the completion itself
+_IGNORED_ARGS = {"self", "stream", "timeout", "tools_tokens", "on_tool_call"}
+
+
+def cached_completion(result_type: str):
+    """Decorator routing an LLM.ask* method through the response cache.
+
+    Must be applied outside @retry so that replay misses are not retried.
+
+    Args:
+        result_type: "text" for methods returning a string, "message" for
+            methods returning a ChatCompletionMessage
+    """
+    encode, decode = _CODECS[result_type]
+
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            cache = getattr(self, "response_cache", None)
+            if cache is None:
+                return await func(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            request = {
+                name: value
+                for name, value in bound.arguments.items()
+                if name not in _IGNORED_ARGS
+            }
+            if request.get("temperature") is None:
+                request["temperature"] = self.temperature
+            key = make_cache_key(
+                method=func.__name__,
+                model=self.model,
+                max_tokens=self.max_tokens,
+                **request,
+            )
+            return await cache.get_or_call(
+                key, lambda: func(self, *args, **kwargs), encode, decode
+            )
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,235 @@
+"""Content-addressed spill store for large tool outputs.
+
+Instead of cutting a long observation at max_observe and losing the rest,
+the full output is written to the workspace and the observation kept in
+memory is folded to its head and tail plus a handle. The read_output tool
+pages through the stored output by line.
+
+Tools that produce output incrementally (bash, python_execute) stream it
+through an OutputWriter, so only the head and tail of a large output are
+ever held in memory. Outputs that arrive as one string (e.g. fetched web
+pages) are folded by the agent in a worker thread.
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+from contextvars import ContextVar
+from pathlib import Path
+from typing import IO, List, Optional, Tuple
+
+from app.config import config
+from app.logger import logger
+
+
+CHUNK_SIZE = 1024 * 1024
+OUTPUT_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+# No leading newline, so folds inside a repr'd result (e.g. a dict) are found too
+FOLD_MARKER_PATTERN = re.compile(
+    r"\.\.\. \[\d+ characters, about \d+ lines omitted\. Full output \(\d+ lines\) "
+    r"stored as output_id=[0-9a-f]{16} "
+)
+
+# Observation limit of the agent running the current tool call, for streaming tools
+observation_limit: ContextVar[Optional[int]] = ContextVar(
+    "observation_limit", default=None
+)
+
+
+class OutputWriter:
+    """Stores one output as it is produced, keeping only its head and tail in memory.
+
+    Output up to `limit` characters stays in memory and is returned as-is.
+    Past that, everything is appended to a temporary file that is renamed
+    to its content hash on close, and close() returns the folded observation.
+    """
+
+    def __init__(self, store: "OutputStore", limit: Optional[int], name: str = ""):
+        self.store = store
+        self.limit = limit
+        self.name = name
+        self._buffer: List[str] = []  # All output while it fits the limit
+        self._head = ""
+        self._tail = ""
+        self._chars = 0
+        self._newlines = 0
+        self._file: Optional[IO[bytes]] = None
+        self._tmp_name: Optional[str] = None
+        self._digest = hashlib.sha256()
+        self._failed = False
+        self.output_id: Optional[str] = None  # Set once a spilled output is closed
+
+    @property
+    def spilling(self) -> bool:
+        return self._file is not None
+
+    def _fits(self, extra: int) -> bool:
+        return self.limit is None or self._chars + extra <= self.limit
+
+    def write(self, text: str) -> None:
+        """Append text to the output."""
+        if not text:
+            return
+        if not self.spilling and not self._failed and self._fits(len(text)):
+            self._buffer.append(text)
+            self._chars += len(text)
+            self._newlines += text.count("\n")
+            return
+
+        if not self.spilling and not self._failed:
+            buffered = "".join(self._buffer)
+            self._buffer = []
+            self._head = buffered[: self.limit]
+            self._tail = buffered
+            try:
+                self._open()
+                self._write_file(buffered)
+            except OSError as e:
+                self._fail(e)
+        self._chars += len(text)
+        self._newlines += text.count("\n")
+        if len(self._head) < self.limit:
+            self._head += text[: self.limit - len(self._head)]
+        half = self.limit // 2
+        self._tail = (self._tail + text)[-half:] if half else ""
+        if self.spilling:
+            try:
+                self._write_file(text)
+            except OSError as e:
+                self._fail(e)
+
+    async def awrite(self, text: str) -> None:
+        """Append text, writing to disk from a worker thread."""
+        if not self.spilling and not self._failed and self._fits(len(text)):
+            self.write(text)
+        else:
+            await asyncio.to_thread(self.write, text)
+
+    def _open(self) -> None:
+        self.store.directory.mkdir(parents=True, exist_ok=True)
+        fd, self._tmp_name = tempfile.mkstemp(dir=self.store.directory, suffix=".tmp")
+        self._file = os.fdopen(fd, "wb")
+
+    def _write_file(self, text: str) -> None:
+        for start in range(0, len(text), CHUNK_SIZE):
+            chunk = text[start : start + CHUNK_SIZE].encode("utf-8", errors="replace")
+            self._digest.update(chunk)
+            self._file.write(chunk)
+
+    def _fail(self, error: OSError) -> None:
+        logger.warning(f"Could not store output of {self.name or 'tool'}: {error}")
+        self._failed = True
+        self.discard()
+
+    def discard(self) -> None:
+        """Drop the partially written output."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._tmp_name and os.path.exists(self._tmp_name):
+            os.unlink(self._tmp_name)
+        self._tmp_name = None
+
+    def close(self) -> str:
+        """Finish the output and return it, folded if it exceeded the limit."""
+        if self._failed:
+            return self._head
+        if not self.spilling:
+            return "".join(self._buffer)
+        try:
+            self._file.close()
+            self._file = None
+            self.output_id = self._digest.hexdigest()[:16]
+            path = self.store.path(self.output_id)
+            if path.exists():
+                os.unlink(self._tmp_name)
+            else:
+                os.replace(self._tmp_name, path)
+            self._tmp_name = None
+        except BaseException:
+            self.discard()
+            raise
+        return self._fold(self.output_id)
+
+    async def aclose(self) -> str:
+        """close(), finishing a spilled output from a worker thread."""
+        if not self.spilling:
+            return self.close()
+        return await asyncio.to_thread(self.close)
+
+    def _fold(self, output_id: str) -> str:
+        half = self.limit // 2
+        head = self._head[:half]
+        tail = self._tail[-half:] if half else ""
+        # Prefer cutting at line boundaries when one is close
+        if "\n" in head[half // 2 :]:
+            head = head[: head.rindex("\n") + 1]
+        if "\n" in tail[: half // 2]:
+            tail = tail[tail.index("\n") + 1 :]
+        total_lines = self._newlines + 1
+        omitted_lines = total_lines - head.count("\n") - tail.count("\n") - 1
+        return (
+            f"{head}\n... [{self._chars - len(head) - len(tail)} characters, about "
+            f"{omitted_lines} lines omitted. Full output ({total_lines} lines) stored as "
+            f"output_id={output_id} at {self.store.path(output_id)}; page through it with "
+            f"read_output] ...\n{tail}"
+        )
+
+
+class OutputStore:
+    """Stores tool outputs as files named by the sha256 of their content."""
+
+    def __init__(self, directory: Optional[Path] = None):
+        self.directory = Path(directory or config.workspace_root / ".tool_outputs")
+
+    def path(self, output_id: str) -> Path:
+        return self.directory / f"{output_id}.txt"
+
+    def writer(self, limit: Optional[int] = None, name: str = "") -> OutputWriter:
+        """Start streaming an output; limit defaults to the current observation limit."""
+        return OutputWriter(
+            self, limit if limit is not None else observation_limit.get(), name
+        )
+
+    def read(
+        self, output_id: str, start_line: int = 1, num_lines: int = 200
+    ) -> Tuple[List[str], int]:
+        """Return lines [start_line, start_line + num_lines) and the total line count.
+
+        Raises:
+            FileNotFoundError: If there is no output with this id
+        """
+        path = self.path(output_id)
+        if not OUTPUT_ID_PATTERN.fullmatch(output_id) or not path.exists():
+            raise FileNotFoundError(f"No stored output with id {output_id}")
+        lines: List[str] = []
+        total = 0
+        with path.open(encoding="utf-8", newline="") as f:
+            for total, line in enumerate(f, 1):
+                if start_line <= total < start_line + num_lines:
+                    lines.append(line)
+        return lines, total
+
+    @staticmethod
+    def is_folded(text: str) -> bool:
+        """Whether text already is a folded observation, e.g. from a streaming tool."""
+        return FOLD_MARKER_PATTERN.search(text) is not None
+
+    def fold(self, text: str, limit: int, name: str = "") -> str:
+        """Return text, or its head and tail with a handle if it exceeds limit chars."""
+        if len(text) <= limit:
+            return text
+        writer = OutputWriter(self, limit, name)
+        writer.write(text)
+        return writer.close()
+
+    async def afold(self, text: str, limit: int, name: str = "") -> str:
+        """fold() without blocking the event loop on the file write."""
+        if len(text) <= limit:
+            return text
+        return await asyncio.to_thread(self.fold, text, limit, name)
+
+
+output_store = OutputStore()
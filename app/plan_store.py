@@ -0,0 +1,400 @@
+"""Storage backends for PlanningTool plans.
+
+Plans live in a PlanStore instead of a dict on the tool. The in-memory
+store keeps the previous per-tool behaviour; the SQLite store persists
+plans across restarts and shares them between flows and worker processes.
+Both index plans by id and by overall status, apply read-modify-write
+updates such as mark_step atomically, and bump a per-plan version on every
+write that keys the cache of rendered plan text.
+"""
+
+import asyncio
+import copy
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import PROJECT_ROOT, PlanningSettings, config
+from app.logger import logger
+
+
+PLAN_STATUSES = ("not_started", "in_progress", "completed", "blocked")
+
+
+def plan_status(plan: Dict) -> str:
+    """Return a plan's overall status, derived from its step statuses."""
+    statuses = plan["step_statuses"]
+    if "blocked" in statuses:
+        return "blocked"
+    if all(status == "completed" for status in statuses):
+        return "completed"
+    if all(status == "not_started" for status in statuses):
+        return "not_started"
+    return "in_progress"
+
+
+def plan_summary(plan: Dict) -> Dict:
+    """Return the fields plan listings need."""
+    return {
+        "plan_id": plan["plan_id"],
+        "title": plan["title"],
+        "status": plan_status(plan),
+        "completed": sum(
+            1 for status in plan["step_statuses"] if status == "completed"
+        ),
+        "total": len(plan["steps"]),
+    }
+
+
+class PlanStore(ABC):
+    """Plans keyed by plan_id, with atomic updates and cached rendering."""
+
+    RENDER_CACHE_SIZE = 128  # Rendered plans kept, least recently used evicted first
+
+    # Whether calls may block (e.g. waiting on a file lock) and should be made
+    # from a worker thread when on the event loop; see run()
+    blocking = False
+
+    def __init__(self):
+        self._rendered: OrderedDict[str, tuple] = OrderedDict()
+        self._render_lock = threading.Lock()
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """Call func(*args), in a worker thread if this store's calls can block."""
+        if self.blocking:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    @abstractmethod
+    def get(self, plan_id: str) -> Optional[Dict]:
+        """Return a copy of the plan, or None if there is none with this id."""
+
+    @abstractmethod
+    def create(self, plan: Dict) -> bool:
+        """Add a new plan. Returns False if one with the same id exists."""
+
+    @abstractmethod
+    def put(self, plan: Dict) -> None:
+        """Add or replace a plan."""
+
+    @abstractmethod
+    def update(self, plan_id: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        """Apply mutate to the stored plan atomically and return the new plan.
+
+        Returns None if the plan does not exist. If mutate raises, the plan
+        is left unchanged and the exception propagates.
+        """
+
+    @abstractmethod
+    def delete(self, plan_id: str) -> bool:
+        """Delete a plan. Returns False if it did not exist."""
+
+    @abstractmethod
+    def list(self, status: Optional[str] = None) -> List[Dict]:
+        """Return summaries (see plan_summary) of all plans or those with a status."""
+
+    def mark_step(
+        self,
+        plan_id: str,
+        step_index: int,
+        step_status: Optional[str] = None,
+        step_notes: Optional[str] = None,
+    ) -> Optional[Dict]:
+        """Set a step's status and/or notes atomically and return the new plan.
+
+        Raises:
+            IndexError: If step_index is out of range
+        """
+
+        def mark(plan: Dict) -> None:
+            if not 0 <= step_index < len(plan["steps"]):
+                raise IndexError(step_index)
+            if step_status:
+                plan["step_statuses"][step_index] = step_status
+            if step_notes:
+                plan["step_notes"][step_index] = step_notes
+
+        return self.update(plan_id, mark)
+
+    def render(self, plan: Dict, formatter: Callable[[Dict], str]) -> str:
+        """Return formatter(plan), reusing the text rendered for the same version."""
+        key = (plan.get("version", 0), getattr(formatter, "__func__", formatter))
+        with self._render_lock:
+            cached = self._rendered.get(plan["plan_id"])
+            if cached is not None and cached[0] == key:
+                self._rendered.move_to_end(plan["plan_id"])
+                return cached[1]
+        text = formatter(plan)
+        with self._render_lock:
+            self._rendered[plan["plan_id"]] = (key, text)
+            self._rendered.move_to_end(plan["plan_id"])
+            while len(self._rendered) > self.RENDER_CACHE_SIZE:
+                self._rendered.popitem(last=False)
+        return text
+
+    def _forget_rendered(self, plan_id: str) -> None:
+        with self._render_lock:
+            self._rendered.pop(plan_id, None)
+
+
+class MemoryPlanStore(PlanStore):
+    """Plans held in this process, indexed by id and status."""
+
+    def __init__(self):
+        super().__init__()
+        self._plans: Dict[str, Dict] = {}
+        self._by_status: Dict[str, Dict[str, None]] = {
+            status: {} for status in PLAN_STATUSES
+        }
+        self._lock = threading.Lock()
+
+    def _index(self, plan: Dict, old: Optional[Dict] = None) -> None:
+        if old is not None:
+            self._by_status[plan_status(old)].pop(old["plan_id"], None)
+        self._by_status[plan_status(plan)][plan["plan_id"]] = None
+
+    def get(self, plan_id: str) -> Optional[Dict]:
+        with self._lock:
+            plan = self._plans.get(plan_id)
+            return copy.deepcopy(plan) if plan is not None else None
+
+    def create(self, plan: Dict) -> bool:
+        with self._lock:
+            if plan["plan_id"] in self._plans:
+                return False
+            plan = {**copy.deepcopy(plan), "version": 1}
+            self._plans[plan["plan_id"]] = plan
+            self._index(plan)
+            return True
+
+    def put(self, plan: Dict) -> None:
+        with self._lock:
+            old = self._plans.get(plan["plan_id"])
+            version = old["version"] + 1 if old is not None else 1
+            plan = {**copy.deepcopy(plan), "version": version}
+            self._plans[plan["plan_id"]] = plan
+            self._index(plan, old)
+
+    def update(self, plan_id: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        with self._lock:
+            old = self._plans.get(plan_id)
+            if old is None:
+                return None
+            plan = copy.deepcopy(old)
+            mutate(plan)
+            plan["version"] = old["version"] + 1
+            self._plans[plan_id] = plan
+            self._index(plan, old)
+            return copy.deepcopy(plan)
+
+    def delete(self, plan_id: str) -> bool:
+        with self._lock:
+            plan = self._plans.pop(plan_id, None)
+            if plan is None:
+                return False
+            self._by_status[plan_status(plan)].pop(plan_id, None)
+        self._forget_rendered(plan_id)
+        return True
+
+    def list(self, status: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            if status is None:
+                plans = list(self._plans.values())
+            else:
+                plans = [self._plans[plan_id] for plan_id in self._by_status[status]]
+            return [plan_summary(plan) for plan in plans]
+
+
+class SQLitePlanStore(PlanStore):
+    """Plans persisted in SQLite and shared by every process using the file.
+
+    Updates run in an IMMEDIATE transaction, so concurrent writers from
+    other threads or processes serialize instead of losing updates. Waiting
+    for another writer can block, so async callers go through run().
+    """
+
+    blocking = True
+
+    def __init__(self, path: Path):
+        super().__init__()
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit; transactions are opened explicitly around updates
+            self._conn = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS plans ("
+                "plan_id TEXT PRIMARY KEY, title TEXT NOT NULL, "
+                "status TEXT NOT NULL, completed INTEGER NOT NULL, "
+                "total INTEGER NOT NULL, version INTEGER NOT NULL, "
+                "updated_at REAL NOT NULL, data TEXT NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_plans_status ON plans(status, updated_at)"
+            )
+        return self._conn
+
+    @staticmethod
+    def _row(plan: Dict) -> tuple:
+        summary = plan_summary(plan)
+        return (
+            summary["title"],
+            summary["status"],
+            summary["completed"],
+            summary["total"],
+            plan["version"],
+            time.time(),
+            json.dumps(plan, ensure_ascii=False),
+            plan["plan_id"],
+        )
+
+    def get(self, plan_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = (
+                self._connect()
+                .execute("SELECT data FROM plans WHERE plan_id = ?", (plan_id,))
+                .fetchone()
+            )
+        return json.loads(row[0]) if row is not None else None
+
+    def create(self, plan: Dict) -> bool:
+        plan = {**plan, "version": 1}
+        with self._lock:
+            try:
+                self._connect().execute(
+                    "INSERT INTO plans (title, status, completed, total, version, "
+                    "updated_at, data, plan_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._row(plan),
+                )
+            except sqlite3.IntegrityError:
+                return False
+        return True
+
+    def put(self, plan: Dict) -> None:
+        self._transaction(plan["plan_id"], None, replacement=plan)
+
+    def update(self, plan_id: str, mutate: Callable[[Dict], None]) -> Optional[Dict]:
+        return self._transaction(plan_id, mutate)
+
+    def _transaction(
+        self,
+        plan_id: str,
+        mutate: Optional[Callable[[Dict], None]],
+        replacement: Optional[Dict] = None,
+    ) -> Optional[Dict]:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT data FROM plans WHERE plan_id = ?", (plan_id,)
+                ).fetchone()
+                old = json.loads(row[0]) if row is not None else None
+                if replacement is not None:
+                    plan = dict(replacement)
+                elif old is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                else:
+                    plan = old
+                    mutate(plan)
+                plan["version"] = old["version"] + 1 if old is not None else 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO plans (title, status, completed, total, "
+                    "version, updated_at, data, plan_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._row(plan),
+                )
+                conn.execute("COMMIT")
+                return plan
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, plan_id: str) -> bool:
+        with self._lock:
+            cursor = self._connect().execute(
+                "DELETE FROM plans WHERE plan_id = ?", (plan_id,)
+            )
+        self._forget_rendered(plan_id)
+        return cursor.rowcount > 0
+
+    def list(self, status: Optional[str] = None) -> List[Dict]:
+        query = "SELECT plan_id, title, status, completed, total FROM plans"
+        params: tuple = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._connect().execute(query + " ORDER BY updated_at", params)
+            rows = rows.fetchall()
+        return [
+            dict(zip(("plan_id", "title", "status", "completed", "total"), row))
+            for row in rows
+        ]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_sqlite_stores: Dict[Path, SQLitePlanStore] = {}
+
+
+def get_plan_store(settings: Optional[PlanningSettings] = None) -> PlanStore:
+    """Return a store for a new PlanningTool.
+
+    The memory backend gives each tool its own store, as before; SQLite stores
+    are shared process-wide per file.
+    """
+    settings = settings or config.planning or PlanningSettings()
+    if settings.store == "memory":
+        return MemoryPlanStore()
+    if settings.store != "sqlite":
+        raise ValueError(f"Invalid plan store: {settings.store}")
+    path = Path(settings.path) if settings.path else None
+    if path is None:
+        path = PROJECT_ROOT / "cache" / "plans.sqlite"
+    elif not path.is_absolute():
+        path = PROJECT_ROOT / path
+    if path not in _sqlite_stores:
+        _sqlite_stores[path] = SQLitePlanStore(path)
+        logger.info(f"Storing plans in {path}")
+    return _sqlite_stores[path]
+
+
+class PlanMapping(Mapping):
+    """Read-only dict view of a store, for code that used PlanningTool.plans."""
+
+    def __init__(self, store: PlanStore):
+        self.store = store
+
+    def __getitem__(self, plan_id: str) -> Dict:
+        plan = self.store.get(plan_id)
+        if plan is None:
+            raise KeyError(plan_id)
+        return plan
+
+    def __contains__(self, plan_id: object) -> bool:
+        return isinstance(plan_id, str) and self.store.get(plan_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        return iter([summary["plan_id"] for summary in self.store.list()])
+
+    def __len__(self) -> int:
+        return len(self.store.list())
@@ -1,7 +1,10 @@
+from collections import Counter, deque
 from enum import Enum
-from typing import Any, List, Literal, Optional, Union
+from typing import Any, Dict, List, Literal, Optional, Union
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, PrivateAttr, model_validator
+
+from app.image_store import image_store
 
 
 class Role(str, Enum):
@@ -59,7 +62,34 @@ class Message(BaseModel):
     tool_calls: Optional[List[ToolCall]] = Field(default=None)
     name: Optional[str] = Field(default=None)
     tool_call_id: Optional[str] = Field(default=None)
-    base64_image: Optional[str] = Field(default=None)
+    image_id: Optional[str] = Field(default=None)
+
+    # OpenAI-format dict, built once and shared by every request
+    _dict: Optional[dict] = PrivateAttr(default=None)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if not name.startswith("_"):
+            self._dict = None
+
+    def model_copy(self, *, update: Optional[dict] = None, deep: bool = False):
+        copy = super().model_copy(update=update, deep=deep)
+        copy._dict = None
+        return copy
+
+    @model_validator(mode="before")
+    @classmethod
+    def store_image(cls, data: Any) -> Any:
+        """Move an inline base64 image into the image store, keeping only its id"""
+        if isinstance(data, dict) and data.get("base64_image"):
+            data = dict(data)
+            data["image_id"] = image_store.put(data.pop("base64_image"))
+        return data
+
+    @property
+    def base64_image(self) -> Optional[str]:
+        """Full-size base64 image, loaded from the image store"""
+        return image_store.get_base64(self.image_id) if self.image_id else None
 
     def __add__(self, other) -> List["Message"]:
         """支持 Message + list 或 Message + Message 的操作"""
@@ -82,7 +112,12 @@ class Message(BaseModel):
             )
 
     def to_dict(self) -> dict:
-        """Convert message to dictionary format"""
+        """Convert message to dictionary format.
+
+        The dict is cached, so callers must treat it as read-only.
+        """
+        if self._dict is not None:
+            return self._dict
         message = {"role": self.role}
         if self.content is not None:
             message["content"] = self.content
@@ -92,8 +127,9 @@ class Message(BaseModel):
             message["name"] = self.name
         if self.tool_call_id is not None:
             message["tool_call_id"] = self.tool_call_id
-        if self.base64_image is not None:
-            message["base64_image"] = self.base64_image
+        if self.image_id is not None:
+            message["image_id"] = self.image_id
+        self._dict = message
         return message
 
     @classmethod
@@ -156,32 +192,130 @@ class Message(BaseModel):
         )
 
 
+class LoopDetector:
+    """Detects an agent repeating itself in O(1) per message.
+
+    Keeps a rolling window of hashes of recent assistant texts and tool-call
+    signatures (name + arguments), with a count per hash, so checking whether
+    the latest assistant message repeats an earlier one needs no rescans.
+    """
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self._recent: deque = deque()
+        self._counts: Counter = Counter()
+        self._last_repeats = 0
+        self.observed = 0
+        self.text_repeats = 0
+        self.tool_call_repeats = 0
+        self.stuck_detections = 0
+
+    def _push(self, key: tuple) -> int:
+        """Add a key to the window and return how often it was already there."""
+        previous = self._counts[key]
+        self._recent.append(key)
+        self._counts[key] += 1
+        if len(self._recent) > self.window:
+            evicted = self._recent.popleft()
+            self._counts[evicted] -= 1
+            if not self._counts[evicted]:
+                del self._counts[evicted]
+        return previous
+
+    def observe(self, message: Message) -> None:
+        """Update the window with a message added to memory."""
+        if message.role != Role.ASSISTANT:
+            return
+        self.observed += 1
+        repeats = 0
+        if message.content:
+            text_repeats = self._push(("text", hash(message.content)))
+            if text_repeats:
+                self.text_repeats += 1
+            repeats = max(repeats, text_repeats)
+        if message.tool_calls:
+            signature = tuple(
+                (call.function.name, call.function.arguments)
+                for call in message.tool_calls
+            )
+            call_repeats = self._push(("tool_calls", hash(signature)))
+            if call_repeats:
+                self.tool_call_repeats += 1
+            repeats = max(repeats, call_repeats)
+        self._last_repeats = repeats
+
+    def is_stuck(self, threshold: int) -> bool:
+        """Whether the latest assistant message repeats at least `threshold` earlier ones."""
+        stuck = self._last_repeats >= threshold
+        if stuck:
+            self.stuck_detections += 1
+        return stuck
+
+    def reset(self) -> None:
+        self._recent.clear()
+        self._counts.clear()
+        self._last_repeats = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "observed": self.observed,
+            "text_repeats": self.text_repeats,
+            "tool_call_repeats": self.tool_call_repeats,
+            "stuck_detections": self.stuck_detections,
+            "last_repeats": self._last_repeats,
+        }
+
+
 class Memory(BaseModel):
     messages: List[Message] = Field(default_factory=list)
     max_messages: int = Field(default=100)
 
+    _loop_detector: LoopDetector = PrivateAttr(default_factory=LoopDetector)
+    _added: int = PrivateAttr(default=0)
+
+    @property
+    def loop_detector(self) -> LoopDetector:
+        return self._loop_detector
+
+    @property
+    def total_added(self) -> int:
+        """Messages added through add_message(s) over the memory's lifetime"""
+        return self._added
+
     def add_message(self, message: Message) -> None:
         """Add a message to memory"""
         self.messages.append(message)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        self._loop_detector.observe(message)
+        self._added += 1
+        self._trim()
 
     def add_messages(self, messages: List[Message]) -> None:
         """Add multiple messages to memory"""
         self.messages.extend(messages)
-        # Optional: Implement message limit
-        if len(self.messages) > self.max_messages:
-            self.messages = self.messages[-self.max_messages :]
+        for message in messages:
+            self._loop_detector.observe(message)
+        self._added += len(messages)
+        self._trim()
+
+    def _trim(self) -> None:
+        """Enforce max_messages without orphaning tool results from their call"""
+        if len(self.messages) <= self.max_messages:
+            return
+        start = len(self.messages) - self.max_messages
+        while start < len(self.messages) and self.messages[start].role == Role.TOOL:
+            start += 1
+        # In place, so references to the list stay valid
+        del self.messages[:start]
 
     def clear(self) -> None:
         """Clear all messages"""
         self.messages.clear()
+        self._loop_detector.reset()
 
     def get_recent_messages(self, n: int) -> List[Message]:
         """Get n most recent messages"""
-        return self.messages[-n:]
+        return self.messages[-n:] if n > 0 else []
 
     def to_dict_list(self) -> List[dict]:
-        """Convert messages to list of dicts"""
-        return [msg.to_dict() for msg in self.messages]
+        """Convert messages to list of dicts (cached per message; treat them as read-only)"""
+        return [message.to_dict() for message in self.messages]
@@ -0,0 +1,153 @@
+"""Host many concurrent agent sessions in one process.
+
+Each session gets its own Manus agent, so memory and agent state stay
+isolated, while the expensive resources are shared: one browser process
+(every session browses in its own browser context), one set of MCP server
+connections and the LLM clients, which are already pooled per endpoint.
+Admission control bounds running and waiting sessions.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional
+
+from app.agent.manus import Manus
+from app.config import SessionSettings, config
+from app.exceptions import SessionRejected
+from app.llm import LLM
+from app.tool.browser_use_tool import BrowserUseBrowser, BrowserUseTool
+from app.tool.mcp import MCPClients
+from app.tracing import tracer
+
+
+class SharedResources:
+    """Resources leased to every session of a runner."""
+
+    def __init__(self):
+        self.mcp_clients = MCPClients()
+        self._browser: Optional[BrowserUseBrowser] = None
+        self._browser_lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        """Connect the configured MCP servers and warm the LLM connection."""
+        await asyncio.gather(
+            LLM().preconnect(),
+            *(
+                self.mcp_clients.connect_configured(server_id, server_config)
+                for server_id, server_config in config.mcp_config.servers.items()
+            ),
+        )
+
+    async def browser(self) -> BrowserUseBrowser:
+        """Return the shared browser, launching it on first use."""
+        async with self._browser_lock:
+            if self._browser is None:
+                browser = BrowserUseTool.create_browser()
+                # Launch once here; concurrent new_context calls would race to launch
+                await browser.get_playwright_browser()
+                self._browser = browser
+            return self._browser
+
+    async def close(self) -> None:
+        await self.mcp_clients.disconnect()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+
+
+class SessionRunner:
+    """Runs agent sessions concurrently with admission control."""
+
+    def __init__(self, settings: Optional[SessionSettings] = None):
+        settings = settings or config.sessions or SessionSettings()
+        self.max_sessions = settings.max_sessions
+        self.max_pending = settings.max_pending
+        self.session_timeout = settings.session_timeout
+        self.resources = SharedResources()
+        self._slots = asyncio.Semaphore(self.max_sessions)
+        self._active = 0
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._started = time.monotonic()
+        self._cpu_started = time.process_time()
+
+    async def __aenter__(self) -> "SessionRunner":
+        await self.resources.start()
+        self._started = time.monotonic()
+        self._cpu_started = time.process_time()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.resources.close()
+
+    async def create_agent(self, **kwargs: Any) -> Manus:
+        """Create a session's agent wired to the shared resources."""
+        agent = await Manus.create(
+            mcp_clients=self.resources.mcp_clients, owns_mcp_clients=False, **kwargs
+        )
+        for tool in agent.available_tools:
+            if isinstance(tool, BrowserUseTool):
+                tool.browser_provider = self.resources.browser
+        return agent
+
+    async def run(self, request: str, **agent_kwargs: Any) -> str:
+        """Run one session to completion and return the agent's result.
+
+        Raises:
+            SessionRejected: If all slots are busy and the wait queue is full
+            asyncio.TimeoutError: If the session exceeds session_timeout
+        """
+        if self._slots.locked() and self._pending >= self.max_pending:
+            self._rejected += 1
+            raise SessionRejected(
+                f"{self._active} sessions running and {self._pending} waiting"
+            )
+        self._pending += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._pending -= 1
+
+        self._active += 1
+        try:
+            with tracer.span("session", category="session"):
+                agent = await self.create_agent(**agent_kwargs)
+                try:
+                    result = await asyncio.wait_for(
+                        agent.run(request), timeout=self.session_timeout
+                    )
+                finally:
+                    # Only closes the agent's own browser context
+                    await agent.cleanup()
+            self._completed += 1
+            return result
+        except Exception:
+            self._failed += 1
+            raise
+        finally:
+            self._active -= 1
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return session counts and throughput per CPU core."""
+        elapsed = time.monotonic() - self._started
+        cpu_seconds = time.process_time() - self._cpu_started
+        cores = os.cpu_count() or 1
+        return {
+            "active": self._active,
+            "pending": self._pending,
+            "completed": self._completed,
+            "failed": self._failed,
+            "rejected": self._rejected,
+            "elapsed": elapsed,
+            "cpu_seconds": cpu_seconds,
+            "sessions_per_core_hour": (
+                self._completed * 3600 / (elapsed * cores) if elapsed else 0.0
+            ),
+            "cpu_seconds_per_session": (
+                cpu_seconds / self._completed if self._completed else 0.0
+            ),
+        }
@@ -1,13 +1,56 @@
+"""Tool classes, resolved lazily.
+
+Importing ``app.tool`` only loads the base classes; each tool module is
+imported the first time its class is looked up, so entry points that don't
+use a tool don't pay for its dependencies (browser_use, crawl4ai, search
+engines, ...).
+"""
+
+import importlib
+from typing import TYPE_CHECKING, Any, Dict, List
+
 from app.tool.base import BaseTool
-from app.tool.bash import Bash
-from app.tool.browser_use_tool import BrowserUseTool
-from app.tool.crawl4ai import Crawl4aiTool
-from app.tool.create_chat_completion import CreateChatCompletion
-from app.tool.planning import PlanningTool
-from app.tool.str_replace_editor import StrReplaceEditor
-from app.tool.terminate import Terminate
 from app.tool.tool_collection import ToolCollection
-from app.tool.web_search import WebSearch
+
+
+if TYPE_CHECKING:
+    from app.tool.bash import Bash
+    from app.tool.browser_use_tool import BrowserUseTool
+    from app.tool.crawl4ai import Crawl4aiTool
+    from app.tool.create_chat_completion import CreateChatCompletion
+    from app.tool.planning import PlanningTool
+    from app.tool.read_output import ReadOutput
+    from app.tool.str_replace_editor import StrReplaceEditor
+    from app.tool.terminate import Terminate
+    from app.tool.web_search import WebSearch
+
+
+# Class name -> module defining it
+TOOL_REGISTRY: Dict[str, str] = {
+    "Bash": "app.tool.bash",
+    "BrowserUseTool": "app.tool.browser_use_tool",
+    "Crawl4aiTool": "app.tool.crawl4ai",
+    "CreateChatCompletion": "app.tool.create_chat_completion",
+    "PlanningTool": "app.tool.planning",
+    "ReadOutput": "app.tool.read_output",
+    "StrReplaceEditor": "app.tool.str_replace_editor",
+    "Terminate": "app.tool.terminate",
+    "WebSearch": "app.tool.web_search",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module = TOOL_REGISTRY.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    tool_class = getattr(importlib.import_module(module), name)
+    # Cache so later lookups skip __getattr__
+    globals()[name] = tool_class
+    return tool_class
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(TOOL_REGISTRY))
 
 
 __all__ = [
@@ -21,4 +64,5 @@ __all__ = [
     "CreateChatCompletion",
     "PlanningTool",
     "Crawl4aiTool",
+    "ReadOutput",
 ]
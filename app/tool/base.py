@@ -94,6 +94,8 @@ class BaseTool(ABC, BaseModel):
     name: str
     description: str
     parameters: Optional[dict] = None
+    # Read-only / idempotent tools may run alongside other safe calls of a step
+    concurrency_safe: bool = False
     # _schemas: Dict[str, List[ToolSchema]] = {}
 
     class Config:
@@ -121,6 +123,13 @@ class BaseTool(ABC, BaseModel):
     async def execute(self, **kwargs) -> Any:
         """Execute the tool with given parameters."""
 
+    def is_concurrency_safe(self, **kwargs) -> bool:
+        """Whether a call with these arguments may run concurrently with other safe calls.
+
+        Override for tools whose safety depends on the command (e.g. read vs write).
+        """
+        return self.concurrency_safe
+
     def to_param(self) -> Dict:
         """Convert tool to function call format.
 
@@ -1,8 +1,10 @@
 import asyncio
+import codecs
 import os
 from typing import Optional
 
 from app.exceptions import ToolError
+from app.output_store import output_store
 from app.tool.base import BaseTool, CLIResult
 
 
@@ -20,7 +22,7 @@ class _BashSession:
     _process: asyncio.subprocess.Process
 
     command: str = "/bin/bash"
-    _output_delay: float = 0.2  # seconds
+    _read_size: int = 64 * 1024  # bytes
     _timeout: float = 120.0  # seconds
     _sentinel: str = "<<exit>>"
 
@@ -77,28 +79,38 @@ class _BashSession:
         )
         await self._process.stdin.drain()
 
-        # read output from the process, until the sentinel is found
+        # read output from the process until the sentinel is found, streaming it
+        # to the output store so that a large output is never held whole
+        writer = output_store.writer(name="bash")
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        sentinel = f"{self._sentinel}\n"
+        pending = ""
         try:
             async with asyncio.timeout(self._timeout):
                 while True:
-                    await asyncio.sleep(self._output_delay)
-                    # if we read directly from stdout/stderr, it will wait forever for
-                    # EOF. use the StreamReader buffer directly instead.
-                    output = (
-                        self._process.stdout._buffer.decode()
-                    )  # pyright: ignore[reportAttributeAccessIssue]
-                    if self._sentinel in output:
-                        # strip the sentinel and break
-                        output = output[: output.index(self._sentinel)]
+                    chunk = await self._process.stdout.read(self._read_size)
+                    if not chunk:
+                        # bash exited before echoing the sentinel
                         break
+                    pending += decoder.decode(chunk)
+                    if sentinel in pending:
+                        pending = pending[: pending.index(sentinel)]
+                        break
+                    # hold back what may be the start of a split sentinel
+                    keep = len(sentinel) - 1
+                    await writer.awrite(pending[:-keep])
+                    pending = pending[-keep:]
         except asyncio.TimeoutError:
+            writer.discard()
             self._timed_out = True
             raise ToolError(
                 f"timed out: bash has not returned in {self._timeout} seconds and must be restarted",
             ) from None
 
-        if output.endswith("\n"):
-            output = output[:-1]
+        if pending.endswith("\n"):
+            pending = pending[:-1]
+        await writer.awrite(pending)
+        output = await writer.aclose()
 
         error = (
             self._process.stderr._buffer.decode()
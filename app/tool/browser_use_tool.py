@@ -1,7 +1,7 @@
 import asyncio
 import base64
 import json
-from typing import Generic, Optional, TypeVar
+from typing import Awaitable, Callable, Generic, Optional, TypeVar
 
 from browser_use import Browser as BrowserUseBrowser
 from browser_use import BrowserConfig
@@ -14,6 +14,7 @@ from app.config import config
 from app.llm import LLM
 from app.tool.base import BaseTool, ToolResult
 from app.tool.web_search import WebSearch
+from app.tracing import tracer
 
 
 _BROWSER_DESCRIPTION = """\
@@ -125,6 +126,10 @@ class BrowserUseTool(BaseTool, Generic[Context]):
     browser: Optional[BrowserUseBrowser] = Field(default=None, exclude=True)
     context: Optional[BrowserContext] = Field(default=None, exclude=True)
     dom_service: Optional[DomService] = Field(default=None, exclude=True)
+    # Supplies a shared browser instead of launching one; the provider owns its lifecycle
+    browser_provider: Optional[Callable[[], Awaitable[BrowserUseBrowser]]] = Field(
+        default=None, exclude=True
+    )
     web_search_tool: WebSearch = Field(default_factory=WebSearch, exclude=True)
 
     # Context for generic functionality
@@ -138,38 +143,46 @@ class BrowserUseTool(BaseTool, Generic[Context]):
             raise ValueError("Parameters cannot be empty")
         return v
 
-    async def _ensure_browser_initialized(self) -> BrowserContext:
-        """Ensure browser and context are initialized."""
-        if self.browser is None:
-            browser_config_kwargs = {"headless": False, "disable_security": True}
+    @staticmethod
+    def create_browser() -> BrowserUseBrowser:
+        """Create a browser from the [browser] configuration."""
+        browser_config_kwargs = {"headless": False, "disable_security": True}
 
-            if config.browser_config:
-                from browser_use.browser.browser import ProxySettings
+        if config.browser_config:
+            from browser_use.browser.browser import ProxySettings
 
-                # handle proxy settings.
-                if config.browser_config.proxy and config.browser_config.proxy.server:
-                    browser_config_kwargs["proxy"] = ProxySettings(
-                        server=config.browser_config.proxy.server,
-                        username=config.browser_config.proxy.username,
-                        password=config.browser_config.proxy.password,
-                    )
+            # handle proxy settings.
+            if config.browser_config.proxy and config.browser_config.proxy.server:
+                browser_config_kwargs["proxy"] = ProxySettings(
+                    server=config.browser_config.proxy.server,
+                    username=config.browser_config.proxy.username,
+                    password=config.browser_config.proxy.password,
+                )
 
-                browser_attrs = [
-                    "headless",
-                    "disable_security",
-                    "extra_chromium_args",
-                    "chrome_instance_path",
-                    "wss_url",
-                    "cdp_url",
-                ]
+            browser_attrs = [
+                "headless",
+                "disable_security",
+                "extra_chromium_args",
+                "chrome_instance_path",
+                "wss_url",
+                "cdp_url",
+            ]
 
-                for attr in browser_attrs:
-                    value = getattr(config.browser_config, attr, None)
-                    if value is not None:
-                        if not isinstance(value, list) or value:
-                            browser_config_kwargs[attr] = value
+            for attr in browser_attrs:
+                value = getattr(config.browser_config, attr, None)
+                if value is not None:
+                    if not isinstance(value, list) or value:
+                        browser_config_kwargs[attr] = value
 
-            self.browser = BrowserUseBrowser(BrowserConfig(**browser_config_kwargs))
+        return BrowserUseBrowser(BrowserConfig(**browser_config_kwargs))
+
+    async def _ensure_browser_initialized(self) -> BrowserContext:
+        """Ensure browser and context are initialized."""
+        if self.browser is None:
+            if self.browser_provider is not None:
+                self.browser = await self.browser_provider()
+            else:
+                self.browser = self.create_browser()
 
         if self.context is None:
             context_config = BrowserContextConfig()
@@ -187,6 +200,7 @@ class BrowserUseTool(BaseTool, Generic[Context]):
 
         return self.context
 
+    @tracer.traced("browser.execute", category="browser")
     async def execute(
         self,
         action: str,
@@ -220,6 +234,7 @@ class BrowserUseTool(BaseTool, Generic[Context]):
         Returns:
             ToolResult with the action's output or error
         """
+        tracer.current().set(action=action)
         async with self.lock:
             try:
                 context = await self._ensure_browser_initialized()
@@ -476,6 +491,7 @@ Page content:
             except Exception as e:
                 return ToolResult(error=f"Browser action '{action}' failed: {str(e)}")
 
+    @tracer.traced("browser.get_state", category="browser")
     async def get_current_state(
         self, context: Optional[BrowserContext] = None
     ) -> ToolResult:
@@ -508,6 +524,7 @@ Page content:
                 full_page=True, animations="disabled", type="jpeg", quality=100
             )
 
+            tracer.current().set(screenshot_bytes=len(screenshot))
             screenshot = base64.b64encode(screenshot).decode("utf-8")
 
             # Build the state info with all required fields
@@ -546,7 +563,8 @@ Page content:
                 self.context = None
                 self.dom_service = None
             if self.browser is not None:
-                await self.browser.close()
+                if self.browser_provider is None:
+                    await self.browser.close()
                 self.browser = None
 
     def __del__(self):
@@ -31,6 +31,8 @@ class Crawl4aiTool(BaseTool):
 
     Perfect for content analysis, research, and feeding web content to AI models."""
 
+    concurrency_safe: bool = True
+
     parameters: dict = {
         "type": "object",
         "properties": {
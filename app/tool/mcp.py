@@ -1,25 +1,85 @@
+import asyncio
+import hashlib
+import json
 from contextlib import AsyncExitStack
-from typing import Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.sse import sse_client
 from mcp.client.stdio import stdio_client
 from mcp.types import ListToolsResult, TextContent
+from pydantic import Field
 
+from app.config import PROJECT_ROOT, MCPServerConfig, config
 from app.logger import logger
 from app.tool.base import BaseTool, ToolResult
 from app.tool.tool_collection import ToolCollection
 
 
+TOOL_CACHE_PATH = PROJECT_ROOT / "cache" / "mcp_tools.json"
+
+
+def _server_fingerprint(server_config: MCPServerConfig) -> str:
+    data = server_config.model_dump(include={"type", "url", "command", "args"})
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _load_cached_tools(
+    server_id: str, server_config: MCPServerConfig
+) -> Optional[List[Dict[str, Any]]]:
+    """Return the tool schemas last listed by this server, if its config is unchanged."""
+    try:
+        entry = json.loads(TOOL_CACHE_PATH.read_text(encoding="utf-8")).get(server_id)
+    except (OSError, ValueError):
+        return None
+    if not entry or entry.get("fingerprint") != _server_fingerprint(server_config):
+        return None
+    return entry.get("tools")
+
+
+def _save_cached_tools(
+    server_id: str, server_config: MCPServerConfig, tools: List["MCPClientTool"]
+) -> None:
+    try:
+        cache = json.loads(TOOL_CACHE_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        cache = {}
+    cache[server_id] = {
+        "fingerprint": _server_fingerprint(server_config),
+        "tools": [
+            {
+                "name": tool.original_name,
+                "description": tool.description,
+                "inputSchema": tool.parameters,
+            }
+            for tool in tools
+        ],
+    }
+    try:
+        TOOL_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        TOOL_CACHE_PATH.write_text(json.dumps(cache, indent=2), encoding="utf-8")
+    except OSError as e:
+        logger.debug(f"Could not cache MCP tool schemas: {e}")
+
+
 class MCPClientTool(BaseTool):
     """Represents a tool proxy that can be called on the MCP server from the client side."""
 
     session: Optional[ClientSession] = None
     server_id: str = ""  # Add server identifier
     original_name: str = ""
+    # Owning MCPClients, used to connect lazily registered servers on first call
+    clients: Optional[Any] = Field(default=None, exclude=True)
 
     async def execute(self, **kwargs) -> ToolResult:
         """Execute the tool by making a remote call to the MCP server."""
+        if not self.session and self.clients is not None:
+            try:
+                self.session = await self.clients.ensure_connected(self.server_id)
+            except Exception as e:
+                return ToolResult(
+                    error=f"Failed to connect to MCP server {self.server_id}: {e}"
+                )
         if not self.session:
             return ToolResult(error="Not connected to MCP server")
 
@@ -40,33 +100,31 @@ class MCPClients(ToolCollection):
     """
 
     sessions: Dict[str, ClientSession] = {}
-    exit_stacks: Dict[str, AsyncExitStack] = {}
     description: str = "MCP client tools for server interaction"
 
     def __init__(self):
         super().__init__()  # Initialize with empty tools list
         self.name = "mcp"  # Keep name for backward compatibility
+        # Per instance, so agents in one process don't share connections
+        self.sessions: Dict[str, ClientSession] = {}
+        # server_id -> (task holding the connection, event asking it to close)
+        self._connections: Dict[str, Tuple[asyncio.Task, asyncio.Event]] = {}
+        # Lazily registered servers and the lock serializing their first connect
+        self._lazy_servers: Dict[str, MCPServerConfig] = {}
+        self._connect_locks: Dict[str, asyncio.Lock] = {}
+        # Agents sharing these connections; the last release() disconnects
+        self._holders = 0
 
     async def connect_sse(self, server_url: str, server_id: str = "") -> None:
         """Connect to an MCP server using SSE transport."""
         if not server_url:
             raise ValueError("Server URL is required.")
 
-        server_id = server_id or server_url
+        async def open_session(exit_stack: AsyncExitStack) -> ClientSession:
+            streams = await exit_stack.enter_async_context(sse_client(url=server_url))
+            return await exit_stack.enter_async_context(ClientSession(*streams))
 
-        # Always ensure clean disconnection before new connection
-        if server_id in self.sessions:
-            await self.disconnect(server_id)
-
-        exit_stack = AsyncExitStack()
-        self.exit_stacks[server_id] = exit_stack
-
-        streams_context = sse_client(url=server_url)
-        streams = await exit_stack.enter_async_context(streams_context)
-        session = await exit_stack.enter_async_context(ClientSession(*streams))
-        self.sessions[server_id] = session
-
-        await self._initialize_and_list_tools(server_id)
+        await self._connect(server_id or server_url, open_session)
 
     async def connect_stdio(
         self, command: str, args: List[str], server_id: str = ""
@@ -75,24 +133,166 @@ class MCPClients(ToolCollection):
         if not command:
             raise ValueError("Server command is required.")
 
-        server_id = server_id or command
+        async def open_session(exit_stack: AsyncExitStack) -> ClientSession:
+            server_params = StdioServerParameters(command=command, args=args)
+            read, write = await exit_stack.enter_async_context(
+                stdio_client(server_params)
+            )
+            return await exit_stack.enter_async_context(ClientSession(read, write))
+
+        await self._connect(server_id or command, open_session)
+
+    async def _connect(
+        self,
+        server_id: str,
+        open_session: Callable[[AsyncExitStack], Awaitable[ClientSession]],
+    ) -> None:
+        """Open a connection in its own task and list the server's tools.
 
+        The MCP transports use anyio cancel scopes, which must be exited by
+        the task that entered them; holding each connection in a dedicated
+        task lets servers connect concurrently (and lazily, from whichever
+        task first calls a tool) while disconnect stays safe from any task.
+        """
         # Always ensure clean disconnection before new connection
-        if server_id in self.sessions:
+        if server_id in self.sessions or server_id in self._connections:
             await self.disconnect(server_id)
 
-        exit_stack = AsyncExitStack()
-        self.exit_stacks[server_id] = exit_stack
-
-        server_params = StdioServerParameters(command=command, args=args)
-        stdio_transport = await exit_stack.enter_async_context(
-            stdio_client(server_params)
+        ready = asyncio.get_running_loop().create_future()
+        stop = asyncio.Event()
+        task = asyncio.create_task(
+            self._hold_connection(server_id, open_session, ready, stop),
+            name=f"mcp-{server_id}",
+        )
+        self._connections[server_id] = (task, stop)
+        try:
+            await ready
+            await self._initialize_and_list_tools(server_id)
+        except BaseException:
+            # Failed or timed out: close the half-open connection in its own task
+            stop.set()
+            task.cancel()
+            self._connections.pop(server_id, None)
+            self.sessions.pop(server_id, None)
+            raise
+
+    async def _hold_connection(
+        self,
+        server_id: str,
+        open_session: Callable[[AsyncExitStack], Awaitable[ClientSession]],
+        ready: asyncio.Future,
+        stop: asyncio.Event,
+    ) -> None:
+        session = None
+        try:
+            async with AsyncExitStack() as exit_stack:
+                session = await open_session(exit_stack)
+                self.sessions[server_id] = session
+                ready.set_result(None)
+                await stop.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                logger.warning(f"MCP connection to {server_id} closed with error: {e}")
+        finally:
+            if not ready.done():
+                ready.cancel()
+            if session is not None and self.sessions.get(server_id) is session:
+                self.sessions.pop(server_id, None)
+
+    async def connect_server(
+        self, server_id: str, server_config: MCPServerConfig
+    ) -> None:
+        """Connect to a configured server within its connect timeout.
+
+        In lazy mode, if the server's tools were listed before, they are
+        registered from the cached schemas and the connection is only opened
+        when one of them is first called.
+
+        Raises:
+            asyncio.TimeoutError: If the server does not come up in time
+        """
+        settings = config.mcp_config
+        lazy = settings.lazy if server_config.lazy is None else server_config.lazy
+        if lazy:
+            cached = _load_cached_tools(server_id, server_config)
+            if cached is not None:
+                self._lazy_servers[server_id] = server_config
+                self._register_tools(server_id, None, cached)
+                logger.info(
+                    f"Registered {len(cached)} tools of MCP server {server_id}; "
+                    "connecting on first use"
+                )
+                return
+
+        timeout = server_config.connect_timeout or settings.connect_timeout
+        if server_config.type == "sse":
+            connect = self.connect_sse(server_config.url, server_id)
+        elif server_config.type == "stdio":
+            connect = self.connect_stdio(
+                server_config.command, server_config.args, server_id
+            )
+        else:
+            raise ValueError(f"Unsupported MCP server type: {server_config.type}")
+        await asyncio.wait_for(connect, timeout=timeout)
+        _save_cached_tools(
+            server_id,
+            server_config,
+            [tool for tool in self.tools if tool.server_id == server_id],
         )
-        read, write = stdio_transport
-        session = await exit_stack.enter_async_context(ClientSession(read, write))
-        self.sessions[server_id] = session
 
-        await self._initialize_and_list_tools(server_id)
+    async def connect_configured(
+        self, server_id: str, server_config: MCPServerConfig
+    ) -> bool:
+        """Connect a configured server unless it is already up, logging failures.
+
+        Returns:
+            Whether the server's tools are available
+        """
+        if not (server_config.url or server_config.command):
+            return False
+        if self.has_server(server_id):
+            # Reconnecting would close the session of agents still using it
+            return True
+        try:
+            await self.connect_server(server_id, server_config)
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out connecting to MCP server {server_id}")
+            return False
+        except Exception as e:
+            logger.error(f"Failed to connect to MCP server {server_id}: {e}")
+            return False
+        return True
+
+    def has_server(self, server_id: str) -> bool:
+        """Whether a server is connected or registered for lazy connection."""
+        return server_id in self.sessions or server_id in self._lazy_servers
+
+    def hold(self) -> None:
+        """Keep the connections open until a matching release()."""
+        self._holders += 1
+
+    async def release(self) -> None:
+        """Drop a hold, disconnecting all servers when it was the last one."""
+        self._holders = max(0, self._holders - 1)
+        if self._holders == 0:
+            await self.disconnect()
+
+    async def ensure_connected(self, server_id: str) -> Optional[ClientSession]:
+        """Connect a lazily registered server, once, and return its session."""
+        if server_id in self.sessions:
+            return self.sessions[server_id]
+        server_config = self._lazy_servers.get(server_id)
+        if server_config is None:
+            return None
+        lock = self._connect_locks.setdefault(server_id, asyncio.Lock())
+        async with lock:
+            if server_id not in self.sessions:
+                logger.info(f"Connecting to MCP server {server_id} on first use")
+                server_config = server_config.model_copy(update={"lazy": False})
+                await self.connect_server(server_id, server_config)
+        return self.sessions.get(server_id)
 
     async def _initialize_and_list_tools(self, server_id: str) -> None:
         """Initialize session and populate tool map."""
@@ -103,27 +303,56 @@ class MCPClients(ToolCollection):
         await session.initialize()
         response = await session.list_tools()
 
-        # Create proper tool objects for each server tool
-        for tool in response.tools:
-            original_name = tool.name
+        self._register_tools(
+            server_id,
+            session,
+            [
+                {
+                    "name": tool.name,
+                    "description": tool.description,
+                    "inputSchema": tool.inputSchema,
+                }
+                for tool in response.tools
+            ],
+        )
+        logger.info(
+            f"Connected to server {server_id} with tools: {[tool.name for tool in response.tools]}"
+        )
+
+    def _register_tools(
+        self,
+        server_id: str,
+        session: Optional[ClientSession],
+        tools: List[Dict[str, Any]],
+    ) -> None:
+        """Create or update the tool proxies for a server's tools."""
+        for tool in tools:
+            original_name = tool["name"]
             tool_name = f"mcp_{server_id}_{original_name}"
             tool_name = self._sanitize_tool_name(tool_name)
 
+            existing = self.tool_map.get(tool_name)
+            if existing is not None and existing.server_id == server_id:
+                # Keep the object, agents may already hold it (lazy registration)
+                existing.session = session
+                existing.description = tool["description"]
+                existing.parameters = tool["inputSchema"]
+                continue
+
             server_tool = MCPClientTool(
                 name=tool_name,
-                description=tool.description,
-                parameters=tool.inputSchema,
+                description=tool["description"],
+                parameters=tool["inputSchema"],
                 session=session,
                 server_id=server_id,
                 original_name=original_name,
+                clients=self,
             )
             self.tool_map[tool_name] = server_tool
 
         # Update tools tuple
         self.tools = tuple(self.tool_map.values())
-        logger.info(
-            f"Connected to server {server_id} with tools: {[tool.name for tool in response.tools]}"
-        )
+        self._invalidate_cache()
 
     def _sanitize_tool_name(self, name: str) -> str:
         """Sanitize tool name to match MCPClientTool requirements."""
@@ -155,25 +384,29 @@ class MCPClients(ToolCollection):
     async def disconnect(self, server_id: str = "") -> None:
         """Disconnect from a specific MCP server or all servers if no server_id provided."""
         if server_id:
-            if server_id in self.sessions:
+            if (
+                server_id in self.sessions
+                or server_id in self._connections
+                or server_id in self._lazy_servers
+            ):
                 try:
-                    exit_stack = self.exit_stacks.get(server_id)
+                    connection = self._connections.pop(server_id, None)
 
-                    # Close the exit stack which will handle session cleanup
-                    if exit_stack:
+                    # Ask the task holding the connection to close it
+                    if connection:
+                        task, stop = connection
+                        stop.set()
                         try:
-                            await exit_stack.aclose()
-                        except RuntimeError as e:
-                            if "cancel scope" in str(e).lower():
-                                logger.warning(
-                                    f"Cancel scope error during disconnect from {server_id}, continuing with cleanup: {e}"
-                                )
-                            else:
-                                raise
+                            await asyncio.wait_for(task, timeout=10)
+                        except asyncio.TimeoutError:
+                            logger.warning(
+                                f"Timed out closing MCP server {server_id}, cancelling"
+                            )
+                            task.cancel()
 
                     # Clean up references
                     self.sessions.pop(server_id, None)
-                    self.exit_stacks.pop(server_id, None)
+                    self._lazy_servers.pop(server_id, None)
 
                     # Remove tools associated with this server
                     self.tool_map = {
@@ -182,13 +415,18 @@ class MCPClients(ToolCollection):
                         if v.server_id != server_id
                     }
                     self.tools = tuple(self.tool_map.values())
+                    self._invalidate_cache()
                     logger.info(f"Disconnected from MCP server {server_id}")
                 except Exception as e:
                     logger.error(f"Error disconnecting from server {server_id}: {e}")
         else:
-            # Disconnect from all servers in a deterministic order
-            for sid in sorted(list(self.sessions.keys())):
+            # Disconnect from all servers in a deterministic order, including
+            # lazy ones never connected, so a reconnect lists their tools anew
+            for sid in sorted(
+                set(self.sessions) | set(self._connections) | set(self._lazy_servers)
+            ):
                 await self.disconnect(sid)
             self.tool_map = {}
             self.tools = tuple()
+            self._invalidate_cache()
             logger.info("Disconnected from all MCP servers")
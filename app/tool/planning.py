@@ -1,7 +1,10 @@
 # tool/planning.py
 from typing import Dict, List, Literal, Optional
 
+from pydantic import Field
+
 from app.exceptions import ToolError
+from app.plan_store import PlanMapping, PlanStore, get_plan_store
 from app.tool.base import BaseTool, ToolResult
 
 
@@ -11,6 +14,11 @@ The tool provides functionality for creating plans, updating plan steps, and tra
 """
 
 
+def _sequential_dependencies(count: int) -> List[List[int]]:
+    """Dependencies that run steps strictly in order."""
+    return [[i - 1] if i else [] for i in range(count)]
+
+
 class PlanningTool(BaseTool):
     """
     A planning tool that allows the agent to create and manage plans for solving complex tasks.
@@ -61,14 +69,24 @@ class PlanningTool(BaseTool):
                 "description": "Additional notes for a step. Optional for mark_step command.",
                 "type": "string",
             },
+            "step_dependencies": {
+                "description": "For each step, the 0-based indices of the earlier steps it depends on, e.g. [[], [], [0, 1]] when steps 0 and 1 are independent and step 2 needs both. Independent steps can run in parallel. Optional for create and update commands; by default each step depends on the previous one.",
+                "type": "array",
+                "items": {"type": "array", "items": {"type": "integer"}},
+            },
         },
         "required": ["command"],
         "additionalProperties": False,
     }
 
-    plans: dict = {}  # Dictionary to store plans by plan_id
+    store: PlanStore = Field(default_factory=get_plan_store)
     _current_plan_id: Optional[str] = None  # Track the current active plan
 
+    @property
+    def plans(self) -> PlanMapping:
+        """Read-only view of the stored plans by plan_id."""
+        return PlanMapping(self.store)
+
     async def execute(
         self,
         *,
@@ -83,6 +101,7 @@ class PlanningTool(BaseTool):
             Literal["not_started", "in_progress", "completed", "blocked"]
         ] = None,
         step_notes: Optional[str] = None,
+        step_dependencies: Optional[List[List[int]]] = None,
         **kwargs,
     ):
         """
@@ -96,39 +115,46 @@ class PlanningTool(BaseTool):
         - step_index: Index of the step to update (used with mark_step command)
         - step_status: Status to set for a step (used with mark_step command)
         - step_notes: Additional notes for a step (used with mark_step command)
+        - step_dependencies: Indices of the steps each step depends on (used with create and update commands)
         """
 
+        # Run via the store, which may block waiting on other writers
         if command == "create":
-            return self._create_plan(plan_id, title, steps)
+            return await self.store.run(
+                self._create_plan, plan_id, title, steps, step_dependencies
+            )
         elif command == "update":
-            return self._update_plan(plan_id, title, steps)
+            return await self.store.run(
+                self._update_plan, plan_id, title, steps, step_dependencies
+            )
         elif command == "list":
-            return self._list_plans()
+            return await self.store.run(self._list_plans)
         elif command == "get":
-            return self._get_plan(plan_id)
+            return await self.store.run(self._get_plan, plan_id)
         elif command == "set_active":
-            return self._set_active_plan(plan_id)
+            return await self.store.run(self._set_active_plan, plan_id)
         elif command == "mark_step":
-            return self._mark_step(plan_id, step_index, step_status, step_notes)
+            return await self.store.run(
+                self._mark_step, plan_id, step_index, step_status, step_notes
+            )
         elif command == "delete":
-            return self._delete_plan(plan_id)
+            return await self.store.run(self._delete_plan, plan_id)
         else:
             raise ToolError(
                 f"Unrecognized command: {command}. Allowed commands are: create, update, list, get, set_active, mark_step, delete"
             )
 
     def _create_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Create a new plan with the given ID, title, and steps."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: create")
 
-        if plan_id in self.plans:
-            raise ToolError(
-                f"A plan with ID '{plan_id}' already exists. Use 'update' to modify existing plans."
-            )
-
         if not title:
             raise ToolError("Parameter `title` is required for command: create")
 
@@ -148,9 +174,13 @@ class PlanningTool(BaseTool):
             "steps": steps,
             "step_statuses": ["not_started"] * len(steps),
             "step_notes": [""] * len(steps),
+            "step_dependencies": self._validate_dependencies(steps, step_dependencies),
         }
 
-        self.plans[plan_id] = plan
+        if not self.store.create(plan):
+            raise ToolError(
+                f"A plan with ID '{plan_id}' already exists. Use 'update' to modify existing plans."
+            )
         self._current_plan_id = plan_id  # Set as active plan
 
         return ToolResult(
@@ -158,70 +188,78 @@ class PlanningTool(BaseTool):
         )
 
     def _update_plan(
-        self, plan_id: Optional[str], title: Optional[str], steps: Optional[List[str]]
+        self,
+        plan_id: Optional[str],
+        title: Optional[str],
+        steps: Optional[List[str]],
+        step_dependencies: Optional[List[List[int]]] = None,
     ) -> ToolResult:
         """Update an existing plan with new title or steps."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: update")
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
-        plan = self.plans[plan_id]
-
-        if title:
-            plan["title"] = title
+        if steps and (
+            not isinstance(steps, list)
+            or not all(isinstance(step, str) for step in steps)
+        ):
+            raise ToolError(
+                "Parameter `steps` must be a list of strings for command: update"
+            )
 
-        if steps:
-            if not isinstance(steps, list) or not all(
-                isinstance(step, str) for step in steps
-            ):
-                raise ToolError(
-                    "Parameter `steps` must be a list of strings for command: update"
+        def update(plan: Dict) -> None:
+            if title:
+                plan["title"] = title
+
+            if steps:
+                # Preserve existing step statuses for unchanged steps
+                old_steps = plan["steps"]
+                old_statuses = plan["step_statuses"]
+                old_notes = plan["step_notes"]
+
+                # Create new step statuses and notes
+                new_statuses = []
+                new_notes = []
+
+                for i, step in enumerate(steps):
+                    # If the step exists at the same position in old steps, preserve status and notes
+                    if i < len(old_steps) and step == old_steps[i]:
+                        new_statuses.append(old_statuses[i])
+                        new_notes.append(old_notes[i])
+                    else:
+                        new_statuses.append("not_started")
+                        new_notes.append("")
+
+                plan["steps"] = list(steps)
+                plan["step_statuses"] = new_statuses
+                plan["step_notes"] = new_notes
+
+            if steps or step_dependencies is not None:
+                plan["step_dependencies"] = self._validate_dependencies(
+                    plan["steps"], step_dependencies
                 )
 
-            # Preserve existing step statuses for unchanged steps
-            old_steps = plan["steps"]
-            old_statuses = plan["step_statuses"]
-            old_notes = plan["step_notes"]
-
-            # Create new step statuses and notes
-            new_statuses = []
-            new_notes = []
-
-            for i, step in enumerate(steps):
-                # If the step exists at the same position in old steps, preserve status and notes
-                if i < len(old_steps) and step == old_steps[i]:
-                    new_statuses.append(old_statuses[i])
-                    new_notes.append(old_notes[i])
-                else:
-                    new_statuses.append("not_started")
-                    new_notes.append("")
-
-            plan["steps"] = steps
-            plan["step_statuses"] = new_statuses
-            plan["step_notes"] = new_notes
+        plan = self.store.update(plan_id, update)
+        if plan is None:
+            raise ToolError(f"No plan found with ID: {plan_id}")
 
         return ToolResult(
-            output=f"Plan updated successfully: {plan_id}\n\n{self._format_plan(plan)}"
+            output=f"Plan updated successfully: {plan_id}\n\n{self.render_plan(plan)}"
         )
 
     def _list_plans(self) -> ToolResult:
         """List all available plans."""
-        if not self.plans:
+        summaries = self.store.list()
+        if not summaries:
             return ToolResult(
                 output="No plans available. Create a plan with the 'create' command."
             )
 
         output = "Available plans:\n"
-        for plan_id, plan in self.plans.items():
+        for summary in summaries:
+            plan_id = summary["plan_id"]
             current_marker = " (active)" if plan_id == self._current_plan_id else ""
-            completed = sum(
-                1 for status in plan["step_statuses"] if status == "completed"
-            )
-            total = len(plan["steps"])
-            progress = f"{completed}/{total} steps completed"
-            output += f"• {plan_id}{current_marker}: {plan['title']} - {progress}\n"
+            progress = f"{summary['completed']}/{summary['total']} steps completed"
+            output += f"• {plan_id}{current_marker}: {summary['title']} - {progress}\n"
 
         return ToolResult(output=output)
 
@@ -235,23 +273,17 @@ class PlanningTool(BaseTool):
                 )
             plan_id = self._current_plan_id
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
-        plan = self.plans[plan_id]
-        return ToolResult(output=self._format_plan(plan))
+        return ToolResult(output=self.render_plan(self._require_plan(plan_id)))
 
     def _set_active_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Set a plan as the active plan."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: set_active")
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
+        plan = self._require_plan(plan_id)
         self._current_plan_id = plan_id
         return ToolResult(
-            output=f"Plan '{plan_id}' is now the active plan.\n\n{self._format_plan(self.plans[plan_id])}"
+            output=f"Plan '{plan_id}' is now the active plan.\n\n{self.render_plan(plan)}"
         )
 
     def _mark_step(
@@ -270,19 +302,9 @@ class PlanningTool(BaseTool):
                 )
             plan_id = self._current_plan_id
 
-        if plan_id not in self.plans:
-            raise ToolError(f"No plan found with ID: {plan_id}")
-
         if step_index is None:
             raise ToolError("Parameter `step_index` is required for command: mark_step")
 
-        plan = self.plans[plan_id]
-
-        if step_index < 0 or step_index >= len(plan["steps"]):
-            raise ToolError(
-                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(plan['steps'])-1}."
-            )
-
         if step_status and step_status not in [
             "not_started",
             "in_progress",
@@ -293,32 +315,94 @@ class PlanningTool(BaseTool):
                 f"Invalid step_status: {step_status}. Valid statuses are: not_started, in_progress, completed, blocked"
             )
 
-        if step_status:
-            plan["step_statuses"][step_index] = step_status
-
-        if step_notes:
-            plan["step_notes"][step_index] = step_notes
+        try:
+            plan = self.store.mark_step(plan_id, step_index, step_status, step_notes)
+        except IndexError:
+            steps = self._require_plan(plan_id)["steps"]
+            raise ToolError(
+                f"Invalid step_index: {step_index}. Valid indices range from 0 to {len(steps)-1}."
+            )
+        if plan is None:
+            raise ToolError(f"No plan found with ID: {plan_id}")
 
         return ToolResult(
-            output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self._format_plan(plan)}"
+            output=f"Step {step_index} updated in plan '{plan_id}'.\n\n{self.render_plan(plan)}"
         )
 
+    def ready_steps(self, plan_id: str) -> List[int]:
+        """Return the indices of open steps whose dependencies are all completed.
+
+        Open steps are not started or in progress (e.g. interrupted by a restart).
+        """
+        plan = self._require_plan(plan_id)
+        statuses = plan["step_statuses"]
+        return [
+            i
+            for i, dependencies in enumerate(self.dependencies(plan))
+            if statuses[i] in ("not_started", "in_progress")
+            and all(statuses[dep] == "completed" for dep in dependencies)
+        ]
+
+    @staticmethod
+    def _validate_dependencies(
+        steps: List[str], step_dependencies: Optional[List[List[int]]]
+    ) -> List[List[int]]:
+        """Check step dependencies, defaulting to running the steps in order.
+
+        Steps may only depend on earlier steps, so the plan cannot contain a cycle.
+        """
+        if step_dependencies is None:
+            return _sequential_dependencies(len(steps))
+        if len(step_dependencies) != len(steps) or not all(
+            isinstance(dependencies, list) for dependencies in step_dependencies
+        ):
+            raise ToolError(
+                "Parameter `step_dependencies` must have one list of step indices per step"
+            )
+        for i, dependencies in enumerate(step_dependencies):
+            for dep in dependencies:
+                if not isinstance(dep, int) or not 0 <= dep < i:
+                    raise ToolError(
+                        f"Invalid dependency {dep} of step {i}: steps can only depend on earlier steps."
+                    )
+        return [sorted(set(dependencies)) for dependencies in step_dependencies]
+
+    @staticmethod
+    def dependencies(plan: Dict) -> List[List[int]]:
+        """Return a plan's step dependencies; plans saved without them run in order."""
+        dependencies = plan.get("step_dependencies")
+        if dependencies is None or len(dependencies) != len(plan["steps"]):
+            return _sequential_dependencies(len(plan["steps"]))
+        return dependencies
+
     def _delete_plan(self, plan_id: Optional[str]) -> ToolResult:
         """Delete a plan."""
         if not plan_id:
             raise ToolError("Parameter `plan_id` is required for command: delete")
 
-        if plan_id not in self.plans:
+        if not self.store.delete(plan_id):
             raise ToolError(f"No plan found with ID: {plan_id}")
 
-        del self.plans[plan_id]
-
         # If the deleted plan was the active plan, clear the active plan
         if self._current_plan_id == plan_id:
             self._current_plan_id = None
 
         return ToolResult(output=f"Plan '{plan_id}' has been deleted.")
 
+    def _require_plan(self, plan_id: str) -> Dict:
+        plan = self.store.get(plan_id)
+        if plan is None:
+            raise ToolError(f"No plan found with ID: {plan_id}")
+        return plan
+
+    async def get_plan(self, plan_id: str) -> Optional[Dict]:
+        """Return a copy of the plan, or None, without blocking the event loop."""
+        return await self.store.run(self.store.get, plan_id)
+
+    def render_plan(self, plan: Dict) -> str:
+        """Format a stored plan, reusing the text while the plan is unchanged."""
+        return self.store.render(plan, self._format_plan)
+
     def _format_plan(self, plan: Dict) -> str:
         """Format a plan for display."""
         output = f"Plan: {plan['title']} (ID: {plan['plan_id']})\n"
@@ -345,9 +429,15 @@ class PlanningTool(BaseTool):
         output += f"Status: {completed} completed, {in_progress} in progress, {blocked} blocked, {not_started} not started\n\n"
         output += "Steps:\n"
 
-        # Add each step with its status and notes
-        for i, (step, status, notes) in enumerate(
-            zip(plan["steps"], plan["step_statuses"], plan["step_notes"])
+        # Add each step with its status, notes and any non-sequential dependencies
+        sequential = _sequential_dependencies(total_steps)
+        for i, (step, status, notes, dependencies) in enumerate(
+            zip(
+                plan["steps"],
+                plan["step_statuses"],
+                plan["step_notes"],
+                self.dependencies(plan),
+            )
         ):
             status_symbol = {
                 "not_started": "[ ]",
@@ -357,6 +447,9 @@ class PlanningTool(BaseTool):
             }.get(status, "[ ]")
 
             output += f"{i}. {status_symbol} {step}\n"
+            if dependencies != sequential[i]:
+                depends_on = ", ".join(str(dep) for dep in dependencies) or "none"
+                output += f"   Depends on: {depends_on}\n"
             if notes:
                 output += f"   Notes: {notes}\n"
 
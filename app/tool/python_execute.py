@@ -1,8 +1,11 @@
+import asyncio
 import multiprocessing
+import os
 import sys
-from io import StringIO
+import tempfile
 from typing import Dict
 
+from app.output_store import CHUNK_SIZE, OutputWriter, output_store
 from app.tool.base import BaseTool
 
 
@@ -22,13 +25,15 @@ class PythonExecute(BaseTool):
         "required": ["code"],
     }
 
-    def _run_code(self, code: str, result_dict: dict, safe_globals: dict) -> None:
+    def _run_code(
+        self, code: str, result_dict: dict, safe_globals: dict, output_path: str
+    ) -> None:
         original_stdout = sys.stdout
         try:
-            output_buffer = StringIO()
-            sys.stdout = output_buffer
-            exec(code, safe_globals, safe_globals)
-            result_dict["observation"] = output_buffer.getvalue()
+            # Printed output goes to a file, so large outputs are never held in memory
+            with open(output_path, "w", encoding="utf-8", errors="replace") as output:
+                sys.stdout = output
+                exec(code, safe_globals, safe_globals)
             result_dict["success"] = True
         except Exception as e:
             result_dict["observation"] = str(e)
@@ -36,6 +41,18 @@ class PythonExecute(BaseTool):
         finally:
             sys.stdout = original_stdout
 
+    @staticmethod
+    def _read_output(output_path: str, writer: OutputWriter) -> str:
+        """Pass the printed output through the writer, folding it if it is large."""
+        try:
+            with open(output_path, encoding="utf-8", newline="") as output:
+                while chunk := output.read(CHUNK_SIZE):
+                    writer.write(chunk)
+        except BaseException:
+            writer.discard()
+            raise
+        return writer.close()
+
     async def execute(
         self,
         code: str,
@@ -52,24 +69,35 @@ class PythonExecute(BaseTool):
             Dict: Contains 'output' with execution output or error message and 'success' status.
         """
 
-        with multiprocessing.Manager() as manager:
-            result = manager.dict({"observation": "", "success": False})
-            if isinstance(__builtins__, dict):
-                safe_globals = {"__builtins__": __builtins__}
-            else:
-                safe_globals = {"__builtins__": __builtins__.__dict__.copy()}
-            proc = multiprocessing.Process(
-                target=self._run_code, args=(code, result, safe_globals)
-            )
-            proc.start()
-            proc.join(timeout)
+        fd, output_path = tempfile.mkstemp(suffix=".out")
+        os.close(fd)
+        try:
+            with multiprocessing.Manager() as manager:
+                result = manager.dict({"observation": "", "success": False})
+                if isinstance(__builtins__, dict):
+                    safe_globals = {"__builtins__": __builtins__}
+                else:
+                    safe_globals = {"__builtins__": __builtins__.__dict__.copy()}
+                proc = multiprocessing.Process(
+                    target=self._run_code,
+                    args=(code, result, safe_globals, output_path),
+                )
+                proc.start()
+                await asyncio.to_thread(proc.join, timeout)
 
-            # timeout process
-            if proc.is_alive():
-                proc.terminate()
-                proc.join(1)
-                return {
-                    "observation": f"Execution timeout after {timeout} seconds",
-                    "success": False,
-                }
-            return dict(result)
+                # timeout process
+                if proc.is_alive():
+                    proc.terminate()
+                    await asyncio.to_thread(proc.join, 1)
+                    return {
+                        "observation": f"Execution timeout after {timeout} seconds",
+                        "success": False,
+                    }
+                result = dict(result)
+            if result["success"]:
+                result["observation"] = await asyncio.to_thread(
+                    self._read_output, output_path, output_store.writer(name=self.name)
+                )
+            return result
+        finally:
+            os.unlink(output_path)
@@ -0,0 +1,56 @@
+import asyncio
+
+from app.output_store import output_store
+from app.tool.base import BaseTool, ToolResult
+
+
+_READ_OUTPUT_DESCRIPTION = """Read part of a large tool output that was shortened in an observation.
+* Shortened observations show their head and tail and an `output_id`
+* Returns `num_lines` lines starting at `start_line` (1-based), with the total line count
+"""
+
+
+class ReadOutput(BaseTool):
+    name: str = "read_output"
+    description: str = _READ_OUTPUT_DESCRIPTION
+    parameters: dict = {
+        "type": "object",
+        "properties": {
+            "output_id": {
+                "type": "string",
+                "description": "The output_id given in the shortened observation.",
+            },
+            "start_line": {
+                "type": "integer",
+                "description": "First line to read, starting at 1.",
+                "default": 1,
+            },
+            "num_lines": {
+                "type": "integer",
+                "description": "Number of lines to read (at most 500).",
+                "default": 200,
+            },
+        },
+        "required": ["output_id"],
+    }
+    concurrency_safe: bool = True
+
+    async def execute(
+        self, output_id: str, start_line: int = 1, num_lines: int = 200
+    ) -> ToolResult:
+        start_line = max(1, start_line)
+        num_lines = min(max(1, num_lines), 500)
+        try:
+            lines, total = await asyncio.to_thread(
+                output_store.read, output_id, start_line, num_lines
+            )
+        except FileNotFoundError as e:
+            return ToolResult(error=str(e))
+        if not lines:
+            return ToolResult(
+                error=f"start_line {start_line} is past the end ({total} lines)"
+            )
+        end_line = start_line + len(lines) - 1
+        return ToolResult(
+            output=f"Lines {start_line}-{end_line} of {total}:\n{''.join(lines)}"
+        )
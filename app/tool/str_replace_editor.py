@@ -102,6 +102,10 @@ class StrReplaceEditor(BaseTool):
     _local_operator: LocalFileOperator = LocalFileOperator()
     _sandbox_operator: SandboxFileOperator = SandboxFileOperator()
 
+    def is_concurrency_safe(self, **kwargs) -> bool:
+        """Only `view` is read-only; edits must run in order."""
+        return kwargs.get("command") == "view"
+
     # def _get_operator(self, use_sandbox: bool) -> FileOperator:
     def _get_operator(self) -> FileOperator:
         """Get the appropriate file operator based on execution mode."""
@@ -1,9 +1,11 @@
 """Collection classes for managing multiple tools."""
-from typing import Any, Dict, List
+import json
+from typing import Any, Callable, Dict, List, Optional
 
 from app.exceptions import ToolError
 from app.logger import logger
 from app.tool.base import BaseTool, ToolFailure, ToolResult
+from app.tracing import tracer
 
 
 class ToolCollection:
@@ -15,12 +17,44 @@ class ToolCollection:
     def __init__(self, *tools: BaseTool):
         self.tools = tools
         self.tool_map = {tool.name: tool for tool in tools}
+        self._invalidate_cache()
 
     def __iter__(self):
         return iter(self.tools)
 
+    def _invalidate_cache(self) -> None:
+        """Drop the cached params, JSON and token counts.
+
+        Must be called whenever ``self.tools`` changes (add_tool/add_tools, MCP reconnect).
+        """
+        self._params_cache: Optional[List[Dict[str, Any]]] = None
+        self._json_cache: Optional[str] = None
+        self._tokens_cache: Dict[Callable[[str], int], int] = {}
+
     def to_params(self) -> List[Dict[str, Any]]:
-        return [tool.to_param() for tool in self.tools]
+        """Return the tools in function calling format.
+
+        The list is built once and shared between calls, so callers must not mutate it.
+        """
+        if self._params_cache is None:
+            self._params_cache = [tool.to_param() for tool in self.tools]
+        return self._params_cache
+
+    def to_json(self) -> str:
+        """Return the JSON serialization of to_params(), as sent to the LLM."""
+        if self._json_cache is None:
+            self._json_cache = json.dumps(self.to_params(), ensure_ascii=False)
+        return self._json_cache
+
+    def count_tokens(self, token_counter: Callable[[str], int]) -> int:
+        """Return the token cost of the serialized tool schemas.
+
+        Args:
+            token_counter: Function counting tokens in a string, e.g. LLM.count_tokens
+        """
+        if token_counter not in self._tokens_cache:
+            self._tokens_cache[token_counter] = token_counter(self.to_json())
+        return self._tokens_cache[token_counter]
 
     async def execute(
         self, *, name: str, tool_input: Dict[str, Any] = None
@@ -28,11 +62,18 @@ class ToolCollection:
         tool = self.tool_map.get(name)
         if not tool:
             return ToolFailure(error=f"Tool {name} is invalid")
-        try:
-            result = await tool(**tool_input)
+        with tracer.span("tool.execute", category="tool", tool=name) as span:
+            try:
+                result = await tool(**tool_input)
+            except ToolError as e:
+                result = ToolFailure(error=e.message)
+            if isinstance(result, ToolResult):
+                span.set(
+                    output_bytes=len(str(result.output or "")),
+                    image=bool(result.base64_image),
+                    error=bool(result.error),
+                )
             return result
-        except ToolError as e:
-            return ToolFailure(error=e.message)
 
     async def execute_all(self) -> List[ToolResult]:
         """Execute all tools in the collection sequentially."""
@@ -59,6 +100,7 @@ class ToolCollection:
 
         self.tools += (tool,)
         self.tool_map[tool.name] = tool
+        self._invalidate_cache()
         return self
 
     def add_tools(self, *tools: BaseTool):
@@ -0,0 +1,320 @@
+"""Span tracing for agent runs.
+
+Spans are recorded around agent steps, LLM requests, tool calls, sandbox
+commands and browser actions, and exported as Chrome trace JSON (open it in
+chrome://tracing or https://ui.perfetto.dev) and/or OTLP JSON lines that
+OpenTelemetry tooling can ingest. When tracing is disabled ``tracer.span``
+returns a shared no-op span, so instrumented code pays one attribute check.
+"""
+
+import asyncio
+import functools
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.config import PROJECT_ROOT, TracingSettings, config
+from app.logger import logger
+
+
+DEFAULT_TRACE_DIR = PROJECT_ROOT / "logs" / "traces"
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled; every operation does nothing."""
+
+    __slots__ = ()
+
+    def set(self, **attributes: Any) -> "_NoopSpan":
+        return self
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    """A timed operation with attributes, nested under the current span."""
+
+    __slots__ = (
+        "tracer",
+        "name",
+        "category",
+        "attributes",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "track",
+        "start_ns",
+        "end_ns",
+        "error",
+        "_token",
+    )
+
+    def __init__(
+        self, tracer: "Tracer", name: str, category: str, attributes: Dict[str, Any]
+    ):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.attributes = attributes
+        self.parent_id: Optional[str] = None
+        self.error: Optional[str] = None
+        self.end_ns = 0
+
+    def set(self, **attributes: Any) -> "Span":
+        """Add attributes such as token counts, sizes or names."""
+        self.attributes.update(attributes)
+        return self
+
+    def __enter__(self) -> "Span":
+        parent = _current_span.get()
+        if parent is not None:
+            self.parent_id = parent.span_id
+            self.trace_id = parent.trace_id
+        else:
+            self.trace_id = self.tracer.trace_id
+        self.span_id = os.urandom(8).hex()
+        self.track = self.tracer._track()
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        self.tracer._finish(self)
+        return False
+
+
+class Tracer:
+    """Collects spans in memory and exports them at the end of a run."""
+
+    def __init__(self, max_spans: int = 100_000):
+        self.enabled = False
+        self.output_dir = DEFAULT_TRACE_DIR
+        self.formats = ["chrome"]
+        self.max_spans = max_spans
+        self.trace_id = os.urandom(16).hex()
+        self._spans: List[Span] = []
+        self._dropped = 0
+        # Task (or thread) id -> (track, label); cleared on export, as ids get reused
+        self._tracks: Dict[int, tuple] = {}
+        self._next_track = 1
+        self._lock = threading.Lock()
+        # perf_counter_ns is monotonic but has an arbitrary origin
+        self._epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+
+    def configure(self, settings: Optional[TracingSettings]) -> None:
+        if settings is None:
+            return
+        if settings.output_dir:
+            output_dir = Path(settings.output_dir)
+            # Relative paths are relative to the project, not the working directory
+            self.output_dir = (
+                output_dir if output_dir.is_absolute() else PROJECT_ROOT / output_dir
+            )
+        self.formats = list(settings.formats)
+        self.enabled = settings.enabled
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def span(self, name: str, category: str = "app", **attributes: Any):
+        """Return a context manager timing one operation.
+
+        Usage::
+
+            with tracer.span("tool.execute", category="tool", tool=name) as span:
+                result = await tool(**args)
+                span.set(output_bytes=len(str(result)))
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, category, attributes)
+
+    def current(self):
+        """Return the innermost open span, or the no-op span."""
+        if not self.enabled:
+            return NOOP_SPAN
+        return _current_span.get() or NOOP_SPAN
+
+    def traced(self, name: Optional[str] = None, category: str = "app"):
+        """Decorator wrapping an async function in a span."""
+
+        def decorator(func):
+            span_name = name or func.__qualname__
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await func(*args, **kwargs)
+                with Span(self, span_name, category, {}):
+                    return await func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _track(self) -> int:
+        """Return a small id for the running task (or thread) to lay spans out on."""
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        key = id(task) if task is not None else threading.get_ident()
+        track = self._tracks.get(key)
+        if track is None:
+            label = task.get_name() if task is not None else "thread"
+            with self._lock:
+                track = self._tracks[key] = (self._next_track, label)
+                self._next_track += 1
+        return track[0]
+
+    def _finish(self, span: Span) -> None:
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self._dropped += 1
+                return
+            self._spans.append(span)
+
+    def _drain(self) -> Tuple[List[Span], Dict[int, tuple]]:
+        """Take the recorded spans and the tracks they were laid out on."""
+        with self._lock:
+            spans, self._spans = self._spans, []
+            tracks, self._tracks = self._tracks, {}
+            if self._dropped:
+                logger.warning(
+                    f"Trace buffer full, {self._dropped} spans were not recorded"
+                )
+                self._dropped = 0
+        return spans, tracks
+
+    def _chrome_trace(
+        self, spans: List[Span], tracks: Dict[int, tuple]
+    ) -> Dict[str, Any]:
+        pid = os.getpid()
+        events: List[Dict[str, Any]] = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": track,
+                "args": {"name": label},
+            }
+            for track, label in tracks.values()
+        ]
+        for span in spans:
+            args = dict(span.attributes)
+            if span.error:
+                args["error"] = span.error
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.category,
+                    "ph": "X",
+                    "ts": (span.start_ns + self._epoch_offset_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": span.track,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    @staticmethod
+    def _otel_value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def _otel_trace(self, spans: List[Span]) -> Dict[str, Any]:
+        otel_spans = []
+        for span in spans:
+            attributes = {"category": span.category, **span.attributes}
+            otel_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns + self._epoch_offset_ns),
+                "endTimeUnixNano": str(span.end_ns + self._epoch_offset_ns),
+                "attributes": [
+                    {"key": key, "value": self._otel_value(value)}
+                    for key, value in attributes.items()
+                ],
+                "status": (
+                    {"code": 2, "message": span.error} if span.error else {"code": 1}
+                ),
+            }
+            if span.parent_id:
+                otel_span["parentSpanId"] = span.parent_id
+            otel_spans.append(otel_span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            {
+                                "key": "service.name",
+                                "value": {"stringValue": "openmanus"},
+                            }
+                        ]
+                    },
+                    "scopeSpans": [
+                        {"scope": {"name": "app.tracing"}, "spans": otel_spans}
+                    ],
+                }
+            ]
+        }
+
+    def export(self, name: str = "run") -> List[Path]:
+        """Write the recorded spans to the configured formats and clear them.
+
+        Returns:
+            Paths of the written files (empty if tracing is disabled)
+        """
+        if not self.enabled:
+            return []
+        spans, tracks = self._drain()
+        if not spans:
+            return []
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = self.output_dir / f"{name}_{time.strftime('%Y%m%d%H%M%S')}"
+        written = []
+        if "chrome" in self.formats:
+            path = stem.with_suffix(".trace.json")
+            path.write_text(
+                json.dumps(self._chrome_trace(spans, tracks), default=str),
+                encoding="utf-8",
+            )
+            written.append(path)
+        if "otel" in self.formats:
+            path = stem.with_suffix(".otel.jsonl")
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(self._otel_trace(spans), default=str) + "\n")
+            written.append(path)
+        for path in written:
+            logger.info(f"Wrote {len(spans)} trace spans to {path}")
+        return written
+
+
+tracer = Tracer()
+tracer.configure(config.tracing)
@@ -5,6 +5,7 @@ from typing import Optional, Dict, Any, List
 from concurrent.futures import ThreadPoolExecutor
 
 from app.agent.manus import Manus
+from app.llm import LLMClientRegistry, RequestPriority, request_priority
 from app.logger import logger
 from app.schema import Message
 from app.web.server import socketio, current_file, message_history
@@ -157,8 +158,9 @@ class WebManus:
                 "current_tool": None
             }
 
-            # 运行代理
-            await self.agent.run(user_message)
+            # 运行代理（交互式会话优先于批处理流程）
+            with request_priority(RequestPriority.INTERACTIVE):
+                await self.agent.run(user_message)
 
             # 发送任务完成通知
             self._send_task_complete()
@@ -183,6 +185,9 @@ class WebManus:
             # 运行任务并等待完成
             loop.run_until_complete(self._process_message(message))
 
+            # 关闭绑定在该事件循环上的LLM连接池
+            loop.run_until_complete(LLMClientRegistry.aclose())
+
             # 关闭循环
             loop.close()
         except Exception as e:
@@ -0,0 +1,115 @@
+"""Cold-start import time benchmark.
+
+Imports each target module in a fresh interpreter (so nothing is cached in
+sys.modules) several times and reports the median wall time and the
+packages that take longest to import, from ``python -X importtime``. With --budget the
+run fails when a target exceeds its budget, which catches cold-start
+regressions for short-lived worker processes in CI.
+
+Usage:
+    python -m examples.benchmarks.import_time
+    python -m examples.benchmarks.import_time --repeat 7 --budget app.agent.swe=1.5
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+
+DEFAULT_TARGETS = [
+    "app.tool",
+    "app.agent",
+    "app.agent.swe",
+    "app.agent.manus",
+    "app.mcp.server",
+]
+
+
+def time_import(module: str) -> float:
+    """Return seconds taken to import module in a new interpreter."""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - start)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(module: str, top: int) -> List[Tuple[str, float]]:
+    """Return the top-level packages that spend the most time being imported."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    totals: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        # "import time: self [us] | cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, _, name = line[len("import time:") :].split("|")
+        package = name.strip().split(".")[0]
+        totals[package] = totals.get(package, 0.0) + int(self_us) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:top]
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    budgets = {}
+    for value in values:
+        module, _, seconds = value.partition("=")
+        budgets[module] = float(seconds)
+    return budgets
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules", nargs="*", default=DEFAULT_TARGETS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=5, help="Slowest imports shown")
+    parser.add_argument(
+        "--budget",
+        action="append",
+        default=[],
+        metavar="MODULE=SECONDS",
+        help="Fail if the median import time of MODULE exceeds SECONDS",
+    )
+    args = parser.parse_args()
+    budgets = parse_budgets(args.budget)
+
+    failed = False
+    started = time.perf_counter()
+    for module in args.modules:
+        samples = [time_import(module) for _ in range(args.repeat)]
+        median = statistics.median(samples)
+        budget = budgets.get(module)
+        status = ""
+        if budget is not None:
+            over = median > budget
+            failed |= over
+            status = f"  {'OVER' if over else 'ok'} (budget {budget:.2f}s)"
+        print(
+            f"{module:<24} median {median:.3f}s  "
+            f"min {min(samples):.3f}s  max {max(samples):.3f}s{status}"
+        )
+        for name, seconds in slowest_imports(module, args.top):
+            print(f"    {seconds:7.3f}s  {name}")
+    print(f"Finished in {time.perf_counter() - started:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
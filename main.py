@@ -2,7 +2,9 @@ import argparse
 import asyncio
 
 from app.agent.manus import Manus
+from app.checkpoint import RunJournal
 from app.logger import logger
+from app.tracing import tracer
 
 
 async def main():
@@ -11,25 +13,67 @@ async def main():
     parser.add_argument(
         "--prompt", type=str, required=False, help="Input prompt for the agent"
     )
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Journal every step so the run can be resumed with --resume",
+    )
+    parser.add_argument(
+        "--resume", type=str, metavar="RUN_ID", help="Resume a checkpointed run"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a span trace of the run (see [tracing] in the config)",
+    )
     args = parser.parse_args()
+    if args.trace:
+        tracer.enable()
 
     # Create and initialize Manus agent
     agent = await Manus.create()
+    journal = None
     try:
-        # Use command line prompt if provided, otherwise ask for input
-        prompt = args.prompt if args.prompt else input("Enter your prompt: ")
-        if not prompt.strip():
-            logger.warning("Empty prompt provided.")
-            return
+        if args.resume:
+            # Rebuild memory and step counter from the run journal
+            try:
+                journal = RunJournal.open(args.resume)
+            except FileNotFoundError as e:
+                logger.error(str(e))
+                return
+            state = journal.load()
+            if state.kind != "agent":
+                logger.error(f"Run {args.resume} is a {state.kind} run.")
+                return
+            if state.finished:
+                logger.warning(f"Run {args.resume} already finished.")
+                return
+            if not journal.restore_agent(agent, state):
+                logger.warning(f"Run {args.resume} has no state for {agent.name}.")
+                return
+            journal.resumed()
+            logger.warning(f"Resuming run {args.resume} at step {agent.current_step}")
+            prompt = None
+        else:
+            # Use command line prompt if provided, otherwise ask for input
+            prompt = args.prompt if args.prompt else input("Enter your prompt: ")
+            if not prompt.strip():
+                logger.warning("Empty prompt provided.")
+                return
+            if args.checkpoint:
+                journal = agent.journal = RunJournal.create("agent", prompt)
 
         logger.warning("Processing your request...")
         await agent.run(prompt)
+        if journal:
+            journal.finish()
         logger.info("Request processing completed.")
     except KeyboardInterrupt:
         logger.warning("Operation interrupted.")
     finally:
         # Ensure agent resources are cleaned up before exiting
         await agent.cleanup()
+        tracer.export("manus")
 
 
 if __name__ == "__main__":
@@ -1,31 +1,77 @@
+import argparse
 import asyncio
 import time
 
 from app.agent.data_analysis import DataAnalysis
 from app.agent.manus import Manus
+from app.checkpoint import RunJournal
 from app.config import config
 from app.flow.flow_factory import FlowFactory, FlowType
 from app.logger import logger
+from app.tracing import tracer
 
 
 async def run_flow():
+    parser = argparse.ArgumentParser(description="Run the planning flow")
+    parser.add_argument(
+        "--checkpoint",
+        action="store_true",
+        help="Journal plan state and agent steps so the run can be resumed with --resume",
+    )
+    parser.add_argument(
+        "--resume", type=str, metavar="RUN_ID", help="Resume a checkpointed run"
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Record a span trace of the run (see [tracing] in the config)",
+    )
+    args = parser.parse_args()
+    if args.trace:
+        tracer.enable()
+
     agents = {
         "manus": Manus(),
     }
     if config.run_flow_config.use_data_analysis_agent:
         agents["data_analysis"] = DataAnalysis()
     try:
-        prompt = input("Enter your prompt: ")
+        journal = None
+        if args.resume:
+            try:
+                journal = RunJournal.open(args.resume)
+            except FileNotFoundError as e:
+                logger.error(str(e))
+                return
+            state = journal.load()
+            if state.kind != "flow":
+                logger.error(f"Run {args.resume} is a {state.kind} run.")
+                return
+            if state.finished:
+                logger.warning(f"Run {args.resume} already finished.")
+                return
+            prompt = ""
+        else:
+            prompt = input("Enter your prompt: ")
 
-        if prompt.strip().isspace() or not prompt:
-            logger.warning("Empty prompt provided.")
-            return
+            if prompt.strip().isspace() or not prompt:
+                logger.warning("Empty prompt provided.")
+                return
+            if args.checkpoint:
+                journal = RunJournal.create("flow", prompt)
 
         flow = FlowFactory.create_flow(
             flow_type=FlowType.PLANNING,
             agents=agents,
+            journal=journal,
         )
-        logger.warning("Processing your request...")
+        if args.resume:
+            # Rebuild plans and agent memories; the flow continues at the first open step
+            journal.restore_flow(flow, state)
+            journal.resumed()
+            logger.warning(f"Resuming run {args.resume}...")
+        else:
+            logger.warning("Processing your request...")
 
         try:
             start_time = time.time()
@@ -36,6 +82,8 @@ async def run_flow():
             elapsed_time = time.time() - start_time
             logger.info(f"Request processed in {elapsed_time:.2f} seconds")
             logger.info(result)
+            if journal:
+                journal.finish()
         except asyncio.TimeoutError:
             logger.error("Request processing timed out after 1 hour")
             logger.info(
@@ -46,6 +94,8 @@ async def run_flow():
         logger.info("Operation cancelled by user.")
     except Exception as e:
         logger.error(f"Error: {str(e)}")
+    finally:
+        tracer.export("flow")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+from app.agent.toolcall import ToolCallAgent
+from app.schema import ToolCall
+from app.tool import ToolCollection
+from app.tool.base import BaseTool
+
+
+class RecordingTool(BaseTool):
+    """Sleeps briefly and records when each call starts and ends."""
+
+    name: str = "read"
+    description: str = "A read-only stub tool."
+    parameters: dict = {"type": "object", "properties": {"label": {"type": "string"}}}
+    concurrency_safe: bool = True
+    events: list = []
+    running: int = 0
+    max_running: int = 0
+    delay: float = 0.02
+
+    async def execute(self, label: str) -> str:
+        self.events.append(("start", label))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.running -= 1
+        self.events.append(("end", label))
+        return label
+
+
+def call(tool: BaseTool, label: str) -> ToolCall:
+    return ToolCall(
+        id=f"call_{label}",
+        function={"name": tool.name, "arguments": json.dumps({"label": label})},
+    )
+
+
+@pytest.fixture
+def tools():
+    safe = RecordingTool()
+    unsafe = RecordingTool(name="write", concurrency_safe=False)
+    # Both tools share one event log
+    unsafe.events = safe.events
+    return safe, unsafe
+
+
+@pytest.fixture
+def agent(offline_tokenizer, tools):
+    return ToolCallAgent(available_tools=ToolCollection(*tools), max_parallel_tools=2)
+
+
+@pytest.mark.asyncio
+async def test_safe_calls_run_in_bounded_batches_and_unsafe_calls_in_order(
+    agent, tools
+):
+    safe, unsafe = tools
+    commands = [
+        call(safe, "a"),
+        call(safe, "b"),
+        call(safe, "c"),
+        call(unsafe, "d"),
+        call(safe, "e"),
+    ]
+
+    outcomes = await agent._run_tool_calls(commands)
+
+    assert [result.split()[-1] for result, _ in outcomes] == list("abcde")
+    # a, b and c overlap, but never more than max_parallel_tools at once
+    assert safe.max_running == 2
+    events = safe.events
+    assert events.index(("start", "b")) < events.index(("end", "a"))
+    # The unsafe call waits for the batch before it and runs alone
+    assert events.index(("start", "d")) > max(
+        events.index(("end", label)) for label in "abc"
+    )
+    assert events.index(("start", "e")) > events.index(("end", "d"))
+    assert unsafe.max_running == 1
+
+
+@pytest.mark.asyncio
+async def test_early_dispatched_call_is_reused_not_rerun(agent, tools):
+    safe, unsafe = tools
+    commands = [call(safe, "a"), call(unsafe, "b"), call(safe, "c")]
+
+    # As the response streams, each call is offered once its arguments are complete
+    for command in commands:
+        agent._dispatch_tool_call(command)
+    assert list(agent._dispatched_tools) == ["call_a"]
+    await asyncio.sleep(0)
+    assert safe.events == [("start", "a")]
+
+    outcomes = await agent._run_tool_calls(commands)
+
+    assert [result.split()[-1] for result, _ in outcomes] == list("abc")
+    assert [label for kind, label in safe.events if kind == "start"] == list("abc")
+    assert agent._dispatched_tools == {}
+
+
+@pytest.mark.asyncio
+async def test_uncollected_dispatched_calls_are_cancelled(agent, tools):
+    safe, _ = tools
+    safe.delay = 10
+    agent._dispatch_tool_call(call(safe, "a"))
+    task = agent._dispatched_tools["call_a"]
+    await asyncio.sleep(0)
+
+    agent._cancel_dispatched_tools()
+
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    assert agent._dispatched_tools == {}
+    assert safe.events == [("start", "a")]
+    assert safe.running == 0
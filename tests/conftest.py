@@ -0,0 +1,20 @@
+import pytest
+import tiktoken
+
+
+class WhitespaceEncoding:
+    """Offline stand-in for a tiktoken encoding: one token per word."""
+
+    name = "whitespace"
+
+    def encode(self, text: str):
+        return text.split()
+
+
+@pytest.fixture
+def offline_tokenizer(monkeypatch):
+    """Let LLM instances be built without downloading tiktoken encodings."""
+    monkeypatch.setattr(
+        tiktoken, "encoding_for_model", lambda model: WhitespaceEncoding()
+    )
+    monkeypatch.setattr(tiktoken, "get_encoding", lambda name: WhitespaceEncoding())
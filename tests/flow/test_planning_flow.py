@@ -0,0 +1,206 @@
+import asyncio
+import threading
+from typing import ClassVar
+
+import pytest
+
+from app.agent.base import BaseAgent
+from app.checkpoint import RunJournal
+from app.flow.planning import PlanningFlow
+from app.plan_store import SQLitePlanStore
+from app.sandbox.client import SANDBOX_CLIENT
+from app.schema import AgentState, Memory, Message
+from app.tool.planning import PlanningTool
+
+
+class RecordingAgent(BaseAgent):
+    """Finishes each step in one turn and records the prompts it was given."""
+
+    name: str = "recorder"
+    prompts: list = []
+
+    async def step(self) -> str:
+        prompt = self.memory.messages[-1].content
+        self.prompts.append(prompt)
+        step = prompt.split("working on step ")[1].split(":")[0]
+        self.memory.add_message(Message.assistant_message(f"finished step {step}"))
+        self.state = AgentState.FINISHED
+        return "done"
+
+
+async def no_summary():
+    return ""
+
+
+def make_flow(**data) -> PlanningFlow:
+    flow = PlanningFlow(
+        RecordingAgent(), max_parallel_steps=1, step_memory="scoped", **data
+    )
+    flow._finalize_plan = no_summary
+    return flow
+
+
+@pytest.mark.asyncio
+async def test_scoped_flow_resumes_from_journal(offline_tokenizer, tmp_path):
+    journal = RunJournal.create("flow", "request", tmp_path)
+    flow = make_flow(journal=journal)
+    await flow.planning_tool.execute(
+        command="create",
+        plan_id=flow.active_plan_id,
+        title="Resume",
+        steps=["a", "b", "c", "d"],
+    )
+    await flow.execute("")
+
+    state = RunJournal.open(journal.run_id, tmp_path).load()
+    assert state.step_summaries == {i: f"finished step {i}" for i in range(4)}
+
+    # Resume as if the run had stopped before steps 2 and 3
+    plan = state.plans[state.active_plan_id]
+    plan["step_statuses"][2:] = ["not_started", "not_started"]
+    for i in (2, 3):
+        del state.step_summaries[i]
+    resumed = make_flow()
+    journal.restore_flow(resumed, state)
+    agent = resumed.primary_agent
+    agent.prompts = []
+
+    await resumed.execute("")
+
+    assert len(agent.prompts) == 2
+    assert "Step 0: finished step 0\nStep 1: finished step 1\n" in agent.prompts[0]
+    assert "Step 2: finished step 2\n" in agent.prompts[1]
+    assert sorted(resumed.step_summaries) == [0, 1, 2, 3]
+
+
+class SlowAgent(RecordingAgent):
+    """A step that takes a while, to overlap with parallel steps."""
+
+    name: str = "slow"
+    running: ClassVar[int] = 0
+
+    async def step(self) -> str:
+        SlowAgent.running += 1
+        await asyncio.sleep(0.05)
+        SlowAgent.running -= 1
+        return await super().step()
+
+
+@pytest.mark.asyncio
+async def test_parallel_steps_share_sandbox_and_journal(
+    offline_tokenizer, tmp_path, monkeypatch
+):
+    cleanups = []
+
+    async def cleanup():
+        cleanups.append(SlowAgent.running)
+
+    monkeypatch.setattr(SANDBOX_CLIENT, "cleanup", cleanup)
+    journal = RunJournal.create("flow", "request", tmp_path)
+    flow = PlanningFlow(SlowAgent(), max_parallel_steps=2, journal=journal)
+    flow._finalize_plan = no_summary
+    await flow.planning_tool.execute(
+        command="create",
+        plan_id=flow.active_plan_id,
+        title="Parallel",
+        steps=["a", "b", "c"],
+        step_dependencies=[[], [], [0, 1]],
+    )
+
+    await flow.execute("")
+
+    # Never torn down while a sibling step was still running
+    assert cleanups and all(running == 0 for running in cleanups)
+    state = journal.load()
+    assert set(state.agents) == {"default", "default/1"}
+    assert sum(len(c.messages) for c in state.agents.values()) == 6
+
+
+@pytest.mark.asyncio
+async def test_full_plan_is_resent_once_trimmed_from_memory(offline_tokenizer):
+    agent = RecordingAgent(memory=Memory(max_messages=4))
+    agent.compactor = None
+    flow = PlanningFlow(agent, max_parallel_steps=1, step_memory="shared")
+    flow._finalize_plan = no_summary
+    await flow.planning_tool.execute(
+        command="create",
+        plan_id=flow.active_plan_id,
+        title="Delta",
+        steps=["a", "b", "c", "d"],
+    )
+
+    await flow.execute("")
+
+    # Each step adds two messages; the first prompt is trimmed before step 3
+    kinds = [
+        "delta" if "PLAN CHANGES SINCE YOUR LAST STEP" in prompt else "full"
+        for prompt in agent.prompts
+    ]
+    assert kinds == ["full", "delta", "delta", "full"]
+
+
+class HangingAgent(RecordingAgent):
+    """A step that only ends when cancelled; cleanup records whether it unwound."""
+
+    name: str = "hanging"
+    unwound: bool = False
+    cleaned_up_after_unwind: ClassVar[list] = []
+
+    async def step(self) -> str:
+        try:
+            await asyncio.sleep(60)
+        finally:
+            await asyncio.sleep(0)
+            self.unwound = True
+        return "done"
+
+    async def cleanup(self):
+        self.cleaned_up_after_unwind.append(self.unwound)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_steps_unwind_before_cleanup(offline_tokenizer):
+    agent = HangingAgent()
+    flow = PlanningFlow(agent, max_parallel_steps=2)
+    await flow.planning_tool.execute(
+        command="create",
+        plan_id=flow.active_plan_id,
+        title="Cancel",
+        steps=["a", "b"],
+        step_dependencies=[[], []],
+    )
+
+    task = asyncio.create_task(flow._execute_steps())
+    await asyncio.sleep(0.05)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    # Only the spawned executor is cleaned up by the flow
+    assert agent.cleaned_up_after_unwind == [True]
+
+
+@pytest.mark.asyncio
+async def test_plan_text_fallback_reads_the_store_once_off_the_loop(
+    offline_tokenizer, tmp_path
+):
+    store = SQLitePlanStore(tmp_path / "plans.sqlite")
+    flow = PlanningFlow(RecordingAgent(), planning_tool=PlanningTool(store=store))
+    await flow.planning_tool.execute(
+        command="create", plan_id=flow.active_plan_id, title="Stored", steps=["a"]
+    )
+    threads = []
+    get = store.get
+
+    def recording_get(plan_id):
+        threads.append(threading.get_ident())
+        return get(plan_id)
+
+    store.get = recording_get
+
+    text = await flow._generate_plan_text_from_storage()
+
+    assert text.startswith(f"Plan: Stored (ID: {flow.active_plan_id})")
+    assert threads and threads[0] != threading.get_ident()
+    assert len(threads) == 1
+    store.close()
@@ -0,0 +1,55 @@
+import itertools
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import LLMSettings
+from app.llm import LLM
+
+
+_ids = itertools.count()
+
+
+@pytest.fixture
+def make_llm(offline_tokenizer):
+    """Build an LLM on a fresh endpoint whose completions come from `responses`."""
+    created = []
+
+    def make(responses, **settings) -> LLM:
+        index = next(_ids)
+        llm_config = LLMSettings(
+            model="test-model",
+            base_url=f"http://llm-{index}.test/v1",
+            api_key="test",
+            api_type="openai",
+            api_version="",
+            **settings,
+        )
+        name = f"test-{index}"
+        llm = LLM(name, {"default": llm_config})
+        created.append(name)
+        responses = iter(responses)
+
+        async def create_completion(reserved_tokens=0, **params):
+            response = next(responses)
+            return response(params) if callable(response) else response
+
+        llm._create_completion = create_completion
+        return llm
+
+    yield make
+    for name in created:
+        LLM._instances.pop(name, None)
+
+
+def chunk(content=None, tool_calls=None, usage=None):
+    """A streamed chat completion chunk."""
+    delta = SimpleNamespace(content=content, tool_calls=tool_calls)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=usage)
+
+
+async def stream(*chunks, error=None):
+    for item in chunks:
+        yield item
+    if error is not None:
+        raise error
@@ -0,0 +1,31 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.schema import Message
+
+
+def completion(content="a cat"):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=2)
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+@pytest.mark.asyncio
+async def test_images_are_not_written_into_the_cached_message(make_llm):
+    sent = []
+
+    def respond(params):
+        sent.append(params["messages"][-1]["content"])
+        return completion()
+
+    llm = make_llm([respond, respond])
+    llm.model = "gpt-4o"
+    message = Message.user_message("What is in this picture?")
+
+    for url in ("http://img.test/1.png", "http://img.test/2.png"):
+        assert await llm.ask_with_images([message], images=[url]) == "a cat"
+
+    assert message.to_dict()["content"] == "What is in this picture?"
+    assert [part["type"] for part in sent[1]] == ["text", "image_url"]
+    assert sent[1][1]["image_url"]["url"] == "http://img.test/2.png"
@@ -0,0 +1,33 @@
+import pytest
+
+from app.exceptions import LLMCacheMiss
+from app.llm_cache import LLMResponseCache, make_cache_key
+
+
+def _identity(value):
+    return value
+
+
+@pytest.mark.asyncio
+async def test_replay_miss_raises_without_calling_the_api(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    calls = []
+
+    async def call():
+        calls.append(1)
+        return "answer"
+
+    key = make_cache_key(model="test-model", messages=[{"role": "user"}])
+    recorder = LLMResponseCache(path, mode="record")
+    assert await recorder.get_or_call(key, call, _identity, _identity) == "answer"
+    recorder.close()
+
+    replay = LLMResponseCache(path, mode="replay")
+    assert await replay.get_or_call(key, call, _identity, _identity) == "answer"
+    assert replay.hits == 1
+
+    other = make_cache_key(model="test-model", messages=[{"role": "system"}])
+    with pytest.raises(LLMCacheMiss):
+        await replay.get_or_call(other, call, _identity, _identity)
+    assert calls == [1]
+    replay.close()
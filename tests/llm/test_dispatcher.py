@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+from app.llm import RequestDispatcher, RequestPriority
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_admitted_by_priority_then_arrival():
+    dispatcher = RequestDispatcher(max_concurrency=1)
+    order = []
+
+    async def request(name, priority):
+        async with dispatcher.slot(priority):
+            order.append(name)
+
+    async with dispatcher.slot(RequestPriority.BATCH):
+        tasks = [
+            asyncio.create_task(request("batch", RequestPriority.BATCH)),
+            asyncio.create_task(request("normal-1", RequestPriority.NORMAL)),
+            asyncio.create_task(request("interactive", RequestPriority.INTERACTIVE)),
+            asyncio.create_task(request("normal-2", RequestPriority.NORMAL)),
+        ]
+        await asyncio.sleep(0)
+        assert dispatcher.stats()["queued"] == 4
+
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "normal-1", "normal-2", "batch"]
+    assert dispatcher.stats()["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_leak_handed_slot():
+    dispatcher = RequestDispatcher(max_concurrency=1)
+
+    async def request():
+        async with dispatcher.slot():
+            pass
+
+    holder = dispatcher.slot()
+    await holder.__aenter__()
+    waiter = asyncio.create_task(request())
+    await asyncio.sleep(0)
+
+    # Release hands the slot to the waiter; cancel it before the grant runs
+    await holder.__aexit__(None, None, None)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert dispatcher.stats()["active"] == 0
+    await asyncio.wait_for(request(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_queued_waiter_is_skipped():
+    dispatcher = RequestDispatcher(max_concurrency=1)
+
+    async with dispatcher.slot():
+        cancelled = asyncio.create_task(dispatcher.slot().__aenter__())
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+
+    stats = dispatcher.stats()
+    assert (stats["active"], stats["queued"]) == (0, 0)
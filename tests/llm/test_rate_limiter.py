@@ -0,0 +1,83 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.llm import RateLimiter
+from tests.llm.conftest import chunk, stream
+
+
+@pytest.mark.asyncio
+async def test_reconcile_refunds_unused_tokens():
+    limiter = RateLimiter(tpm=1000)
+    await limiter.acquire(800)
+    assert limiter._tokens == pytest.approx(200, abs=1)
+
+    limiter.reconcile(800, 300)
+    assert limiter._tokens == pytest.approx(700, abs=1)
+
+    # Refunds never overfill the bucket
+    limiter.reconcile(800, 0)
+    assert limiter._tokens <= 1000
+
+
+@pytest.mark.asyncio
+async def test_reconcile_ignores_overuse():
+    limiter = RateLimiter(tpm=1000)
+    await limiter.acquire(100)
+    limiter.reconcile(100, 400)
+    assert limiter._tokens == pytest.approx(900, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_streamed_ask_reconciles_with_stream_usage(make_llm):
+    usage = SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+    llm = make_llm(
+        [stream(chunk("hello world"), chunk(usage=usage))],
+        tpm=100_000,
+        max_tokens=4000,
+    )
+
+    assert await llm.ask([{"role": "user", "content": "hi"}]) == "hello world"
+    assert llm.rate_limiter._tokens == pytest.approx(100_000 - 15, abs=5)
+
+
+@pytest.mark.asyncio
+async def test_failed_tool_stream_reconciles_counted_tokens(make_llm):
+    tool_call = SimpleNamespace(
+        index=0,
+        id="call_1",
+        function=SimpleNamespace(name="terminate", arguments='{"status": "done"}'),
+    )
+    llm = make_llm(
+        [stream(chunk(tool_calls=[tool_call]), error=RuntimeError("connection reset"))],
+        tpm=100_000,
+        max_tokens=4000,
+    )
+
+    with pytest.raises(RuntimeError):
+        await llm.ask_tool_stream(
+            [{"role": "user", "content": "finish the task"}],
+            on_tool_call=lambda call: None,
+        )
+    # Only the counted input and arguments stay charged, not max_tokens
+    assert llm.rate_limiter._tokens > 100_000 - 100
+
+
+@pytest.mark.asyncio
+async def test_streamed_ask_with_images_reconciles(make_llm):
+    llm = make_llm(
+        [stream(chunk("a cat"), chunk("."))],
+        tpm=100_000,
+        max_tokens=4000,
+    )
+    llm.model = "gpt-4o"
+
+    answer = await llm.ask_with_images(
+        [{"role": "user", "content": "what is this"}],
+        images=["http://img.test/cat.png"],
+        stream=True,
+    )
+
+    assert answer == "a cat."
+    # Only the counted prompt (text plus image) stays charged, not max_tokens
+    assert llm.rate_limiter._tokens > 100_000 - 2000
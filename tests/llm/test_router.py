@@ -0,0 +1,98 @@
+import asyncio
+import itertools
+from types import SimpleNamespace
+
+import pytest
+from openai import APIConnectionError
+
+from app.config import LLMSettings
+from app.llm import EndpointRouter, LLMClientRegistry, RateLimiter, RequestDispatcher
+
+
+_ids = itertools.count()
+
+
+def endpoint_config(**settings) -> LLMSettings:
+    return LLMSettings(
+        model="test-model",
+        base_url=f"http://router-{next(_ids)}.test/v1",
+        api_key="test",
+        api_type="openai",
+        api_version="",
+        **settings,
+    )
+
+
+def response(text):
+    return SimpleNamespace(
+        text=text, usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5)
+    )
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    """Map endpoint base_url to an async handler serving its completions."""
+    handlers = {}
+
+    def get(llm_config):
+        handler = handlers[llm_config.base_url]
+        completions = SimpleNamespace(create=lambda **params: handler(params))
+        return SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+    monkeypatch.setattr(LLMClientRegistry, "get", staticmethod(get))
+    return handlers
+
+
+@pytest.mark.asyncio
+async def test_hedge_loser_records_elapsed_time(clients):
+    primary, backup = endpoint_config(), endpoint_config()
+
+    async def slow(params):
+        await asyncio.sleep(1)
+        return response("primary")
+
+    async def fast(params):
+        return response("backup")
+
+    clients[primary.base_url] = slow
+    clients[backup.base_url] = fast
+    router = EndpointRouter([("primary", primary), ("backup", backup)], hedge=True)
+    primary_stats = router.endpoints[0]
+    for _ in range(5):
+        primary_stats.record_success(0.05)
+
+    result = await router._hedged(primary_stats, router.endpoints[1], {})
+
+    assert result.text == "backup"
+    assert len(primary_stats.samples) == 6
+    assert primary_stats.samples[-1] >= 0.05
+    assert primary_stats.latency > 0.05
+    assert primary_stats.failures == 0
+
+
+@pytest.mark.asyncio
+async def test_failover_goes_through_fallback_limiter_and_dispatcher(clients):
+    primary = endpoint_config()
+    fallback = endpoint_config(rpm=60, tpm=10_000, max_concurrent_requests=1)
+
+    async def down(params):
+        raise APIConnectionError(request=None)
+
+    async def up(params):
+        return response("fallback")
+
+    clients[primary.base_url] = down
+    clients[fallback.base_url] = up
+    router = EndpointRouter([("primary", primary), ("fallback", fallback)])
+    router.ranked = lambda: list(router.endpoints)
+
+    result = await router.create({"max_tokens": 100}, tokens=500)
+
+    assert result.text == "fallback"
+    limiter = RateLimiter.for_config(fallback)
+    assert limiter._requests == pytest.approx(59, abs=0.1)
+    # The 500 reserved tokens were reconciled down to the 15 used
+    assert limiter._tokens == pytest.approx(10_000 - 15, abs=5)
+    dispatcher = RequestDispatcher.for_config(fallback)
+    assert dispatcher.stats()["active"] == 0
+    assert sum(p["requests"] for p in dispatcher.stats()["priorities"].values()) == 1
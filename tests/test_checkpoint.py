@@ -0,0 +1,71 @@
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from app.agent.base import BaseAgent
+from app.checkpoint import RunJournal
+from app.image_store import image_store
+from app.schema import Message
+
+
+class IdleAgent(BaseAgent):
+    name: str = "worker"
+
+    async def step(self) -> str:
+        return "idle"
+
+
+def png(color) -> str:
+    output = io.BytesIO()
+    Image.new("RGB", (4, 4), color).save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("ascii")
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return RunJournal.create("flow", "request", tmp_path)
+
+
+def test_agent_round_trip_keeps_images(offline_tokenizer, journal):
+    screenshot = png("red")
+    agent = IdleAgent(journal=journal)
+    agent.memory.add_messages(
+        [
+            Message.user_message("look"),
+            Message.tool_message("page", "browser", "call_1", base64_image=screenshot),
+            Message.assistant_message("seen", base64_image=screenshot),
+        ]
+    )
+    agent.current_step = 3
+    agent.checkpoint()
+    # The image store only lives in memory; a new process starts empty
+    image_store.clear()
+
+    resumed = IdleAgent()
+    state = RunJournal.open(journal.run_id, journal.path.parent).load()
+    assert len(state.images) == 1
+    assert journal.restore_agent(resumed, state)
+
+    assert [m.content for m in resumed.memory.messages] == ["look", "page", "seen"]
+    assert resumed.memory.messages[1].base64_image == screenshot
+    assert resumed.current_step == 3
+
+
+def test_agents_sharing_a_name_are_journaled_separately(offline_tokenizer, journal):
+    first = IdleAgent(journal=journal, journal_key="default")
+    second = IdleAgent(journal=journal, journal_key="default/1")
+    first.memory.add_message(Message.user_message("first"))
+    second.memory.add_message(Message.user_message("second"))
+    first.checkpoint()
+    second.checkpoint()
+    second.memory.add_message(Message.assistant_message("more"))
+    second.checkpoint()
+
+    state = journal.load()
+    restored = IdleAgent(journal_key="default/1")
+    assert journal.restore_agent(restored, state)
+
+    assert set(state.agents) == {"default", "default/1"}
+    assert [m.content for m in restored.memory.messages] == ["second", "more"]
@@ -0,0 +1,69 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.compaction import MemoryCompactor, group_messages
+from app.schema import Message, Role
+
+
+def tool_step(i, results=2):
+    ids = [f"call_{i}_{j}" for j in range(results)]
+    call = Message(
+        role=Role.ASSISTANT,
+        tool_calls=[
+            {"id": id_, "function": {"name": "t", "arguments": "{}"}} for id_ in ids
+        ],
+    )
+    return [call] + [
+        Message.tool_message(f"result {id_} " * 20, "t", id_) for id_ in ids
+    ]
+
+
+def make_compactor(token_budget, keep_recent=2):
+    # One token per word is enough to exercise the budget
+    llm = SimpleNamespace(
+        count_message_tokens=lambda messages: sum(
+            len(str(m.get("content") or "").split()) + 4 for m in messages
+        )
+    )
+    return MemoryCompactor(
+        llm, token_budget=token_budget, keep_recent=keep_recent, observation_limit=50
+    )
+
+
+def assert_tool_calls_paired(messages):
+    expected = set()
+    for message in messages:
+        if message.role == Role.TOOL:
+            assert message.tool_call_id in expected
+            expected.discard(message.tool_call_id)
+        else:
+            assert not expected, f"missing results for {expected}"
+            expected = {call.id for call in message.tool_calls or []}
+    assert not expected
+
+
+def test_group_messages_keeps_calls_with_their_results():
+    messages = [Message.user_message("task"), *tool_step(0), *tool_step(1, 3)]
+
+    groups = group_messages(messages)
+
+    assert [len(group) for group in groups] == [1, 3, 4]
+    assert groups[2][0].tool_calls[2].id == groups[2][3].tool_call_id
+
+
+@pytest.mark.asyncio
+async def test_compact_drops_tool_calls_with_their_results():
+    messages = [Message.system_message("system"), Message.user_message("task")]
+    for i in range(6):
+        messages.extend(tool_step(i))
+    compactor = make_compactor(token_budget=200)
+
+    compacted = await compactor.compact(messages)
+
+    assert len(compacted) < len(messages)
+    assert compacted[:2] == messages[:2]
+    assert "earlier messages were removed" in compacted[2].content
+    assert compacted[-6:] == messages[-6:]
+    assert_tool_calls_paired(compacted[3:])
+    assert_tool_calls_paired(messages)
@@ -0,0 +1,64 @@
+import base64
+import io
+
+from PIL import Image
+
+from app.image_store import ImageStore
+
+
+def png(color, size=4) -> str:
+    output = io.BytesIO()
+    Image.new("RGB", (size, size), color).save(output, format="PNG")
+    return base64.b64encode(output.getvalue()).decode("ascii")
+
+
+def test_undecodable_payload_is_returned_unchanged(tmp_path):
+    store = ImageStore(spill_dir=tmp_path)
+    payload = "not base64!"
+
+    image_id = store.put(payload)
+
+    assert store.get_base64(image_id) == payload
+    assert store.get_base64(image_id, max_size=2) == payload
+    assert store.get_bytes(image_id) is None
+
+
+def test_evicted_images_are_spilled_and_still_readable(tmp_path):
+    images = [png(color) for color in ("red", "green", "blue")]
+    sizes = [len(base64.b64decode(image)) for image in images]
+    store = ImageStore(max_bytes=sizes[1] + sizes[2], spill_dir=tmp_path)
+
+    ids = [store.put(image) for image in images]
+
+    assert store.stats()["images"] == 2
+    assert [path.stem for path in tmp_path.iterdir()] == [ids[0]]
+    store._renditions.clear()
+    assert store.get_base64(ids[0]) == images[0]
+    assert store.get_base64(ids[2]) == images[2]
+
+
+def test_downscaled_rendition_is_cached(tmp_path):
+    store = ImageStore(spill_dir=tmp_path)
+    image_id = store.put(png("red", size=64))
+
+    small = store.get_base64(image_id, max_size=16)
+
+    with Image.open(io.BytesIO(base64.b64decode(small))) as image:
+        assert max(image.size) == 16
+    assert store.get_base64(image_id, max_size=16) is small
+
+
+def test_spill_files_are_deleted_on_reload_and_close(tmp_path):
+    images = [png(color) for color in ("red", "green", "blue")]
+    sizes = [len(base64.b64decode(image)) for image in images]
+    store = ImageStore(max_bytes=sizes[1] + sizes[2], spill_dir=tmp_path)
+    ids = [store.put(image) for image in images]
+    assert [path.stem for path in tmp_path.iterdir()] == [ids[0]]
+
+    # Put back into memory, evicting green; red's file is no longer needed
+    store.put(images[0])
+    assert [path.stem for path in tmp_path.iterdir()] == [ids[1]]
+
+    store.close()
+    assert list(tmp_path.iterdir()) == []
+    assert store.get_base64(ids[1]) is None
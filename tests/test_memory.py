@@ -0,0 +1,89 @@
+from app.schema import LoopDetector, Memory, Message, Role
+
+
+def tool_step(i):
+    call = Message(
+        role=Role.ASSISTANT,
+        tool_calls=[{"id": f"call_{i}", "function": {"name": "t", "arguments": "{}"}}],
+    )
+    return [call, Message.tool_message(f"result {i}", "t", f"call_{i}")]
+
+
+def test_trim_keeps_list_and_never_starts_with_tool_result():
+    memory = Memory(max_messages=3)
+    messages = memory.messages
+    memory.add_message(Message.user_message("task"))
+    for i in range(3):
+        memory.add_messages(tool_step(i))
+
+    assert memory.messages is messages
+    assert isinstance(memory.messages, list)
+    # Trimming to 3 would start at a tool result, so its call goes too
+    assert [m.content for m in memory.messages] == [None, "result 2"]
+    assert memory.messages[-1:][0].tool_call_id == "call_2"
+    assert memory.total_added == 7
+
+
+def test_dict_list_reuses_cached_message_dicts():
+    memory = Memory()
+    memory.add_messages([Message.user_message("hi"), Message.assistant_message("yo")])
+
+    first, second = memory.to_dict_list(), memory.to_dict_list()
+
+    assert first == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "yo"},
+    ]
+    assert all(a is b for a, b in zip(first, second))
+    assert memory.get_recent_messages(0) == []
+    assert memory.get_recent_messages(1)[0].content == "yo"
+
+
+def test_loop_detector_counts_repeated_responses():
+    memory = Memory()
+    detector = memory.loop_detector
+    for _ in range(3):
+        memory.add_message(Message.assistant_message("Let me try again."))
+        # User and tool messages in between are not part of the loop
+        memory.add_message(Message.user_message("Continue."))
+
+    assert detector.is_stuck(2)
+    assert not detector.is_stuck(3)
+    assert detector.stats()["text_repeats"] == 2
+
+    memory.add_message(Message.assistant_message("Something new."))
+    assert not detector.is_stuck(1)
+
+
+def test_loop_detector_counts_repeated_tool_calls():
+    memory = Memory()
+    detector = memory.loop_detector
+    memory.add_messages(tool_step(0))
+    memory.add_messages(tool_step(1))
+    # Same tool and arguments under a new call id is still a repeat
+    assert detector.is_stuck(1)
+    assert detector.stats()["tool_call_repeats"] == 1
+
+    other = Message(
+        role=Role.ASSISTANT,
+        tool_calls=[{"id": "x", "function": {"name": "t", "arguments": '{"a": 1}'}}],
+    )
+    memory.add_message(other)
+    assert not detector.is_stuck(1)
+
+
+def test_loop_detector_forgets_outside_window_and_on_clear():
+    memory = Memory()
+    memory._loop_detector = LoopDetector(window=2)
+    for text in ("a", "b", "c", "a"):
+        memory.add_message(Message.assistant_message(text))
+    # "a" left the window before it was repeated
+    assert not memory.loop_detector.is_stuck(1)
+
+    memory.add_message(Message.assistant_message("a"))
+    assert memory.loop_detector.is_stuck(1)
+
+    memory.clear()
+    memory.add_message(Message.assistant_message("a"))
+    assert not memory.loop_detector.is_stuck(1)
+    assert memory.loop_detector.stats()["stuck_detections"] == 1
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from app.agent.browser import tool_name
+from app.agent.manus import Manus
+from app.config import MCPServerConfig, SessionSettings, config
+from app.llm import LLM
+from app.session import SessionRunner
+from app.tool.browser_use_tool import BrowserUseTool
+from app.tool.mcp import MCPClients
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = False
+
+    async def get_current_page(self):
+        return object()
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.launches = 0
+        self.contexts = []
+        self.closed = False
+
+    async def get_playwright_browser(self):
+        self.launches += 1
+
+    async def new_context(self, context_config=None):
+        context = FakeContext()
+        self.contexts.append(context)
+        return context
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def browser(offline_tokenizer, monkeypatch):
+    """One fake browser and MCP server in place of real ones; sessions browse and return."""
+    browser = FakeBrowser()
+    connects = []
+
+    async def preconnect(self):
+        pass
+
+    async def connect_server(self, server_id, server_config):
+        connects.append(server_id)
+        self.sessions[server_id] = object()
+        self._register_tools(
+            server_id, None, [{"name": "echo", "description": "", "inputSchema": {}}]
+        )
+
+    async def run(self, request):
+        assert "mcp_fake_echo" in self.available_tools.tool_map
+        tool = self.available_tools.get_tool(tool_name(BrowserUseTool))
+        await tool._ensure_browser_initialized()
+        await asyncio.sleep(0.01)
+        return request
+
+    monkeypatch.setattr(LLM, "preconnect", preconnect)
+    monkeypatch.setattr(MCPClients, "connect_server", connect_server)
+    monkeypatch.setattr(Manus, "run", run)
+    monkeypatch.setattr(BrowserUseTool, "create_browser", staticmethod(lambda: browser))
+    monkeypatch.setattr(
+        config.mcp_config,
+        "servers",
+        {"fake": MCPServerConfig(type="sse", url="http://mcp.test/sse")},
+    )
+    browser.mcp_connects = connects
+    return browser
+
+
+@pytest.mark.asyncio
+async def test_sessions_share_browser_and_mcp_until_runner_exits(browser):
+    async with SessionRunner(SessionSettings(max_sessions=2)) as runner:
+        clients = runner.resources.mcp_clients
+        results = await asyncio.gather(*(runner.run(f"task {i}") for i in range(3)))
+        # A later session after the others were cleaned up
+        results.append(await runner.run("task 3"))
+
+        assert results == [f"task {i}" for i in range(4)]
+        assert browser.launches == 1
+        assert browser.mcp_connects == ["fake"]
+        # Each session closed only its own context
+        assert len(browser.contexts) == 4
+        assert all(context.closed for context in browser.contexts)
+        assert not browser.closed
+        assert "fake" in clients.sessions
+        assert runner.stats()["completed"] == 4
+
+    assert browser.closed
+    assert clients.sessions == {}
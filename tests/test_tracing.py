@@ -0,0 +1,41 @@
+import asyncio
+import json
+
+import pytest
+
+from app.config import PROJECT_ROOT, TracingSettings
+from app.tracing import Tracer
+
+
+def test_relative_output_dir_is_anchored_to_project_root(tmp_path):
+    tracer = Tracer()
+    tracer.configure(TracingSettings(output_dir="logs/my_traces"))
+    assert tracer.output_dir == PROJECT_ROOT / "logs" / "my_traces"
+
+    tracer.configure(TracingSettings(output_dir=str(tmp_path)))
+    assert tracer.output_dir == tmp_path
+
+
+@pytest.mark.asyncio
+async def test_export_clears_tracks(tmp_path):
+    tracer = Tracer()
+    tracer.configure(TracingSettings(enabled=True, output_dir=str(tmp_path)))
+
+    async def work(i):
+        with tracer.span("work", index=i):
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(work(i) for i in range(5)))
+    assert len(tracer._tracks) == 5
+    (path,) = tracer.export("first")
+    assert tracer._tracks == {}
+    events = json.loads(path.read_text())["traceEvents"]
+    assert sum(e["ph"] == "M" for e in events) == 5
+
+    await work(5)
+    (path,) = tracer.export("second")
+    events = json.loads(path.read_text())["traceEvents"]
+    (meta,) = [e for e in events if e["ph"] == "M"]
+    (span,) = [e for e in events if e["ph"] == "X"]
+    # Track ids are not reused across exports
+    assert span["tid"] == meta["tid"] == 6
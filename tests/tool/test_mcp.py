@@ -0,0 +1,86 @@
+import pytest
+
+from app.agent.manus import Manus
+from app.config import MCPServerConfig, config
+from app.llm import LLM
+from app.tool.mcp import MCPClients
+
+
+@pytest.fixture
+def clients(offline_tokenizer, monkeypatch):
+    """MCPClients with one configured, already connected server; disconnects are recorded."""
+
+    async def preconnect(self):
+        pass
+
+    async def disconnect(self, server_id=""):
+        self.disconnects.append(server_id)
+        self.sessions.clear()
+
+    monkeypatch.setattr(LLM, "preconnect", preconnect)
+    monkeypatch.setattr(MCPClients, "disconnect", disconnect)
+    monkeypatch.setattr(
+        config.mcp_config,
+        "servers",
+        {"fake": MCPServerConfig(type="sse", url="http://mcp.test/sse")},
+    )
+    clients = MCPClients()
+    clients.disconnects = []
+    clients.sessions["fake"] = object()
+    clients._register_tools(
+        "fake",
+        None,
+        [{"name": "echo", "description": "Echo", "inputSchema": {}}],
+    )
+    return clients
+
+
+@pytest.mark.asyncio
+async def test_spawned_copy_keeps_shared_servers_after_owner_cleanup(clients):
+    owner = await Manus.create(mcp_clients=clients)
+    copy = await owner.spawn()
+    assert "mcp_fake_echo" in copy.available_tools.tool_map
+
+    # The owner's step finishes first; the copy is still working
+    await owner.cleanup()
+    assert clients.disconnects == []
+    assert "fake" in clients.sessions
+    assert "mcp_fake_echo" not in owner.available_tools.tool_map
+
+    # The owner runs another step while the copy is still holding the servers
+    await owner._reinitialize()
+    assert "mcp_fake_echo" in owner.available_tools.tool_map
+
+    await copy.cleanup()
+    assert clients.disconnects == []
+    await owner.cleanup()
+    assert clients.disconnects == [""]
+
+
+@pytest.mark.asyncio
+async def test_session_agents_never_disconnect_shared_servers(clients):
+    agent = await Manus.create(mcp_clients=clients, owns_mcp_clients=False)
+    copy = await agent.spawn()
+
+    await copy.cleanup()
+    await agent.cleanup()
+    await agent._reinitialize()
+    await agent.cleanup()
+
+    assert clients.disconnects == []
+    assert "fake" in clients.sessions
+
+
+@pytest.mark.asyncio
+async def test_full_disconnect_forgets_lazy_servers():
+    clients = MCPClients()
+    clients._lazy_servers["lazy"] = MCPServerConfig(type="sse", url="http://mcp.test")
+    clients._register_tools(
+        "lazy", None, [{"name": "echo", "description": "Echo", "inputSchema": {}}]
+    )
+    assert clients.has_server("lazy")
+
+    await clients.disconnect()
+
+    assert not clients.has_server("lazy")
+    assert clients.tool_map == {}
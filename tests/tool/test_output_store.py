@@ -0,0 +1,83 @@
+import pytest
+
+from app.output_store import OutputStore, observation_limit, output_store
+from app.tool.bash import Bash
+from app.tool.python_execute import PythonExecute
+from app.tool.read_output import ReadOutput
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(output_store, "directory", tmp_path)
+    return output_store
+
+
+def test_fold_keeps_head_and_tail_and_stores_everything(tmp_path):
+    store = OutputStore(tmp_path)
+    text = "".join(f"line {i}\n" for i in range(1000))
+
+    folded = store.fold(text, 200)
+
+    assert folded.startswith("line 0\n")
+    assert folded.endswith("line 999\n")
+    assert store.is_folded(folded)
+    output_id = folded.split("output_id=")[1][:16]
+    lines, total = store.read(output_id, 500, 2)
+    assert (lines, total) == (["line 499\n", "line 500\n"], 1000)
+    assert store.fold("short", 200) == "short"
+
+
+def test_writer_streams_without_buffering_the_whole_output(tmp_path):
+    store = OutputStore(tmp_path)
+    writer = store.writer(limit=100)
+    for i in range(10_000):
+        writer.write(f"chunk {i}\n")
+        assert len(writer._head) <= 100 and len(writer._tail) <= 50
+
+    folded = writer.close()
+
+    assert "chunk 9999" in folded
+    assert store.path(writer.output_id).read_text().count("\n") == 10_000
+
+
+@pytest.mark.asyncio
+async def test_bash_streams_large_output_to_the_store(store):
+    bash = Bash()
+    token = observation_limit.set(300)
+    try:
+        large = await bash.execute(command="seq 1 200000")
+        small = await bash.execute(command="echo done")
+    finally:
+        observation_limit.reset(token)
+        process = bash._session._process
+        process.stdin.write(b"exit\n")
+        await process.wait()
+
+    assert large.output.startswith("1\n2\n")
+    assert large.output.endswith("\n200000")
+    assert store.is_folded(large.output)
+    assert small.output == "done"
+
+    output_id = large.output.split("output_id=")[1][:16]
+    result = await ReadOutput().execute(output_id, start_line=199999, num_lines=5)
+    assert result.output == "Lines 199999-200000 of 200000:\n199999\n200000"
+
+
+@pytest.mark.asyncio
+async def test_python_execute_streams_large_output_to_the_store(store):
+    token = observation_limit.set(300)
+    try:
+        result = await PythonExecute().execute(code="for i in range(100000): print(i)")
+    finally:
+        observation_limit.reset(token)
+
+    assert result["success"]
+    observation = result["observation"]
+    assert observation.startswith("0\n1\n")
+    assert observation.endswith("99999\n")
+    assert store.is_folded(observation)
+    # Found inside the dict the agent turns into its observation
+    assert store.is_folded(str(result))
+    output_id = observation.split("output_id=")[1][:16]
+    assert store.read(output_id, 100000, 1) == (["99999\n"], 100000)
+    assert not list(store.directory.glob("*.tmp"))
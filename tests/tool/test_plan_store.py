@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.plan_store import MemoryPlanStore, SQLitePlanStore
+from app.tool.planning import PlanningTool
+
+
+def make_plan(plan_id="plan", steps=8):
+    return {
+        "plan_id": plan_id,
+        "title": "Test plan",
+        "steps": [f"Step {i}" for i in range(steps)],
+        "step_statuses": ["not_started"] * steps,
+        "step_notes": [""] * steps,
+    }
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryPlanStore()
+    else:
+        store = SQLitePlanStore(tmp_path / "plans.sqlite")
+        yield store
+        store.close()
+
+
+def test_concurrent_mark_step_loses_no_updates(store):
+    store.create(make_plan(steps=40))
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(
+            pool.map(
+                lambda i: store.mark_step("plan", i, "completed", f"done {i}"),
+                range(40),
+            )
+        )
+
+    plan = store.get("plan")
+    assert plan["step_statuses"] == ["completed"] * 40
+    assert plan["step_notes"] == [f"done {i}" for i in range(40)]
+    assert plan["version"] == 41
+    assert store.list("completed")[0]["plan_id"] == "plan"
+
+
+def test_failed_mark_step_leaves_plan_unchanged(store):
+    store.create(make_plan(steps=2))
+
+    with pytest.raises(IndexError):
+        store.mark_step("plan", 5, "completed")
+
+    assert store.get("plan")["version"] == 1
+    assert store.mark_step("missing", 0, "completed") is None
+
+
+def test_sqlite_round_trip(tmp_path):
+    path = tmp_path / "plans.sqlite"
+    writer = SQLitePlanStore(path)
+    assert writer.create(make_plan("a", steps=2))
+    assert not writer.create(make_plan("a", steps=2))
+    writer.create(make_plan("b", steps=1))
+    writer.mark_step("a", 0, "completed", "first")
+    writer.close()
+
+    reader = SQLitePlanStore(path)
+    plan = reader.get("a")
+    assert plan["step_statuses"] == ["completed", "not_started"]
+    assert plan["step_notes"] == ["first", ""]
+    assert plan["version"] == 2
+    assert [summary["plan_id"] for summary in reader.list("in_progress")] == ["a"]
+    assert reader.list("not_started") == [
+        {
+            "plan_id": "b",
+            "title": "Test plan",
+            "status": "not_started",
+            "completed": 0,
+            "total": 1,
+        }
+    ]
+    assert reader.delete("b")
+    assert reader.get("b") is None
+    reader.close()
+
+
+def test_render_cache_is_bounded(monkeypatch):
+    store = MemoryPlanStore()
+    monkeypatch.setattr(MemoryPlanStore, "RENDER_CACHE_SIZE", 3)
+    rendered = []
+
+    def formatter(plan):
+        rendered.append(plan["plan_id"])
+        return plan["plan_id"]
+
+    for i in range(5):
+        store.create(make_plan(f"plan-{i}"))
+        store.render(store.get(f"plan-{i}"), formatter)
+    store.render(store.get("plan-4"), formatter)
+
+    assert list(store._rendered) == ["plan-2", "plan-3", "plan-4"]
+    assert rendered == [f"plan-{i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_planning_tool_on_sqlite_store(tmp_path):
+    store = SQLitePlanStore(tmp_path / "plans.sqlite")
+    tool = PlanningTool(store=store)
+
+    await tool.execute(command="create", plan_id="p", title="T", steps=["a", "b"])
+    result = await tool.execute(
+        command="mark_step", plan_id="p", step_index=0, step_status="completed"
+    )
+
+    assert "1/2 steps completed" in result.output
+    assert (await tool.get_plan("p"))["step_statuses"][0] == "completed"
+    store.close()
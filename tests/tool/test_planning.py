@@ -0,0 +1,81 @@
+import pytest
+
+from app.exceptions import ToolError
+from app.tool.planning import PlanningTool
+
+
+async def create(tool, steps, step_dependencies=None):
+    await tool.execute(
+        command="create",
+        plan_id="plan",
+        title="Plan",
+        steps=steps,
+        step_dependencies=step_dependencies,
+    )
+
+
+async def mark(tool, step_index, step_status):
+    await tool.execute(
+        command="mark_step",
+        plan_id="plan",
+        step_index=step_index,
+        step_status=step_status,
+    )
+
+
+@pytest.mark.asyncio
+async def test_steps_without_dependencies_run_in_order():
+    tool = PlanningTool()
+    await create(tool, ["a", "b", "c"])
+
+    assert tool.ready_steps("plan") == [0]
+    await mark(tool, 0, "completed")
+    assert tool.ready_steps("plan") == [1]
+
+
+@pytest.mark.asyncio
+async def test_ready_steps_follow_dependencies():
+    tool = PlanningTool()
+    await create(tool, ["a", "b", "c", "d"], [[], [], [0, 1], [0]])
+
+    assert tool.ready_steps("plan") == [0, 1]
+    await mark(tool, 0, "completed")
+    assert tool.ready_steps("plan") == [1, 3]
+    await mark(tool, 1, "in_progress")
+    await mark(tool, 3, "blocked")
+    # An interrupted in-progress step is ready again; blocked steps are not
+    assert tool.ready_steps("plan") == [1]
+    await mark(tool, 1, "completed")
+    assert tool.ready_steps("plan") == [2]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "step_dependencies",
+    [
+        [[], [1]],  # On itself
+        [[1], []],  # On a later step, which could form a cycle
+        [[], [5]],  # Out of range
+        [[]],  # Not one list per step
+        [[], "0"],
+    ],
+)
+async def test_invalid_dependencies_are_rejected(step_dependencies):
+    tool = PlanningTool()
+    with pytest.raises(ToolError):
+        await create(tool, ["a", "b"], step_dependencies)
+    assert "plan" not in tool.plans
+
+
+@pytest.mark.asyncio
+async def test_update_revalidates_dependencies():
+    tool = PlanningTool()
+    await create(tool, ["a", "b"], [[], []])
+
+    with pytest.raises(ToolError):
+        await tool.execute(
+            command="update", plan_id="plan", step_dependencies=[[], [1]]
+        )
+    await tool.execute(command="update", plan_id="plan", step_dependencies=[[], [0, 0]])
+
+    assert tool.plans["plan"]["step_dependencies"] == [[], [0]]